@@ -0,0 +1,292 @@
+# analytics_mirror.py - local embedded copy of the casino data for analytics
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Table columns as (column, SQL type, document field); nested fields use dots
+TABLES = {
+    'users': [('id', 'TEXT', '_id'), ('email', 'TEXT', 'email'), ('role', 'TEXT', 'role'),
+              ('balance', 'DOUBLE', 'balance'), ('active', 'BOOLEAN', 'active'),
+              ('created_at', 'TIMESTAMP', 'created_at')],
+    'transactions': [('id', 'TEXT', '_id'), ('user_id', 'TEXT', 'user_id'), ('type', 'TEXT', 'type'),
+                     ('amount', 'DOUBLE', 'amount'), ('balance_after', 'DOUBLE', 'balance_after'),
+                     ('game_type', 'TEXT', 'game_type'), ('date', 'TIMESTAMP', 'date')],
+    'login_logs': [('id', 'TEXT', '_id'), ('user_id', 'TEXT', 'user_id'), ('success', 'BOOLEAN', 'success'),
+                   ('ip', 'TEXT', 'ip'), ('country', 'TEXT', 'location.country'),
+                   ('timestamp', 'TIMESTAMP', 'timestamp')],
+    'admin_logs': [('id', 'TEXT', '_id'), ('user_id', 'TEXT', 'user_id'), ('email', 'TEXT', 'email'),
+                   ('action', 'TEXT', 'action'), ('target_user_id', 'TEXT', 'details.user_id'),
+                   ('timestamp', 'TIMESTAMP', 'timestamp')],
+}
+# Append-only collections synced by their time field; users are small and mutable, so they are reloaded
+TIME_FIELDS = {'transactions': 'date', 'login_logs': 'timestamp', 'admin_logs': 'timestamp'}
+
+
+class MirrorLocked(Exception):
+    """Another process held the mirror file's write lock for longer than lock_timeout"""
+
+
+def _value(doc, path):
+    for part in path.split('.'):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+class AnalyticsMirror:
+    """Incrementally synced local copy of users, transactions and the logs
+
+    The mirror is a DuckDB file (columnar, typed tables) when duckdb is
+    installed, and an SQLite file otherwise. The log collections and
+    transactions are append-only, so each sync deletes and reloads only the
+    tail from `lag` seconds before the stored time high-water mark onward.
+    The overlap picks up documents committed late with an earlier time (a
+    buffered login log, a slow writer); rows in it are replaced rather than
+    duplicated, so re-runs are safe. Users are reloaded in full because
+    balances and flags change in place. Backdated inserts older than the
+    overlap (imports) need forget() and a full sync.
+
+    Each operation opens its own short-lived connection. DuckDB lets only
+    one process open a file for writing, so a connection that finds it
+    locked is retried with back-off for up to `lock_timeout` seconds before
+    MirrorLocked is raised; reports then fall back to MongoDB.
+    """
+
+    def __init__(self, path='analytics_mirror.duckdb', backend='duckdb', batch_size=5000, lag=300, lock_timeout=10):
+        if backend == 'duckdb' and duckdb is None:
+            logging.warning("duckdb is not installed, falling back to an SQLite mirror")
+            backend = 'sqlite'
+        self.backend = backend
+        self.path = path if backend == 'duckdb' else path.rsplit('.', 1)[0] + '.sqlite'
+        self.batch_size = batch_size
+        self.lag = timedelta(seconds=lag)
+        self.lock_timeout = lock_timeout
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.last_error = None
+        with self._connect() as conn:
+            for name, columns in TABLES.items():
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {name} ("
+                             + ', '.join(f"{column} {sql_type}" for column, sql_type, _ in columns) + ")")
+            conn.execute("CREATE TABLE IF NOT EXISTS mirror_state "
+                         "(name TEXT PRIMARY KEY, high_water TIMESTAMP, row_count BIGINT, synced_at TIMESTAMP)")
+
+    @classmethod
+    def from_config(cls, config):
+        section = config['MIRROR'] if config.has_section('MIRROR') else {}
+        if str(section.get('enabled', 'false')).lower() not in ('1', 'true', 'yes', 'on'):
+            return None
+        return cls(
+            path=section.get('path', 'analytics_mirror.duckdb'),
+            backend=section.get('backend', 'duckdb'),
+            batch_size=int(section.get('batch_size', '5000')),
+            lag=int(section.get('lag_seconds', '300')),
+            lock_timeout=float(section.get('lock_timeout', '10'))
+        )
+
+    def _connect(self, read_only=False):
+        return _Connection(self.backend, self.path, read_only, self.lock_timeout)
+
+    def _param(self, value):
+        # SQLite has no timestamp type; ISO text keeps the order
+        if self.backend == 'sqlite' and isinstance(value, datetime):
+            return value.isoformat(' ')
+        return value
+
+    def _row(self, doc, columns):
+        row = []
+        for column, sql_type, path in columns:
+            value = _value(doc, path)
+            if value is None:
+                row.append(None)
+            elif sql_type == 'TEXT':
+                row.append(str(value))
+            elif sql_type == 'DOUBLE':
+                row.append(float(value) if isinstance(value, (int, float)) else None)
+            elif sql_type == 'BOOLEAN':
+                row.append(bool(value))
+            else:
+                row.append(self._param(value) if isinstance(value, datetime) else None)
+        return row
+
+    def sync(self, db, transactions, names=None, full=False, progress=None):
+        """Bring the mirror up to date; returns rows loaded per table"""
+        loaded = {}
+        with self.lock:
+            for name in names or TABLES:
+                loaded[name] = self._sync_table(db, transactions, name, full, progress)
+        return loaded
+
+    def _sync_table(self, db, transactions, name, full, progress):
+        columns = TABLES[name]
+        time_field = TIME_FIELDS.get(name)
+        with self._connect() as conn:
+            state = conn.execute("SELECT high_water FROM mirror_state WHERE name = ?", [name]).fetchone()
+            high_water = None if full or not state or not time_field else state[0]
+            if isinstance(high_water, str):
+                high_water = datetime.fromisoformat(high_water)
+
+            if high_water is None:
+                conn.execute(f"DELETE FROM {name}")
+                query = {}
+            else:
+                since = high_water - self.lag
+                conn.execute(f"DELETE FROM {name} WHERE {time_field} >= ?", [self._param(since)])
+                query = {time_field: {'$gte': since}}
+            projection = {path.split('.')[0]: 1 for _, _, path in columns}
+            if name == 'transactions':
+                docs = transactions.find(query, projection, batch_size=self.batch_size)
+            else:
+                docs = db[name].find(query, projection).batch_size(self.batch_size)
+
+            count = 0
+            newest = high_water
+            batch = []
+            for doc in docs:
+                batch.append(self._row(doc, columns))
+                stamp = doc.get(time_field) if time_field else None
+                if isinstance(stamp, datetime) and (newest is None or stamp > newest):
+                    newest = stamp
+                if len(batch) >= self.batch_size:
+                    self._insert(conn, name, batch)
+                    count += len(batch)
+                    batch = []
+                    if progress:
+                        progress(name, count)
+            if batch:
+                self._insert(conn, name, batch)
+                count += len(batch)
+                if progress:
+                    progress(name, count)
+
+            total = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+            conn.execute("DELETE FROM mirror_state WHERE name = ?", [name])
+            conn.execute("INSERT INTO mirror_state VALUES (?, ?, ?, ?)",
+                         [name, self._param(newest), total, self._param(datetime.now())])
+        return count
+
+    def _insert(self, conn, name, rows):
+        columns = TABLES[name]
+        names = ', '.join(column for column, _, _ in columns)
+        if self.backend == 'sqlite':
+            conn.executemany(f"INSERT INTO {name} ({names}) VALUES ({', '.join('?' for _ in columns)})", rows)
+            return
+        # Binding Python values one by one is slow in DuckDB; its JSON reader loads a staged batch much faster
+        keys = [column for column, _, _ in columns]
+        fd, path = tempfile.mkstemp(suffix='.jsonl', dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as staged:
+                for row in rows:
+                    staged.write(json.dumps(dict(zip(keys, row)), default=lambda value: value.isoformat(' ')) + '\n')
+            types = ', '.join(f"'{column}': '{sql_type.replace('TEXT', 'VARCHAR')}'" for column, sql_type, _ in columns)
+            conn.execute(f"INSERT INTO {name} ({names}) SELECT {names} FROM read_json(?, format = 'newline_delimited', "
+                         f"columns = {{{types}}})", [path])
+        finally:
+            os.remove(path)
+
+    def status(self):
+        with self._connect(read_only=True) as conn:
+            rows = conn.execute("SELECT name, high_water, row_count, synced_at FROM mirror_state ORDER BY name").fetchall()
+        return [{'table': r[0], 'high_water': self._datetime(r[1]), 'rows': r[2], 'synced_at': self._datetime(r[3]),
+                 'backend': self.backend} for r in rows]
+
+    def forget(self, names=None):
+        """Drop the high-water marks (e.g. after backdated imports); the next sync reloads those tables"""
+        with self.lock, self._connect() as conn:
+            for name in names or TABLES:
+                conn.execute("DELETE FROM mirror_state WHERE name = ?", [name])
+
+    def query(self, sql, params=()):
+        """Rows of a read-only SQL query as dicts"""
+        with self._connect(read_only=True) as conn:
+            cursor = conn.execute(sql, [self._param(p) for p in params])
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _datetime(value):
+        return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+    def deposit_withdraw_summary(self, since):
+        rows = self.query(
+            "SELECT type, COUNT(*) AS count, SUM(amount) AS total_amount FROM transactions "
+            "WHERE date >= ? AND type IN ('deposit', 'withdraw') GROUP BY type ORDER BY type", [since])
+        return [{'type': r['type'], 'count': r['count'], 'total_amount': r['total_amount']} for r in rows]
+
+    def user_activity(self, since):
+        rows = self.query(
+            "SELECT l.user_id, COALESCE(u.email, 'Deleted User') AS email, MAX(l.timestamp) AS last_login, "
+            "SUM(CASE WHEN l.success THEN 1 ELSE 0 END) AS success_count, "
+            "SUM(CASE WHEN l.success THEN 0 ELSE 1 END) AS failed_count "
+            "FROM login_logs l LEFT JOIN users u ON u.id = l.user_id "
+            "WHERE l.timestamp >= ? GROUP BY l.user_id, u.email ORDER BY last_login DESC", [since])
+        for row in rows:
+            row['last_login'] = self._datetime(row['last_login'])
+        return rows
+
+    def start(self, db, transactions, interval=300):
+        """Sync every `interval` seconds on a daemon thread"""
+        if self.thread:
+            return
+
+        def loop():
+            while not self.stopping.is_set():
+                try:
+                    self.sync(db, transactions)
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                self.stopping.wait(interval)
+
+        self.thread = threading.Thread(target=loop, name='analytics-mirror', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+
+class _Connection:
+    """One short-lived connection, committed on success"""
+
+    def __init__(self, backend, path, read_only=False, lock_timeout=10):
+        self.backend = backend
+        self.path = path
+        self.read_only = read_only
+        self.lock_timeout = lock_timeout
+
+    def __enter__(self):
+        if self.backend == 'duckdb':
+            self.conn = self._duckdb()
+        else:
+            self.conn = sqlite3.connect(self.path, timeout=max(self.lock_timeout, 1))
+        return self.conn
+
+    def _duckdb(self):
+        # The file lock is per process: while another process writes, connect() fails until it closes the file
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.05
+        while True:
+            try:
+                return duckdb.connect(self.path, read_only=self.read_only)
+            except duckdb.IOException as e:
+                if 'lock' not in str(e).lower():
+                    raise
+                if time.monotonic() >= deadline:
+                    raise MirrorLocked(f"{self.path} is locked by another process") from e
+            time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, 1)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        self.conn.close()
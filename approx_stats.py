@@ -0,0 +1,257 @@
+# approx_stats.py - sampled estimates with confidence intervals and HyperLogLog distinct counts
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta
+
+from pymongo.errors import OperationFailure
+
+Z_95 = 1.96
+OVERALL = '__all__'
+POPULATION_MAX_AGE = 3600
+# $sample reads a random cursor only below this fraction of the collection
+SAMPLE_MAX_FRACTION = 0.05
+
+_populations = {}
+
+
+def _day(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def _population(collection):
+    try:
+        return collection.estimated_document_count()
+    except OperationFailure:
+        pass
+    # Time-series collections are views, which have no count metadata, and
+    # counting them unpacks every bucket. The size only scales the sample,
+    # so a count up to POPULATION_MAX_AGE seconds old is good enough.
+    key = (collection.database.name, collection.name)
+    cached = _populations.get(key)
+    if cached and time.monotonic() - cached[0] < POPULATION_MAX_AGE:
+        return cached[1]
+    try:
+        stats = next(collection.aggregate([{'$collStats': {'count': {}}}]), None)
+        size = stats.get('count') if stats else None
+    except OperationFailure:
+        size = None
+    if size is None:
+        size = collection.count_documents({})
+    _populations[key] = (time.monotonic(), size)
+    return size
+
+
+def _add(results, key, population, k, s, ss, n, size, exact):
+    row = results.setdefault(key, {'count': 0.0, 'count_var': 0.0, 'total': 0.0, 'total_var': 0.0,
+                                   'sampled': 0, 'population': population})
+    row['sampled'] += k
+    if exact:
+        row['count'] += k
+        row['total'] += s
+        return
+    scale = size / n
+    row['count'] += k * scale
+    row['total'] += s * scale
+    if n > 1:
+        finite = size * size * (1 - n / size) / n
+        row['count_var'] += finite * (k - k ** 2 / n) / (n - 1)
+        row['total_var'] += finite * max(ss - s ** 2 / n, 0) / (n - 1)
+
+
+def sampled_totals(collections, match, group_key, value, sample_size=20000, decode=(), translate=None):
+    """Estimated count and sum of `value` per group over the documents matching `match`
+
+    Every collection is a stratum with a budget of documents in proportion
+    to its size; an entry may be a (collection, match) pair to give that
+    stratum its own filter. A stratum whose matching documents fit in the
+    budget (counted with the filter leading, so on an index and stopping at
+    the budget) is aggregated exactly. So is one whose budget is
+    SAMPLE_MAX_FRACTION of it or more, since $sample only uses a random
+    cursor below that and otherwise scans and sorts the whole collection.
+    Other strata are read through a leading $sample and the sample is
+    filtered and grouped afterwards: a document contributes value (or 1 for
+    the count) when it matches and 0 when it does not, and the stratum
+    total is estimated as N * sample mean, with variance
+    N^2 * (1 - n/N) * s^2 / n. Returns {group: {'count', 'count_error',
+    'total', 'total_error', 'sampled', 'population'}} with 95% half-widths,
+    plus an OVERALL entry for all matching documents (its error is not the
+    sum of the groups' errors, since group counts in a sample move against
+    each other). For collections stored in an encoded schema, `decode`
+    stages turn documents back into the fields `match`, `group_key` and
+    `value` use, and `translate` rewrites `match` for the stored schema.
+    """
+    translate = translate or (lambda query: query)
+    strata = []
+    for entry in collections:
+        collection, stratum_match = entry if isinstance(entry, tuple) else (entry, match)
+        strata.append((collection, stratum_match, _population(collection)))
+    population = sum(size for _, _, size in strata)
+    results = {}
+    group = {
+        '_id': group_key,
+        'k': {'$sum': 1},
+        's': {'$sum': value},
+        'ss': {'$sum': {'$multiply': [value, value]}}
+    }
+    for collection, stratum_match, size in strata:
+        if not size:
+            continue
+        n = max(1, round(sample_size * size / population))
+        stored_match = translate(stratum_match)
+        exact = (n >= size * SAMPLE_MAX_FRACTION
+                 or collection.count_documents(stored_match, limit=n + 1) <= n)
+        if exact:
+            pipeline = [{'$match': stored_match}, *decode, {'$group': group}]
+        else:
+            pipeline = [{'$sample': {'size': n}}, *decode, {'$match': stratum_match}, {'$group': group}]
+        overall = [0, 0, 0]
+        for entry in collection.aggregate(pipeline, allowDiskUse=True):
+            _add(results, entry['_id'], population, entry['k'], entry['s'], entry['ss'], n, size, exact)
+            overall = [overall[0] + entry['k'], overall[1] + entry['s'], overall[2] + entry['ss']]
+        _add(results, OVERALL, population, *overall, n, size, exact)
+    for row in results.values():
+        row['count_error'] = Z_95 * math.sqrt(row.pop('count_var'))
+        row['total_error'] = Z_95 * math.sqrt(row.pop('total_var'))
+    return results
+
+
+class HyperLogLog:
+    """Distinct-count sketch in 2^p one-byte registers, standard error 1.04 / sqrt(2^p)
+
+    Sketches of disjoint or overlapping sets merge by register-wise max, so
+    per-day sketches combine into any range without re-reading documents.
+    """
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = 64 - self.p - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small-range correction: linear counting over the empty registers
+            return self.m * math.log(self.m / zeros)
+        return estimate
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+
+class DistinctSketches:
+    """Approximate distinct values of `field` per time range from stored per-day HyperLogLog sketches
+
+    Sketches for finished days are built once and kept in
+    distinct_sketches, so a year's distinct users is a merge of 365 small
+    sketches plus one pass over today. A day is only stored once it has been
+    over for SETTLE_SECONDS, so writes that arrive a little late are still
+    counted; imports into finished days must forget() those days. `aggregate` runs a pipeline over
+    the source (a collection or TransactionRouter). `archive(since, until)`
+    yields documents older than `archived_until()`, for logs moved out by the
+    retention archiver.
+    """
+
+    SETTLE_SECONDS = 600
+
+    def __init__(self, db, name, aggregate, time_field='timestamp', field='user_id', p=12,
+                 archive=None, archived_until=None):
+        self.sketches = db.distinct_sketches
+        self.name = name
+        self.aggregate = aggregate
+        self.time_field = time_field
+        self.field = field
+        self.p = p
+        self.archive = archive
+        self.archived_until = archived_until or (lambda: None)
+
+    def _key(self, day):
+        return f"{self.name}:{self.field}:{day:%Y-%m-%d}"
+
+    def _scan(self, since, until):
+        """(day, value) pairs, each value once per day"""
+        pipeline = [
+            {'$match': {self.time_field: {'$gte': since, '$lt': until}}},
+            {'$group': {'_id': {
+                'day': {'$dateFromParts': {'year': {'$year': f'${self.time_field}'},
+                                           'month': {'$month': f'${self.time_field}'},
+                                           'day': {'$dayOfMonth': f'${self.time_field}'}}},
+                'value': f'${self.field}'
+            }}}
+        ]
+        for entry in self.aggregate(pipeline, allowDiskUse=True):
+            yield entry['_id']['day'], entry['_id']['value']
+
+    def _build(self, days, settled):
+        """Sketches for `days`; those before `settled` are stored"""
+        sketches = {day: HyperLogLog(self.p) for day in days}
+        since, until = min(days), max(days) + timedelta(days=1)
+        boundary = self.archived_until()
+        if self.archive and boundary and since < boundary:
+            for doc in self.archive(since, min(boundary, until)):
+                sketch = sketches.get(_day(doc[self.time_field]))
+                if sketch is not None:
+                    sketch.add(doc.get(self.field))
+            since = max(since, boundary)
+        if since < until:
+            for day, value in self._scan(since, until):
+                sketch = sketches.get(_day(day))
+                if sketch is not None:
+                    sketch.add(value)
+        for day, sketch in sketches.items():
+            if day >= settled:
+                continue
+            self.sketches.update_one({'_id': self._key(day)},
+                                     {'$set': {'registers': bytes(sketch.registers), 'p': self.p, 'day': day}},
+                                     upsert=True)
+        return sketches
+
+    def count(self, since, now=None):
+        """(estimate, 95% half-width) of distinct values from the day of `since` up to now"""
+        now = now or datetime.now()
+        today = _day(now)
+        days = []
+        day = _day(since)
+        while day < today:
+            days.append(day)
+            day += timedelta(days=1)
+
+        merged = HyperLogLog(self.p)
+        stored = {doc['_id']: doc for doc in self.sketches.find({'_id': {'$in': [self._key(d) for d in days]}})}
+        missing = []
+        for day in days:
+            doc = stored.get(self._key(day))
+            if doc and doc.get('p') == self.p:
+                merged.merge(HyperLogLog(self.p, doc['registers']))
+            else:
+                missing.append(day)
+        if missing:
+            settled = _day(now - timedelta(seconds=self.SETTLE_SECONDS))
+            for sketch in self._build(missing, settled).values():
+                merged.merge(sketch)
+        for _, value in self._scan(today, now + timedelta(seconds=1)):
+            merged.add(value)
+        estimate = merged.count()
+        return estimate, Z_95 * merged.relative_error * estimate
+
+    def forget(self, days=None):
+        """Drop stored sketches, all or those of `days` (e.g. after importing backdated documents)"""
+        if days is not None:
+            self.sketches.delete_many({'_id': {'$in': [self._key(_day(day)) for day in days]}})
+            return
+        self.sketches.delete_many({'_id': {'$regex': f'^{self.name}:{self.field}:'}})
@@ -1,20 +1,329 @@
 # bulk_data_generator.py (complete working version)
 import json
 import random
+import socket
 import string
 import bcrypt
 import logging
+import argparse
+import cProfile
+import gzip
+import math
+import pstats
+import queue
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from faker import Faker
 from tqdm import tqdm
 import configparser
 
-class CasinoDataGenerator:
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class RecordSerializer:
+    """Encode blocks of records as JSON Lines bytes
+
+    Reuses one stdlib encoder per block; the output is byte-identical to
+    json.dumps(item, default=str) per line.
+    """
+
     def __init__(self):
+        self._encode = json.JSONEncoder(default=str).encode
+
+    def encode_block(self, items):
+        encode = self._encode
+        return ''.join([encode(item) + '\n' for item in items]).encode('utf-8')
+
+
+def open_output(filename, compression=None):
+    """Open a binary output stream, optionally gzip or zstd framed; returns (stream, path)"""
+    if compression in (None, '', 'none'):
+        return open(filename, 'wb', buffering=1 << 20), filename
+    if compression == 'gzip':
+        path = filename + '.gz'
+        return gzip.open(path, 'wb', compresslevel=6), path
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package")
+        path = filename + '.zst'
+        raw = open(path, 'wb', buffering=1 << 20)
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True), path
+    raise ValueError(f"Unknown compression '{compression}', expected gzip or zstd")
+
+
+class StageProfiler:
+    """Per-collection stage timing, peak memory and optional CPU profiling"""
+    LOG_FILE = 'data_generator_profile.log'
+    CPU_PROFILE_FILE = 'data_generator.prof'
+    STACKS_FILE = 'data_generator.folded'
+
+    def __init__(self, enabled=False, cpu=None, track_memory=True, sample_interval=0.005):
+        self.enabled = enabled
+        self.cpu = cpu if enabled else None
+        self.track_memory = enabled and track_memory
+        self.sample_interval = sample_interval
+        self.records = {}
+        self._stack = []
+        self._profile = None
+        self._sampler = None
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._logger = None
+        if enabled:
+            self._setup_logger()
+
+    def _setup_logger(self):
+        """Structured JSON records go to their own file next to data_generator.log"""
+        self._logger = logging.getLogger('data_generator.profile')
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = logging.FileHandler(self.LOG_FILE)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+    def _emit(self, record):
+        record = {'ts': datetime.now().isoformat(timespec='milliseconds'), **record}
+        self._logger.info(json.dumps(record, default=str))
+
+    def start(self):
+        """Begin memory tracing and the selected CPU profiler"""
+        if not self.enabled:
+            return
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.cpu == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.cpu == 'sample':
+            self._target = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample_loop, name='stack-sampler', daemon=True)
+            self._sampler.start()
+        self._emit({'event': 'run_start', 'cpu': self.cpu, 'memory': self.track_memory})
+
+    def stop(self):
+        """Stop profilers, dump CPU output and log the per-stage summary"""
+        if not self.enabled:
+            return
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.CPU_PROFILE_FILE)
+            stats = pstats.Stats(self._profile)
+            for func, (_, ncalls, tottime, cumtime, _) in sorted(
+                    stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:25]:
+                self._emit({
+                    'event': 'cpu_hotspot',
+                    'function': f"{func[0]}:{func[1]}({func[2]})",
+                    'calls': ncalls,
+                    'self_s': round(tottime, 6),
+                    'cumulative_s': round(cumtime, 6)
+                })
+            self._emit({'event': 'cpu_profile', 'file': self.CPU_PROFILE_FILE})
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            with open(self.STACKS_FILE, 'w') as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            self._emit({'event': 'cpu_samples', 'file': self.STACKS_FILE, 'samples': sum(self._stacks.values())})
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._emit({'event': 'run_end', 'stages': len(self.records)})
+
+    def _sample_loop(self):
+        """Sample the main thread's stack into collapsed (flamegraph) format"""
+        while not self._stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            names.reverse()
+            stage = self._stack[-1]['key'] if self._stack else None
+            if stage:
+                names.insert(0, f"[{stage[0]}:{stage[1]}]")
+            self._stacks[';'.join(names)] += 1
+
+    @contextmanager
+    def stage(self, collection, name):
+        """Time a stage; repeated or nested entries accumulate into one record"""
+        if not self.enabled:
+            yield
+            return
+        memory = self.track_memory and tracemalloc.is_tracing()
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                outer = self._stack[-1]
+                outer['peak'] = max(outer['peak'], peak)
+            tracemalloc.reset_peak()
+        else:
+            current = 0
+        frame = {'key': (collection, name), 'base': current, 'peak': current}
+        self._stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stack.pop()
+            peak_bytes = 0
+            if memory:
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - frame['base']
+                if self._stack:
+                    outer = self._stack[-1]
+                    outer['peak'] = max(outer['peak'], peak)
+            record = self.records.setdefault(
+                (collection, name), {'seconds': 0.0, 'calls': 0, 'peak_bytes': 0})
+            record['seconds'] += elapsed
+            record['calls'] += 1
+            record['peak_bytes'] = max(record['peak_bytes'], peak_bytes)
+
+    def collection_done(self, collection, records):
+        """Log the stage records for a finished collection"""
+        if not self.enabled:
+            return
+        for (coll, name), record in self.records.items():
+            if coll != collection:
+                continue
+            self._emit({
+                'event': 'stage',
+                'collection': coll,
+                'stage': name,
+                'seconds': round(record['seconds'], 6),
+                'calls': record['calls'],
+                'peak_mb': round(record['peak_bytes'] / 1048576, 3),
+                'records': records,
+                'records_per_s': round(records / record['seconds'], 1) if record['seconds'] else None
+            })
+
+    def print_summary(self):
+        if not self.enabled or not self.records:
+            return
+        print("\nStage Profile:")
+        print(f"{'Collection':<14} {'Stage':<10} {'Seconds':>10} {'Peak MB':>10}")
+        print("-" * 47)
+        for (collection, name), record in self.records.items():
+            print(f"{collection:<14} {name:<10} {record['seconds']:>10.3f} {record['peak_bytes'] / 1048576:>10.2f}")
+        print(f"\nStructured records: {self.LOG_FILE}")
+        if self.cpu == 'cprofile':
+            print(f"cProfile stats: {self.CPU_PROFILE_FILE}")
+        elif self.cpu == 'sample':
+            print(f"Collapsed stacks: {self.STACKS_FILE}")
+
+
+class ValuePool:
+    """Faker values pre-sampled once per shard and drawn by index
+
+    Faker providers are slow per call, so each shard samples a fixed-size pool
+    of every expensive field up front and records pick from it with a seeded
+    RNG. IPs, UUIDs and datetimes never touch Faker: they are cut from bulk
+    random bytes in batches of the same size. Priming and batch refills
+    happen under a lock; threads that draw concurrently each take a fork(),
+    which shares the sampled values but has its own RNG and batches.
+    """
+    IP_FIRST_OCTETS = bytes(o for o in range(1, 224) if o not in (10, 127))
+
+    def __init__(self, fake, size=2000, seed=None):
+        self.fake = fake
+        self.size = size
+        self.rng = random.Random(seed)
+        self.now = datetime.now()
+        self._pools = {}
+        self._ips = []
+        self._uuids = []
+        self._lock = threading.Lock()
+
+    def prime(self, *fields):
+        """Sample the pools for the given Faker providers up front"""
+        with self._lock:
+            for field in fields:
+                if field not in self._pools:
+                    provider = getattr(self.fake, field)
+                    self._pools[field] = [provider() for _ in range(self.size)]
+        return self
+
+    def fork(self, seed=None):
+        """A pool over the same sampled values with its own RNG and IP/UUID batches"""
+        pool = ValuePool(self.fake, self.size, seed)
+        pool.now = self.now
+        pool._pools = self._pools
+        return pool
+
+    def draw(self, field):
+        """Pick a pooled value for a Faker provider such as 'city' or 'user_agent'"""
+        pool = self._pools.get(field)
+        if pool is None:
+            pool = self.prime(field)._pools[field]
+        return pool[self.rng.randrange(self.size)]
+
+    def ipv4(self):
+        with self._lock:
+            if not self._ips:
+                self._ips = self._ipv4_batch(self.size)
+            return self._ips.pop()
+
+    def uuid4(self):
+        with self._lock:
+            if not self._uuids:
+                self._uuids = self._uuid4_batch(self.size)
+            return self._uuids.pop()
+
+    def _ipv4_batch(self, count):
+        raw = bytearray(self.rng.randbytes(4 * count))
+        octets = self.IP_FIRST_OCTETS
+        for i in range(0, len(raw), 4):
+            raw[i] = octets[raw[i] % len(octets)]
+        raw = bytes(raw)
+        return [socket.inet_ntoa(raw[i:i + 4]) for i in range(0, len(raw), 4)]
+
+    def _uuid4_batch(self, count):
+        raw = self.rng.randbytes(16 * count).hex()
+        uuids = []
+        for i in range(0, len(raw), 32):
+            h = raw[i:i + 32]
+            variant = '89ab'[int(h[16], 16) & 3]
+            uuids.append(f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{variant}{h[17:20]}-{h[20:]}")
+        return uuids
+
+    def datetime_between(self, start, end=None):
+        """Whole-second datetime in [start, end], like Faker's date_time_between"""
+        end = end or self.now
+        span = int((end - start).total_seconds())
+        if span <= 0:
+            return start.replace(microsecond=0)
+        return start.replace(microsecond=0) + timedelta(seconds=self.rng.randrange(span + 1))
+
+
+class CasinoDataGenerator:
+    def __init__(self, profiler=None, pool_size=None, seed=None, compression=None):
         self.fake = Faker()
+        self.profiler = profiler or StageProfiler()
         self.config = configparser.ConfigParser()
         self.config.read('casino_admin.ini')
+        self.pool_size = pool_size or self.config.getint('GENERATOR', 'pool_size', fallback=2000)
+        self.seed = seed if seed is not None else self.config.getint('GENERATOR', 'seed', fallback=None)
+        if self.seed is not None:
+            random.seed(self.seed)
+            Faker.seed(self.seed)
+        self._shard = 0
         self._setup_logging()
+        self.serializer = RecordSerializer()
+        self.compression = compression or self.config.get('GENERATOR', 'compression', fallback=None)
+        self.block_size = self.config.getint('GENERATOR', 'block_size', fallback=5000)
+        self.files_written = []
         
     def _setup_logging(self):
         logging.basicConfig(
@@ -23,6 +332,13 @@ class CasinoDataGenerator:
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
 
+    def _new_pool(self, collection, *fields):
+        """Fresh value pool for the next shard, seeded deterministically when a seed is set"""
+        self._shard += 1
+        seed = None if self.seed is None else self.seed * 1000003 + self._shard
+        with self.profiler.stage(collection, 'pool'):
+            return ValuePool(self.fake, self.pool_size, seed).prime(*fields)
+
     def _generate_password(self):
         chars = string.ascii_letters + string.digits + "!@#$%^&*"
         password = [
@@ -38,125 +354,143 @@ class CasinoDataGenerator:
         roles = ['user'] * 85 + ['operator'] * 10 + ['admin'] * 5
         domains = ['gmail.com', 'yahoo.com', 'outlook.com', 'casino.test']
         
-        for _ in tqdm(range(count), desc="Generating Users"):
-            first_name = self.fake.first_name()
-            last_name = self.fake.last_name()
-            user = {
-                '_id': self.fake.uuid4(),
-                'email': f"{first_name.lower()}.{last_name.lower()}{random.randint(1,99)}@{random.choice(domains)}",
-                'password': bcrypt.hashpw(self._generate_password().encode(), bcrypt.gensalt()).decode(),
-                'role': random.choice(roles),
-                'balance': abs(round(random.gauss(5000, 3000), 2)),
-                'active': random.choices([True, False], weights=[95, 5])[0],
-                'created_at': self.fake.date_time_between(start_date='-2y', end_date='now'),
-                'updated_at': datetime.now(),
-                'metadata': {
-                    'ip': self.fake.ipv4(),
-                    'last_device': random.choice(['Windows', 'MacOS', 'iOS', 'Android']),
-                    'vip_status': random.choices([True, False], weights=[5, 95])[0]
+        pool = self._new_pool('users', 'first_name', 'last_name')
+        created_from = pool.now - timedelta(days=730)
+        
+        with self.profiler.stage('users', 'generate'):
+            for _ in tqdm(range(count), desc="Generating Users"):
+                first_name = pool.draw('first_name')
+                last_name = pool.draw('last_name')
+                with self.profiler.stage('users', 'hash'):
+                    password = bcrypt.hashpw(self._generate_password().encode(), bcrypt.gensalt()).decode()
+                user = {
+                    '_id': pool.uuid4(),
+                    'email': f"{first_name.lower()}.{last_name.lower()}{random.randint(1,99)}@{random.choice(domains)}",
+                    'password': password,
+                    'role': random.choice(roles),
+                    'balance': abs(round(random.gauss(5000, 3000), 2)),
+                    'active': random.choices([True, False], weights=[95, 5])[0],
+                    'created_at': pool.datetime_between(created_from),
+                    'updated_at': datetime.now(),
+                    'metadata': {
+                        'ip': pool.ipv4(),
+                        'last_device': random.choice(['Windows', 'MacOS', 'iOS', 'Android']),
+                        'vip_status': random.choices([True, False], weights=[5, 95])[0]
+                    }
                 }
-            }
-            users.append(user)
+                users.append(user)
             
-        self._save_to_json(users, 'users.json')
+        self._save_to_json(users, 'users.json', 'users')
         return users
 
     def generate_login_logs(self, users, logs_per_user=15):
         logs = []
-        for user in tqdm(users, desc="Generating Login Logs"):
-            base_date = user['created_at']
-            for _ in range(random.randint(1, logs_per_user)):
-                log = {
-                    '_id': self.fake.uuid4(),
-                    'user_id': user['_id'],
-                    'success': random.choices([True, False], weights=[85, 15])[0],
-                    'timestamp': self.fake.date_time_between(start_date=base_date, end_date='now'),
-                    'ip': self.fake.ipv4(),
-                    'user_agent': self.fake.user_agent(),
-                    'location': {
-                        'city': self.fake.city(),
-                        'country': self.fake.country_code()
+        pool = self._new_pool('login_logs', 'user_agent', 'city', 'country_code')
+        with self.profiler.stage('login_logs', 'generate'):
+            for user in tqdm(users, desc="Generating Login Logs"):
+                base_date = user['created_at']
+                for _ in range(random.randint(1, logs_per_user)):
+                    log = {
+                        '_id': pool.uuid4(),
+                        'user_id': user['_id'],
+                        'success': random.choices([True, False], weights=[85, 15])[0],
+                        'timestamp': pool.datetime_between(base_date),
+                        'ip': pool.ipv4(),
+                        'user_agent': pool.draw('user_agent'),
+                        'location': {
+                            'city': pool.draw('city'),
+                            'country': pool.draw('country_code')
+                        }
                     }
-                }
-                logs.append(log)
-        self._save_to_json(logs, 'login_logs.json')
+                    logs.append(log)
+        self._save_to_json(logs, 'login_logs.json', 'login_logs')
         return logs
 
     def generate_transactions(self, users, transactions_per_user=50):
         transactions = []
         game_types = ['blackjack', 'slots', 'roulette', 'poker']
+        pool = self._new_pool('transactions')
         
-        for user in tqdm(users, desc="Generating Transactions"):
-            balance = user['balance']
-            current_date = user['created_at']
-            
-            for _ in range(random.randint(10, transactions_per_user)):
-                tx_date = self.fake.date_time_between(start_date=current_date, end_date='now')
-                tx_type = random.choices(
-                    ['deposit', 'withdraw', 'game'],
-                    weights=[15, 10, 75]
-                )[0]
-                
-                if tx_type == 'game':
-                    amount = abs(round(random.gauss(balance * 0.05, balance * 0.02), 2))
-                    outcome = random.choices(['win', 'loss'], weights=[40, 60])[0]
-                    if outcome == 'loss':
-                        amount = -amount
-                else:
-                    amount = round(random.uniform(10, 5000), 2)
-                    if tx_type == 'withdraw':
-                        amount = -amount
+        with self.profiler.stage('transactions', 'generate'):
+            for user in tqdm(users, desc="Generating Transactions"):
+                balance = user['balance']
+                current_date = user['created_at']
                 
-                transaction = {
-                    '_id': self.fake.uuid4(),
-                    'user_id': user['_id'],
-                    'type': tx_type,
-                    'amount': amount,
-                    'balance_after': balance + amount,
-                    'date': tx_date,
-                    'game_type': random.choice(game_types) if tx_type == 'game' else None,
-                    'description': f"{tx_type.capitalize()} transaction",
-                    'device': random.choice(['mobile', 'desktop']),
-                    'ip': self.fake.ipv4()
-                }
-                transactions.append(transaction)
-                balance += amount
+                for _ in range(random.randint(10, transactions_per_user)):
+                    tx_date = pool.datetime_between(current_date)
+                    tx_type = random.choices(
+                        ['deposit', 'withdraw', 'game'],
+                        weights=[15, 10, 75]
+                    )[0]
+                    
+                    if tx_type == 'game':
+                        amount = abs(round(random.gauss(balance * 0.05, balance * 0.02), 2))
+                        outcome = random.choices(['win', 'loss'], weights=[40, 60])[0]
+                        if outcome == 'loss':
+                            amount = -amount
+                    else:
+                        amount = round(random.uniform(10, 5000), 2)
+                        if tx_type == 'withdraw':
+                            amount = -amount
+                    
+                    transaction = {
+                        '_id': pool.uuid4(),
+                        'user_id': user['_id'],
+                        'type': tx_type,
+                        'amount': amount,
+                        'balance_after': balance + amount,
+                        'date': tx_date,
+                        'game_type': random.choice(game_types) if tx_type == 'game' else None,
+                        'description': f"{tx_type.capitalize()} transaction",
+                        'device': random.choice(['mobile', 'desktop']),
+                        'ip': pool.ipv4()
+                    }
+                    transactions.append(transaction)
+                    balance += amount
                 
-        self._save_to_json(transactions, 'transactions.json')
+        self._save_to_json(transactions, 'transactions.json', 'transactions')
         return transactions
 
     def generate_admin_logs(self, users):
         admin_logs = []
         admins = [u for u in users if u['role'] == 'admin']
+        pool = self._new_pool('admin_logs')
         
-        for _ in tqdm(range(len(admins) * 10), desc="Generating Admin Logs"):
-            admin = random.choice(admins)
-            log = {
-                '_id': self.fake.uuid4(),
-                'user_id': admin['_id'],
-                'email': admin['email'],
-                'action': random.choice(['user_edit', 'config_change', 'reset_password']),
-                'timestamp': self.fake.date_time_between(
-                    start_date=admin['created_at'], 
-                    end_date='now'
-                ),
-                'ip': self.fake.ipv4(),
-                'details': {
-                    'target_user': random.choice(users)['email'],
-                    'changes': {'field': random.choice(['balance', 'status', 'role'])}
+        with self.profiler.stage('admin_logs', 'generate'):
+            for _ in tqdm(range(len(admins) * 10), desc="Generating Admin Logs"):
+                admin = random.choice(admins)
+                log = {
+                    '_id': pool.uuid4(),
+                    'user_id': admin['_id'],
+                    'email': admin['email'],
+                    'action': random.choice(['user_edit', 'config_change', 'reset_password']),
+                    'timestamp': pool.datetime_between(admin['created_at']),
+                    'ip': pool.ipv4(),
+                    'details': {
+                        'target_user': random.choice(users)['email'],
+                        'changes': {'field': random.choice(['balance', 'status', 'role'])}
+                    }
                 }
-            }
-            admin_logs.append(log)
+                admin_logs.append(log)
         
-        self._save_to_json(admin_logs, 'admin_logs.json')
+        self._save_to_json(admin_logs, 'admin_logs.json', 'admin_logs')
         return admin_logs
 
-    def _save_to_json(self, data, filename):
+    def _save_to_json(self, data, filename, collection=None):
+        collection = collection or filename.rsplit('.', 1)[0]
         try:
-            with open(filename, 'w') as f:
-                for item in tqdm(data, desc=f"Saving {filename}"):
-                    f.write(json.dumps(item, default=str) + '\n')
-            logging.info(f"Saved {len(data)} records to {filename}")
+            stream, path = open_output(filename, self.compression)
+            with stream, tqdm(total=len(data), desc=f"Saving {path}", unit='rec', mininterval=0.5) as progress:
+                for start in range(0, len(data), self.block_size):
+                    block = data[start:start + self.block_size]
+                    with self.profiler.stage(collection, 'serialize'):
+                        payload = self.serializer.encode_block(block)
+                    with self.profiler.stage(collection, 'write'):
+                        stream.write(payload)
+                    progress.update(len(block))
+            self.files_written.append(path)
+            logging.info(f"Saved {len(data)} records to {path}")
+            self.profiler.collection_done(collection, len(data))
         except Exception as e:
             logging.error(f"Error saving {filename}: {str(e)}")
             raise
@@ -164,6 +498,7 @@ class CasinoDataGenerator:
     def generate_all_data(self):
         try:
             print("Starting casino data generation...")
+            self.profiler.start()
             users = self.generate_users(5000)
             login_logs = self.generate_login_logs(users)
             transactions = self.generate_transactions(users)
@@ -174,12 +509,368 @@ class CasinoDataGenerator:
             print(f"- Login Logs: {len(login_logs)}")
             print(f"- Transactions: {len(transactions)}")
             print(f"- Admin Logs: {len(admin_logs)}")
-            print("\nFiles created: users.json, login_logs.json, transactions.json, admin_logs.json")
+            print(f"\nFiles created: {', '.join(self.files_written)}")
             
         except Exception as e:
             logging.error(f"Data generation failed: {str(e)}")
             print("Error occurred - check data_generator.log")
+        finally:
+            self.profiler.stop()
+            self.profiler.print_summary()
+
+
+class LatencyStats:
+    """Write latency samples per event kind, kept in a bounded reservoir"""
+    RESERVOIR = 20000
+
+    def __init__(self, seed=None):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.counts = Counter()
+
+    def add(self, kind, millis):
+        with self._lock:
+            self.counts[kind] += 1
+            bucket = self.samples.setdefault(kind, [])
+            if len(bucket) < self.RESERVOIR:
+                bucket.append(millis)
+            else:
+                slot = self._rng.randrange(self.counts[kind])
+                if slot < self.RESERVOIR:
+                    bucket[slot] = millis
+
+    def percentiles(self, kind=None, points=(50, 95, 99)):
+        with self._lock:
+            if kind is None:
+                values = [v for bucket in self.samples.values() for v in bucket]
+            else:
+                values = list(self.samples.get(kind, ()))
+        if not values:
+            return {p: None for p in points}
+        values.sort()
+        return {p: values[min(len(values) - 1, int(len(values) * p / 100))] for p in points}
+
+
+class LiveTrafficGenerator:
+    """Emit deposits, withdrawals, game rounds and logins into MongoDB at a target rate
+
+    A dispatcher thread schedules Poisson arrivals following the selected rate
+    profile and hands events to writer threads. Balance changes use an atomic
+    $inc and the post-image becomes the transaction's balance_after, so the
+    ledger stays consistent per user however many writers run concurrently.
+    Each writer draws from its own RNG and pool fork seeded from `seed`, so
+    no random state is shared between threads.
+    """
+    PROFILES = ('steady', 'burst', 'wave')
+    EVENT_WEIGHTS = {'deposit': 15, 'withdraw': 10, 'game': 65, 'login': 10}
+    GAME_TYPES = ['blackjack', 'slots', 'roulette', 'poker']
+
+    def __init__(self, config, rate=50.0, profile='steady', duration=None, workers=4,
+                 burst_factor=5.0, period=60.0, report_interval=5.0, seed=None, pool_size=2000):
+        if profile not in self.PROFILES:
+            raise ValueError(f"Unknown traffic profile '{profile}', expected one of: {', '.join(self.PROFILES)}")
+        self.config = config
+        self.rate = float(rate)
+        self.profile = profile
+        self.duration = duration
+        self.workers = workers
+        self.burst_factor = burst_factor
+        self.period = period
+        self.report_interval = report_interval
+        self.seed = seed
+        self.rng = random.Random(seed)
+        fake = Faker()
+        if seed is not None:
+            fake.seed_instance(seed)
+        self.pool = ValuePool(fake, pool_size, seed).prime('user_agent', 'city', 'country_code')
+        self.latency = LatencyStats(seed)
+        self.emitted = Counter()
+        self.rejected = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._queue = None
+        self._user_ids = []
+        self.started_at = None
+
+    def connect(self):
+        from pymongo import MongoClient
+        from transaction_router import TransactionRouter
+        from transaction_schema import TransactionCodec
+        mongo = self.config['MONGODB'] if self.config.has_section('MONGODB') else {}
+        self.client = MongoClient(
+            host=mongo.get('host', 'localhost'),
+            port=int(mongo.get('port', '27017')),
+            maxPoolSize=max(self.workers * 2, 10),
+            serverSelectionTimeoutMS=5000
+        )
+        self.client.server_info()
+        self.db = self.client[mongo.get('database', 'casino_db')]
+        self.transactions = TransactionRouter(
+            self.db, str(mongo.get('transactions_partitioned', 'false')).lower() in ('1', 'true', 'yes', 'on'),
+            codec=TransactionCodec(self.db) if mongo.get('transactions_schema', 'legacy') == 'compact' else None)
+        self._user_ids = [u['_id'] for u in self.db.users.find(
+            {'active': True, 'role': 'user'}, {'_id': 1}).limit(50000)]
+        if not self._user_ids:
+            raise RuntimeError("No active users to emit traffic for - load or generate users first")
+
+    def current_rate(self, elapsed):
+        """Target events/sec at a point in the run"""
+        if self.profile == 'burst':
+            in_burst = (elapsed % self.period) < self.period * 0.1
+            return self.rate * (self.burst_factor if in_burst else 1.0)
+        if self.profile == 'wave':
+            return self.rate * (1 + 0.8 * math.sin(2 * math.pi * elapsed / self.period))
+        return self.rate
+
+    def start(self):
+        """Start dispatcher, writers and the reporter in background threads"""
+        self.connect()
+        self._queue = queue.Queue(maxsize=max(100, int(self.rate * self.burst_factor)))
+        self.started_at = time.perf_counter()
+        self._threads = [threading.Thread(target=self._dispatch, name='traffic-dispatch', daemon=True)]
+        self._threads += [threading.Thread(target=self._write_loop, args=(i,), name=f'traffic-writer-{i}',
+                                           daemon=True)
+                          for i in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._report_loop, name='traffic-report', daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logging.info(f"Live traffic started: {self.rate}/s {self.profile} profile, {self.workers} writers")
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        summary = self.summary()
+        logging.info(f"Live traffic finished: {json.dumps(summary)}")
+        return summary
+
+    def run(self):
+        """Run in the foreground until the duration elapses or Ctrl+C"""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                if self.duration and time.perf_counter() - self.started_at >= self.duration:
+                    break
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            pass
+        summary = self.stop()
+        self._print_summary(summary)
+        return summary
+
+    def _dispatch(self):
+        next_at = time.perf_counter()
+        kinds = list(self.EVENT_WEIGHTS)
+        weights = list(self.EVENT_WEIGHTS.values())
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            target = self.current_rate(now - self.started_at)
+            if target <= 0:
+                time.sleep(0.05)
+                next_at = time.perf_counter()
+                continue
+            next_at += self.rng.expovariate(target)
+            delay = next_at - now
+            if delay > 0:
+                self._stop.wait(delay)
+            kind = self.rng.choices(kinds, weights=weights)[0]
+            try:
+                self._queue.put_nowait((kind, self.rng.choice(self._user_ids)))
+            except queue.Full:
+                with self._lock:
+                    self.errors['dropped'] += 1
+        for _ in range(self.workers):
+            self._queue.put(None)
+
+    def _write_loop(self, index):
+        seed = None if self.seed is None else f'{self.seed}:writer-{index}'
+        rng = random.Random(seed)
+        pool = self.pool.fork(seed)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            kind, user_id = item
+            started = time.perf_counter()
+            try:
+                if kind == 'login':
+                    self._emit_login(user_id, rng, pool)
+                elif not self._emit_transaction(kind, user_id, rng, pool):
+                    with self._lock:
+                        self.rejected[kind] += 1
+                    continue
+            except Exception as e:
+                with self._lock:
+                    self.errors[type(e).__name__] += 1
+                continue
+            self.latency.add(kind, (time.perf_counter() - started) * 1000)
+            with self._lock:
+                self.emitted[kind] += 1
+
+    def _emit_login(self, user_id, rng, pool):
+        self.db.login_logs.insert_one({
+            'user_id': user_id,
+            'success': rng.random() < 0.85,
+            'timestamp': datetime.now(),
+            'ip': pool.ipv4(),
+            'user_agent': pool.draw('user_agent'),
+            'location': {
+                'city': pool.draw('city'),
+                'country': pool.draw('country_code')
+            }
+        })
+
+    def _emit_transaction(self, tx_type, user_id, rng, pool):
+        from pymongo import ReturnDocument
+        if tx_type == 'game':
+            amount = round(abs(rng.gauss(50, 30)) + 1, 2)
+            if rng.random() >= 0.4:
+                amount = -amount
+        else:
+            amount = round(rng.uniform(10, 500), 2)
+            if tx_type == 'withdraw':
+                amount = -amount
+        query = {'_id': user_id}
+        if amount < 0:
+            query['balance'] = {'$gte': -amount}
+        user = self.db.users.find_one_and_update(
+            query,
+            {'$inc': {'balance': amount}, '$set': {'updated_at': datetime.now()}},
+            projection={'balance': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not user:
+            return False
+        try:
+            self.transactions.insert_one({
+                'user_id': user_id,
+                'type': tx_type,
+                'amount': amount,
+                'balance_after': user['balance'],
+                'date': datetime.now(),
+                'game_type': rng.choice(self.GAME_TYPES) if tx_type == 'game' else None,
+                'description': f"{tx_type.capitalize()} transaction",
+                'device': rng.choice(['mobile', 'desktop']),
+                'ip': pool.ipv4()
+            })
+        except Exception:
+            self.db.users.update_one({'_id': user_id}, {'$inc': {'balance': -amount}})
+            raise
+        return True
+
+    def mean_rate(self, start, end, steps=100):
+        """Average target rate between two offsets into the run"""
+        width = (end - start) / steps
+        return sum(self.current_rate(start + (i + 0.5) * width) for i in range(steps)) / steps
+
+    def _report_loop(self):
+        last_total, last_time = 0, time.perf_counter()
+        while not self._stop.wait(self.report_interval):
+            now = time.perf_counter()
+            with self._lock:
+                total = sum(self.emitted.values()) + sum(self.rejected.values())
+            achieved = (total - last_total) / (now - last_time)
+            target = self.mean_rate(last_time - self.started_at, now - self.started_at)
+            pct = self.latency.percentiles()
+            print(f"[{now - self.started_at:7.1f}s] target {target:8.1f}/s "
+                  f"achieved {achieved:8.1f}/s  p50 {self._fmt_ms(pct[50])}  p95 {self._fmt_ms(pct[95])}  "
+                  f"p99 {self._fmt_ms(pct[99])}  errors {sum(self.errors.values())}")
+            last_total, last_time = total, now
+
+    @staticmethod
+    def _fmt_ms(value):
+        return f"{value:6.1f}ms" if value is not None else "     -  "
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started_at
+        total = sum(self.emitted.values()) + sum(self.rejected.values())
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'profile': self.profile,
+            'target_rate': round(self.mean_rate(0, elapsed), 2) if elapsed else self.rate,
+            'achieved_rate': round(total / elapsed, 2) if elapsed else 0,
+            'events': dict(self.emitted),
+            'rejected': dict(self.rejected),
+            'errors': dict(self.errors),
+            'latency_ms': {
+                kind: {f"p{p}": round(v, 2) for p, v in self.latency.percentiles(kind).items() if v is not None}
+                for kind in self.latency.samples
+            }
+        }
+
+    def _print_summary(self, summary):
+        print("\nLive Traffic Summary:")
+        print(f"- Duration: {summary['elapsed_s']}s ({summary['profile']} profile)")
+        print(f"- Target rate: {summary['target_rate']}/s (mean over the run)")
+        print(f"- Achieved rate: {summary['achieved_rate']}/s")
+        for kind, count in sorted(summary['events'].items()):
+            lat = summary['latency_ms'].get(kind, {})
+            print(f"- {kind:<9} {count:>8}  p50 {lat.get('p50', '-')}ms  p95 {lat.get('p95', '-')}ms  p99 {lat.get('p99', '-')}ms")
+        if summary['rejected']:
+            print(f"- Rejected (insufficient funds): {summary['rejected']}")
+        if summary['errors']:
+            print(f"- Errors: {summary['errors']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate bulk casino test data")
+    parser.add_argument('--profile', action='store_true',
+                        help="time generate/serialize/write per collection and log structured records")
+    parser.add_argument('--profile-cpu', choices=['cprofile', 'sample'],
+                        help="also run cProfile or a sampling profiler (collapsed stacks for flamegraphs)")
+    parser.add_argument('--sample-interval', type=float, default=0.005,
+                        help="seconds between stack samples with --profile-cpu sample")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip tracemalloc peak tracking (it slows generation down)")
+    parser.add_argument('--pool-size', type=int,
+                        help="values pre-sampled per Faker field per shard (default: GENERATOR.pool_size or 2000)")
+    parser.add_argument('--seed', type=int,
+                        help="seed Faker, random and the value pools for reproducible output")
+    parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                        help="frame output files with gzip (.gz) or zstd (.zst)")
+    live = parser.add_argument_group('live traffic')
+    live.add_argument('--live', action='store_true',
+                      help="emit continuous traffic into MongoDB instead of writing JSON dumps")
+    live.add_argument('--rate', type=float, default=50.0, help="target events per second")
+    live.add_argument('--traffic-profile', choices=LiveTrafficGenerator.PROFILES, default='steady',
+                      help="steady rate, periodic bursts or a sine wave around --rate")
+    live.add_argument('--burst-factor', type=float, default=5.0, help="rate multiplier during bursts")
+    live.add_argument('--period', type=float, default=60.0, help="burst/wave period in seconds")
+    live.add_argument('--duration', type=float, help="stop after this many seconds (default: until Ctrl+C)")
+    live.add_argument('--workers', type=int, default=4, help="concurrent writer threads")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    generator = CasinoDataGenerator()
+    args = parse_args()
+    if args.live:
+        generator = CasinoDataGenerator(pool_size=args.pool_size, seed=args.seed)
+        traffic = LiveTrafficGenerator(
+            generator.config,
+            rate=args.rate,
+            profile=args.traffic_profile,
+            duration=args.duration,
+            workers=args.workers,
+            burst_factor=args.burst_factor,
+            period=args.period,
+            seed=args.seed,
+            pool_size=generator.pool_size
+        )
+        traffic.run()
+        sys.exit(0)
+    profiler = StageProfiler(
+        enabled=args.profile or bool(args.profile_cpu),
+        cpu=args.profile_cpu,
+        track_memory=not args.no_memory,
+        sample_interval=args.sample_interval
+    )
+    generator = CasinoDataGenerator(
+        profiler,
+        pool_size=args.pool_size,
+        seed=args.seed,
+        compression=args.compress
+    )
     generator.generate_all_data()
\ No newline at end of file
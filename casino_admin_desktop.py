@@ -4,6 +4,23 @@ import json
 import re
 from pymongo import MongoClient, ASCENDING, DESCENDING
 from bson import json_util, ObjectId
+from bson.raw_bson import RawBSONDocument
+from user_search import EmailSearch
+from reconciliation import BalanceReconciler
+import log_retention
+from log_retention import LogRetention
+import login_log_storage
+from transaction_router import TransactionRouter
+from transaction_schema import TransactionCodec
+import migrations
+from game_analytics import GameAnalytics
+from cohorts import CohortReport
+from geo_analytics import GeoAnalytics
+import statements
+from approx_stats import DistinctSketches, sampled_totals, OVERALL
+from login_monitor import LoginMonitor
+from login_limiter import LoginLimiter, LoginLogWriter
+import analytics_mirror
 from datetime import datetime, timedelta
 import bcrypt
 import getpass
@@ -12,6 +29,153 @@ import platform
 import time
 import random
 import string
+import csv
+import itertools
+import argparse
+import atexit
+from concurrent.futures import ThreadPoolExecutor, Future
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_AUTH = 3
+EXIT_DB = 4
+
+class ReportRows(list):
+    """Report rows plus whether they were served from the report cache or the analytics mirror"""
+
+    def __init__(self, rows=(), cached=False, from_mirror=False):
+        super().__init__(rows)
+        self.cached = cached
+        self.from_mirror = from_mirror
+
+class ReportCache:
+    """Report results keyed by (report, parameters), stamped with the data version they were built from
+
+    The console and the report server's worker threads share one cache, so
+    stale entries are dropped with pop() rather than del.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.entries = {}
+
+    def get(self, key, stamp):
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        entry_stamp, created, value = entry
+        if entry_stamp != stamp or (self.max_age and time.monotonic() - created > self.max_age):
+            self.entries.pop(key, None)
+            return None
+        return value
+
+    def put(self, key, stamp, value):
+        self.entries[key] = (stamp, time.monotonic(), value)
+
+    def clear(self):
+        self.entries.clear()
+
+class Row:
+    """Compact read-only-ish record for list screens; dict-style access keeps call sites unchanged"""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        """Like dict.get on the source document: absent (None) fields give `default`"""
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def keys(self):
+        return self.__slots__
+
+    def _asdict(self):
+        return {name: getattr(self, name, None) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self._asdict().items())})"
+
+class ListView:
+    """A list screen's projection plus the compact row type its documents decode into"""
+
+    def __init__(self, name, fields, extra=()):
+        self.fields = fields
+        self.projection = {field: 1 for field in fields if field != '_id'}
+        self.row_type = type(name, (Row,), {'__slots__': tuple(f.replace('.', '_') for f in fields) + tuple(extra)})
+
+    def decode(self, doc):
+        values = []
+        for field in self.fields:
+            value = doc
+            for part in field.split('.'):
+                value = value.get(part) if value is not None else None
+            values.append(value)
+        return self.row_type(*values)
+
+LIST_VIEWS = {
+    'user_list': ListView('UserRow', ('_id', 'email', 'role', 'balance', 'active')),
+    'user_pick': ListView('UserPickRow', ('_id', 'email', 'role')),
+    'transaction_list': ListView('TransactionRow', ('_id', 'date', 'type', 'amount', 'balance_after')),
+    'recent_transactions': ListView('RecentTransactionRow', ('_id', 'user_id', 'date', 'type', 'amount'),
+                                    extra=('email',)),
+    'admin_log_list': ListView('AdminLogRow', ('_id', 'timestamp', 'email', 'action')),
+    'admin_log_explorer': ListView('AdminLogExplorerRow', ('_id', 'timestamp', 'email', 'action', 'details.user_id',
+                                                           'details.target_user')),
+}
+
+class PagePrefetcher:
+    """Load neighbouring pages on a background thread while the current one is on screen"""
+
+    def __init__(self, fetch_page):
+        self.fetch_page = fetch_page
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='page-prefetch')
+        self.pages = {}
+
+    def get(self, page):
+        """Return a page, waiting on its prefetch if one is in flight"""
+        future = self.pages.get(page)
+        if future is not None and not future.cancelled():
+            try:
+                return future.result()
+            except Exception:
+                pass
+        rows = self.fetch_page(page)
+        self.pages[page] = Future()
+        self.pages[page].set_result(rows)
+        return rows
+
+    def prefetch(self, *pages):
+        for page in pages:
+            if page and page not in self.pages:
+                self.pages[page] = self.executor.submit(self.fetch_page, page)
+
+    def focus(self, page):
+        """Drop pages that are no longer next to `page` (cancels queued loads after a jump)"""
+        for other in list(self.pages):
+            if abs(other - page) > 1:
+                self.pages.pop(other).cancel()
+
+    def invalidate(self):
+        """Forget every loaded page, e.g. after an edit"""
+        for future in self.pages.values():
+            future.cancel()
+        self.pages.clear()
+
+    def close(self):
+        self.invalidate()
+        self.executor.shutdown(wait=False)
 
 class CasinoAdminDesktop:
     CONFIG_FILE = 'casino_admin.ini'
@@ -23,20 +187,53 @@ class CasinoAdminDesktop:
         'active': True
     }
     BATCH_SIZE = 1000
+    TRANSACTIONS_PER_PAGE = 50
 
     def clear_screen(self):
         """Clear console screen cross-platform"""
         os.system('cls' if platform.system() == 'Windows' else 'clear')
 
-    def __init__(self):
-        self.clear_screen()
-        print("Initializing Casino Admin System...")
-        time.sleep(0.5)
+    def __init__(self, interactive=True):
+        self.interactive = interactive
+        if interactive:
+            self.clear_screen()
+        self._status("Initializing Casino Admin System...")
+        if interactive:
+            time.sleep(0.5)
         self.load_config()
         self.connect_to_mongodb()
         self.initialize_database()
         self.current_user = None
         self.ensure_indexes()
+        self.data_versions = {}
+        self.report_cache = ReportCache(self.config.getint('APP', 'report_cache_max_age', fallback=300))
+        self.email_search = EmailSearch(self.users, self.config.getboolean('APP', 'email_index', fallback=True))
+        self.game_analytics = GameAnalytics(self.db, self.transaction_router)
+        self.cohorts = CohortReport(self.db, self.transaction_router)
+        self.statements = statements.StatementExporter(self.transaction_router, self.BATCH_SIZE)
+        self.approx_sample_size = self.config.getint('APP', 'approx_sample_size', fallback=20000)
+        self.distinct_login_users = DistinctSketches(
+            self.db, 'login_logs', self.login_logs.aggregate,
+            archive=lambda since, until: self.retention.iter_archive('login_logs', since, until),
+            archived_until=lambda: self.retention.archived_until('login_logs') if self.retention.enabled else None
+        )
+        self.distinct_transacting_users = DistinctSketches(
+            self.db, 'transactions', self.transaction_router.aggregate, time_field='date')
+        self.geo_analytics = GeoAnalytics(
+            self.db, self.login_logs,
+            archive=lambda since, until: self.retention.iter_archive('login_logs', since, until),
+            archived_until=lambda: self.retention.archived_until('login_logs') if self.retention.enabled else None
+        )
+        self.login_monitor = LoginMonitor.from_config(self.db, self.config)
+        self.login_limiter = LoginLimiter.from_config(self.config)
+        self.mirror = analytics_mirror.AnalyticsMirror.from_config(self.config)
+        self.reports_from_mirror = self.mirror is not None and self.config.getboolean('MIRROR', 'reports', fallback=False)
+        self.login_log_writer = LoginLogWriter(self.login_logs, on_flush=lambda n: self.bump_data_version('login_logs'))
+        atexit.register(self.login_log_writer.stop)
+
+    def _status(self, message):
+        """Print a status line; headless runs send it to stderr to keep stdout pipeable"""
+        print(message, file=sys.stdout if self.interactive else sys.stderr)
 
     def load_config(self):
         """Load or create configuration file"""
@@ -44,9 +241,9 @@ class CasinoAdminDesktop:
         if os.path.exists(self.CONFIG_FILE):
             try:
                 self.config.read(self.CONFIG_FILE)
-                print("✓ Configuration loaded")
+                self._status("✓ Configuration loaded")
             except Exception as e:
-                print(f"Error loading configuration: {str(e)}")
+                self._status(f"Error loading configuration: {str(e)}")
                 self.create_default_config()
         else:
             self.create_default_config()
@@ -64,16 +261,16 @@ class CasinoAdminDesktop:
             'timeout': '300'
         }
         self.save_config()
-        print("✓ Default configuration created")
+        self._status("✓ Default configuration created")
 
     def save_config(self):
         """Save configuration to file"""
         try:
             with open(self.CONFIG_FILE, 'w') as configfile:
                 self.config.write(configfile)
-            print("✓ Configuration saved")
+            self._status("✓ Configuration saved")
         except Exception as e:
-            print(f"Error saving configuration: {str(e)}")
+            self._status(f"Error saving configuration: {str(e)}")
 
     def connect_to_mongodb(self):
         """Connect to MongoDB with error handling"""
@@ -85,9 +282,11 @@ class CasinoAdminDesktop:
             )
             self.client.server_info()
             self.db = self.client[self.config['MONGODB']['database']]
-            print(f"✓ Connected to MongoDB at {self.config['MONGODB']['host']}:{self.config['MONGODB']['port']}")
+            self._status(f"✓ Connected to MongoDB at {self.config['MONGODB']['host']}:{self.config['MONGODB']['port']}")
         except Exception as e:
-            print(f"✗ Failed to connect to MongoDB: {str(e)}")
+            self._status(f"✗ Failed to connect to MongoDB: {str(e)}")
+            if not self.interactive:
+                raise ConnectionError(str(e))
             self.configure_mongodb()
 
     def configure_mongodb(self):
@@ -108,16 +307,33 @@ class CasinoAdminDesktop:
         try:
             self.users = self.db.users
             self.transactions = self.db.transactions
+            compact = self.config.get('MONGODB', 'transactions_schema', fallback='legacy') == 'compact'
+            self.transaction_router = TransactionRouter(
+                self.db, self.config.getboolean('MONGODB', 'transactions_partitioned', fallback=False),
+                codec=TransactionCodec(self.db) if compact else None)
             self.login_logs = self.db.login_logs
             self.admin_logs = self.db.admin_logs
             self.games = self.db.games
+            self._init_login_log_storage()
+            self.retention = LogRetention.from_config(self.db, self.config)
 
             if not self.users.find_one({'email': self.DEFAULT_ADMIN['email']}):
                 self.create_admin_user()
-            print("✓ Database initialized")
+            self._status("✓ Database initialized")
         except Exception as e:
-            print(f"✗ Database initialization failed: {str(e)}")
-            sys.exit(1)
+            self._status(f"✗ Database initialization failed: {str(e)}")
+            sys.exit(EXIT_DB)
+
+    def _init_login_log_storage(self):
+        """Create login_logs as a time-series collection when configured and not created yet"""
+        wanted = self.config.getboolean('MONGODB', 'login_logs_timeseries', fallback=False)
+        if wanted and 'login_logs' not in self.db.list_collection_names():
+            login_log_storage.create_timeseries(
+                self.db, 'login_logs', self.config.get('MONGODB', 'login_logs_granularity', fallback='hours'))
+            self._status("✓ Created login_logs as a time-series collection")
+        self.login_logs_timeseries = login_log_storage.is_timeseries(self.db, 'login_logs')
+        if wanted and not self.login_logs_timeseries:
+            self._status("⚠ login_logs is a plain collection; run 'migrate-login-logs' to convert it")
 
     def create_admin_user(self):
         """Create default admin user"""
@@ -128,21 +344,57 @@ class CasinoAdminDesktop:
             'updated_at': datetime.now()
         }
         self.users.insert_one(admin_data)
-        print(f"✓ Created admin user: {self.DEFAULT_ADMIN['email']}")
-        print("⚠ Default password: Admin123! (change this immediately)")
+        self._status(f"✓ Created admin user: {self.DEFAULT_ADMIN['email']}")
+        self._status("⚠ Default password: Admin123! (change this immediately)")
 
     def ensure_indexes(self):
         """Create database indexes for performance"""
         try:
             self.users.create_index([('email', ASCENDING)], unique=True)
-            self.transactions.create_index([('user_id', ASCENDING)])
-            self.transactions.create_index([('date', DESCENDING)])
-            self.login_logs.create_index([('user_id', ASCENDING)])
-            self.login_logs.create_index([('timestamp', DESCENDING)])
+            self.transaction_router.create_index([('user_id', ASCENDING)])
+            self.transaction_router.create_index([('date', DESCENDING)])
+            if self.login_logs_timeseries:
+                login_log_storage.ensure_indexes(self.login_logs)
+            else:
+                self.login_logs.create_index([('user_id', ASCENDING)])
+                self.login_logs.create_index([('timestamp', DESCENDING)])
             self.admin_logs.create_index([('timestamp', DESCENDING)])
-            print("✓ Database indexes created")
+            self.admin_logs.create_index([('timestamp', DESCENDING), ('_id', DESCENDING)])
+            self.admin_logs.create_index([('action', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)])
+            self.admin_logs.create_index([('email', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)])
+            self.admin_logs.create_index([('details.user_id', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)])
+            self.admin_logs.create_index([('details.target_user', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)])
+            EmailSearch.ensure_indexes(self.users)
+            BalanceReconciler.ensure_indexes(self.db, self.transaction_router)
+            GameAnalytics.ensure_indexes(self.db)
+            CohortReport.ensure_indexes(self.db)
+            GeoAnalytics.ensure_indexes(self.db, self.login_logs)
+            LoginMonitor.ensure_indexes(self.db)
+            for message in self.retention.ensure_indexes():
+                self._status(message)
+            self._status("✓ Database indexes created")
         except Exception as e:
-            print(f"✗ Error creating indexes: {str(e)}")
+            self._status(f"✗ Error creating indexes: {str(e)}")
+
+    def _raw(self, collection):
+        """Collection handle whose documents decode lazily (RawBSONDocument)"""
+        return collection.with_options(
+            codec_options=collection.codec_options.with_options(document_class=RawBSONDocument))
+
+    def find_rows(self, collection, view, query=None, sort=None, skip=0, limit=0):
+        """Fetch only a view's fields and decode each document into its compact row type"""
+        view = LIST_VIEWS[view]
+        if isinstance(collection, TransactionRouter):
+            docs = collection.find(query or {}, view.projection, sort=sort, skip=skip, limit=limit, wrap=self._raw)
+            return [view.decode(doc) for doc in docs]
+        cursor = self._raw(collection).find(query or {}, view.projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return [view.decode(doc) for doc in cursor]
 
     def log_action(self, action, details=None):
         """Log admin actions"""
@@ -168,44 +420,108 @@ class CasinoAdminDesktop:
         
         email = input("Email: ")
         password = getpass.getpass("Password: ")
-        
-        user = self.users.find_one({'email': email})
-        if not user:
-            print("\n✗ User not found!")
-            input("Press Enter to try again...")
-            return False
-            
-        if not user.get('active', True):
-            print("\n✗ Account disabled. Contact system administrator.")
-            input("Press Enter to try again...")
-            return False
-            
+
         try:
-            if bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
-                self.current_user = user
-                self.log_login_attempt(user['_id'], True)
-                print(f"\n✓ Welcome, {user['email']} ({user['role'].upper()})")
-                input("\nPress Enter to continue...")
-                return True
-            else:
-                self.log_login_attempt(user['_id'], False)
-                print("\n✗ Invalid password!")
-                input("Press Enter to try again...")
-                return False
+            user, error = self.authenticate(email, password)
         except Exception as e:
             print(f"\n✗ Login error: {str(e)}")
             input("Press Enter to try again...")
             return False
 
-    def log_login_attempt(self, user_id, success):
-        """Log login attempts"""
+        if not user:
+            print(f"\n✗ {error}")
+            input("Press Enter to try again...")
+            return False
+
+        print(f"\n✓ Welcome, {user['email']} ({user['role'].upper()})")
+        input("\nPress Enter to continue...")
+        return True
+
+    def authenticate(self, email, password):
+        """Check credentials and log the attempt; returns (user, error message)
+
+        Attempts over the failed-login limit for the email are refused
+        before the password hash is checked, and still logged. An allowed
+        attempt holds a limiter token until it succeeds.
+        """
+        limiter = self.login_limiter
+        wait = limiter.check(email) if limiter else 0
+        if wait:
+            user = self.users.find_one({'email': email}, {'_id': 1})
+            if user:
+                self.log_login_attempt(user['_id'], False, blocked=True)
+            return None, f"Too many failed attempts. Try again in {wait:.0f} seconds."
+
+        user = self.users.find_one({'email': email})
+        if not user:
+            return None, "User not found!"
+
+        if not user.get('active', True):
+            return None, "Account disabled. Contact system administrator."
+
+        if bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+            self.current_user = user
+            if limiter:
+                limiter.succeeded(email)
+            self.log_login_attempt(user['_id'], True)
+            return user, None
+
+        self.log_login_attempt(user['_id'], False)
+        return None, "Invalid password!"
+
+    def log_login_attempt(self, user_id, success, blocked=False):
+        """Log login attempts; failures are batched, a success is written at once"""
         log_entry = {
             'user_id': user_id,
             'success': success,
             'timestamp': datetime.now(),
             'ip': '127.0.0.1'
         }
-        self.login_logs.insert_one(log_entry)
+        if blocked:
+            log_entry['blocked'] = True
+        self.login_log_writer.add(log_entry)
+        if success:
+            self.login_log_writer.flush()
+
+    def bump_data_version(self, collection):
+        """Mark a collection as written by this process so dependent cached reports recompute"""
+        self.data_versions[collection] = self.data_versions.get(collection, 0) + 1
+
+    def _data_stamp(self, collections):
+        """Local write counters plus a cheap fingerprint that catches other writers' inserts"""
+        stamp = []
+        names = []
+        for name in collections:
+            names.extend(self.transaction_router.names() if name == 'transactions' else [name])
+        for name in names:
+            collection = self.db[name]
+            if name == 'login_logs' and self.login_logs_timeseries:
+                # Time-series collections are views over buckets: no cheap count or $natural order
+                newest = collection.find_one({}, {'timestamp': 1}, sort=[('timestamp', DESCENDING)])
+                stamp.append((name, self.data_versions.get(name, 0), newest['timestamp'] if newest else None))
+                continue
+            newest = collection.find_one({}, {'_id': 1}, sort=[('$natural', DESCENDING)])
+            stamp.append((
+                name,
+                self.data_versions.get(name, 0),
+                collection.estimated_document_count(),
+                newest['_id'] if newest else None
+            ))
+        return tuple(stamp)
+
+    def _cached_report(self, report, params, collections, compute):
+        """Serve a report from the cache while its source collections are unchanged
+
+        Returns ReportRows, so callers on any thread can tell whether the rows came from the cache.
+        """
+        key = (report, tuple(sorted(params.items())))
+        stamp = self._data_stamp(collections)
+        result = self.report_cache.get(key, stamp)
+        if result is not None:
+            return ReportRows(result, cached=True)
+        result = compute()
+        self.report_cache.put(key, stamp, result)
+        return ReportRows(result)
 
     def show_main_menu(self):
         """Display main menu and handle user input"""
@@ -297,10 +613,11 @@ class CasinoAdminDesktop:
             print("║ 1. View User Transactions      ║")
             print("║ 2. Add Manual Transaction      ║")
             print("║ 3. Recent Transactions Report  ║")
-            print("║ 4. Back to Main Menu           ║")
+            print("║ 4. Export Statements           ║")
+            print("║ 5. Back to Main Menu           ║")
             print("╚════════════════════════════════╝")
             
-            choice = input("\nSelect option (1-4): ")
+            choice = input("\nSelect option (1-5): ")
             
             if choice == '1':
                 self.view_transactions()
@@ -309,6 +626,8 @@ class CasinoAdminDesktop:
             elif choice == '3':
                 self.recent_transactions_report()
             elif choice == '4':
+                self.export_statements()
+            elif choice == '5':
                 return
             else:
                 print("Invalid option!")
@@ -325,10 +644,16 @@ class CasinoAdminDesktop:
             print("║ 2. Admin Logs              ║")
             print("║ 3. Deposit/Withdraw Report ║")
             print("║ 4. Export Data             ║")
-            print("║ 5. Back to Main Menu       ║")
+            print("║ 5. Balance Reconciliation  ║")
+            print("║ 6. Game Analytics          ║")
+            print("║ 7. Security Alerts         ║")
+            print("║ 8. Cohort Retention        ║")
+            print("║ 9. Geographic Logins       ║")
+            print("║ 10. Analytics Mirror       ║")
+            print("║ 11. Back to Main Menu      ║")
             print("╚════════════════════════════╝")
             
-            choice = input("\nSelect option (1-5): ")
+            choice = input("\nSelect option (1-11): ")
             
             if choice == '1':
                 self.user_activity_report()
@@ -339,6 +664,18 @@ class CasinoAdminDesktop:
             elif choice == '4':
                 self.export_data()
             elif choice == '5':
+                self.balance_reconciliation()
+            elif choice == '6':
+                self.game_analytics_report()
+            elif choice == '7':
+                self.security_alerts()
+            elif choice == '8':
+                self.cohort_report()
+            elif choice == '9':
+                self.geo_report()
+            elif choice == '10':
+                self.analytics_mirror_menu()
+            elif choice == '11':
                 return
             else:
                 print("Invalid option!")
@@ -354,10 +691,11 @@ class CasinoAdminDesktop:
             print("║ 1. MongoDB Configuration       ║")
             print("║ 2. System Settings             ║")
             print("║ 3. Import Data                 ║")
-            print("║ 4. Back to Main Menu           ║")
+            print("║ 4. Log Retention               ║")
+            print("║ 5. Back to Main Menu           ║")
             print("╚════════════════════════════════╝")
             
-            choice = input("\nSelect option (1-4): ")
+            choice = input("\nSelect option (1-5): ")
             
             if choice == '1':
                 self.configure_mongodb()
@@ -366,6 +704,8 @@ class CasinoAdminDesktop:
             elif choice == '3':
                 self.import_data()
             elif choice == '4':
+                self.log_retention()
+            elif choice == '5':
                 return
             else:
                 print("Invalid option!")
@@ -373,16 +713,29 @@ class CasinoAdminDesktop:
 
     def list_users(self, page: int = 1, per_page: int = 20):
         """List users with pagination"""
+        prefetcher = PagePrefetcher(lambda p: list(
+            self.find_rows(self.users, 'user_list', skip=(p - 1) * per_page, limit=per_page)))
+        try:
+            self._list_users_loop(prefetcher, page, per_page)
+        finally:
+            prefetcher.close()
+
+    def _list_users_loop(self, prefetcher, page, per_page):
+        total = None
         while True:
             self.clear_screen()
             skip = (page - 1) * per_page
             try:
-                users = list(self.users.find().skip(skip).limit(per_page))
-                total = self.users.count_documents({})
+                if total is None:
+                    total = self.users.count_documents({})
+                users = prefetcher.get(page)
             except Exception as e:
                 print(f"Error loading users: {str(e)}")
                 input("Press Enter to continue...")
                 return
+            last_page = max(1, (total + per_page - 1) // per_page)
+            prefetcher.focus(page)
+            prefetcher.prefetch(page + 1 if page < last_page else None, page - 1)
             
             print(f"╔═══════════════════════════════════════════════════════════════╗")
             print(f"║                    USER LIST (Page {page})                      ║")
@@ -395,21 +748,28 @@ class CasinoAdminDesktop:
                 print(f"║ {idx:<4} {user['email'][:24]:<25} {user['role'][:7]:<8} ${user.get('balance', 0):<7.2f} {status:<8} ║")
             
             print(f"╚═══════════════════════════════════════════════════════════════╝")
-            print(f"\nPage {page} of {max(1, (total + per_page - 1) // per_page)} ({total} total users)")
+            print(f"\nPage {page} of {last_page} ({total} total users)")
             
-            print("\nActions: [N]ext, [P]revious, [V]iew details, [E]dit, [D]elete, [B]ack")
+            print("\nActions: [N]ext, [P]revious, [G]o to page, [V]iew details, [E]dit, [D]elete, [B]ack")
             nav = input("Choose action: ").lower()
             
             if nav == 'n' and page * per_page < total:
                 page += 1
             elif nav == 'p' and page > 1:
                 page -= 1
+            elif nav == 'g':
+                target = input(f"Page (1-{last_page}): ")
+                if target.isdigit() and 1 <= int(target) <= last_page:
+                    page = int(target)
             elif nav == 'v':
                 self.view_user_details(users, skip)
             elif nav == 'e':
                 self.edit_user_from_list(users, skip)
+                prefetcher.invalidate()
             elif nav == 'd':
                 self.delete_user_from_list(users, skip)
+                prefetcher.invalidate()
+                total = None
             elif nav == 'b':
                 return
             else:
@@ -421,7 +781,11 @@ class CasinoAdminDesktop:
         try:
             user_idx = int(input("\nEnter user number to view details (0 to cancel): ")) - 1 - skip
             if 0 <= user_idx < len(users):
-                user = users[user_idx]
+                user = self.users.find_one({'_id': users[user_idx]['_id']}, {'password': 0})
+                if not user:
+                    print("User not found!")
+                    input("Press Enter to continue...")
+                    return
                 self.clear_screen()
                 print("╔════════════════════════════════════════╗")
                 print("║           USER DETAILS                 ║")
@@ -433,7 +797,7 @@ class CasinoAdminDesktop:
                 print(f"Created: {user.get('created_at', 'Unknown')}")
                 print(f"Last Updated: {user.get('updated_at', 'Unknown')}")
                 
-                tx_count = self.transactions.count_documents({'user_id': user['_id']})
+                tx_count = self.transaction_router.count_documents({'user_id': user['_id']})
                 last_login = self.login_logs.find_one(
                     {'user_id': user['_id'], 'success': True},
                     sort=[('timestamp', DESCENDING)]
@@ -745,7 +1109,8 @@ class CasinoAdminDesktop:
             'description': f"Manual balance adjustment by admin {self.current_user['email']}",
             'date': datetime.now()
         }
-        self.transactions.insert_one(transaction_data)
+        self.transaction_router.insert_one(transaction_data)
+        self.bump_data_version('transactions')
         self.log_action("create_transaction", {"user_id": str(user_id), "amount": amount, "type": tx_type})
 
     def _select_user(self):
@@ -755,17 +1120,15 @@ class CasinoAdminDesktop:
         print("║      SELECT USER           ║")
         print("╚════════════════════════════╝\n")
         
-        search_email = input("Enter user email (or leave blank to list all users): ").strip()
+        search_email = input("Enter user email, prefix or part of it (or leave blank to list all users): ").strip()
         if search_email:
-            user = self.users.find_one({'email': search_email})
+            user = self.users.find_one({'email': search_email}, {'_id': 1})
             if user:
                 return user['_id']
-            print("User not found!")
-            input("Press Enter to continue...")
-            return None
+            return self._pick_search_result(search_email)
         
         try:
-            users = list(self.users.find().limit(20))
+            users = self.find_rows(self.users, 'user_pick', limit=20)
             if not users:
                 print("No users found!")
                 input("Press Enter to continue...")
@@ -797,27 +1160,90 @@ class CasinoAdminDesktop:
             input("Press Enter to continue...")
             return None
 
+    def _pick_search_result(self, text, per_page=20):
+        """Show ranked, paged email matches and return the chosen user's id"""
+        try:
+            matches = self.email_search.search(text)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            input("Press Enter to continue...")
+            return None
+        if not matches:
+            print("User not found!")
+            input("Press Enter to continue...")
+            return None
+
+        page = 0
+        pages = (len(matches) + per_page - 1) // per_page
+        while True:
+            self.clear_screen()
+            print(f"Matches for '{text}': {len(matches)} ({self.email_search.last_elapsed_ms:.1f} ms)\n")
+            start = page * per_page
+            for idx, (_, email, _, role) in enumerate(matches[start:start + per_page], start + 1):
+                print(f"{idx}. {email} ({role})")
+            print(f"\nPage {page + 1} of {pages}")
+            choice = input("\nEnter user number, [N]ext, [P]revious or 0 to cancel: ").strip().lower()
+            if choice == 'n' and page + 1 < pages:
+                page += 1
+            elif choice == 'p' and page > 0:
+                page -= 1
+            elif choice.isdigit():
+                choice_idx = int(choice) - 1
+                if choice_idx == -1:
+                    return None
+                if 0 <= choice_idx < len(matches):
+                    return matches[choice_idx][2]
+                print("Invalid selection!")
+                input("Press Enter to continue...")
+
     def view_transactions(self):
         """View transactions for a specific user"""
         user_id = self._select_user()
         if not user_id:
             return
             
+        per_page = self.TRANSACTIONS_PER_PAGE
+        prefetcher = PagePrefetcher(
+            lambda p: list(self.get_user_transactions(user_id, per_page, skip=(p - 1) * per_page)))
+        page = 1
         try:
-            transactions = list(self.transactions.find({'user_id': user_id}).sort('date', DESCENDING).limit(50))
-            self.clear_screen()
-            print(f"╔══════════════════════════════════════════════════════════╗")
-            print(f"║                  USER TRANSACTIONS                      ║")
-            print(f"╠══════════════════════════════════════════════════════════╣")
-            print(f"║ {'Date':<20} {'Type':<12} {'Amount':<10} {'Balance':<10} ║")
-            for tx in transactions:
-                date_str = tx['date'].strftime("%Y-%m-%d %H:%M")
-                print(f"║ {date_str:<20} {tx['type'][:11]:<12} ${tx['amount']:<9.2f} ${tx['balance_after']:<9.2f} ║")
-            print(f"╚══════════════════════════════════════════════════════════╝")
-            input("\nPress Enter to continue...")
+            total = self.transaction_router.count_documents({'user_id': user_id})
+            last_page = max(1, (total + per_page - 1) // per_page)
+            while True:
+                transactions = prefetcher.get(page)
+                prefetcher.focus(page)
+                prefetcher.prefetch(page + 1 if page < last_page else None, page - 1)
+                self.clear_screen()
+                print(f"╔══════════════════════════════════════════════════════════╗")
+                print(f"║                  USER TRANSACTIONS                      ║")
+                print(f"╠══════════════════════════════════════════════════════════╣")
+                print(f"║ {'Date':<20} {'Type':<12} {'Amount':<10} {'Balance':<10} ║")
+                for tx in transactions:
+                    date_str = tx['date'].strftime("%Y-%m-%d %H:%M")
+                    print(f"║ {date_str:<20} {tx['type'][:11]:<12} ${tx['amount']:<9.2f} ${tx['balance_after']:<9.2f} ║")
+                print(f"╚══════════════════════════════════════════════════════════╝")
+                print(f"\nPage {page} of {last_page} ({total} transactions)")
+                nav = input("\n[N]ext, [P]revious, [G]o to page, [B]ack: ").lower()
+                if nav == 'n' and page < last_page:
+                    page += 1
+                elif nav == 'p' and page > 1:
+                    page -= 1
+                elif nav == 'g':
+                    target = input(f"Page (1-{last_page}): ")
+                    if target.isdigit() and 1 <= int(target) <= last_page:
+                        page = int(target)
+                elif nav in ('b', ''):
+                    return
         except Exception as e:
             print(f"Error loading transactions: {str(e)}")
             input("Press Enter to continue...")
+        finally:
+            prefetcher.close()
+
+    def get_user_transactions(self, user_id, limit=50, skip=0):
+        """Latest transactions for a user, newest first"""
+        return self.find_rows(self.transaction_router, 'transaction_list', {'user_id': user_id},
+                              sort=[('date', DESCENDING)], skip=skip, limit=limit)
 
     def add_transaction(self):
         """Add manual transaction"""
@@ -898,51 +1324,275 @@ class CasinoAdminDesktop:
             print("╚════════════════════════════════════════╝\n")
             
             days = int(input("Enter days to report (7/30/90): ") or 7)
-            cutoff_date = datetime.now() - timedelta(days=days)
-            
-            pipeline = [
-                {'$match': {'timestamp': {'$gte': cutoff_date}}},
-                {'$group': {
-                    '_id': '$user_id',
-                    'last_login': {'$max': '$timestamp'},
-                    'success_count': {'$sum': {'$cond': ['$success', 1, 0]}},
-                    'failed_count': {'$sum': {'$cond': ['$success', 0, 1]}}
-                }},
-                {'$sort': {'last_login': DESCENDING}}
-            ]
-            
-            results = list(self.login_logs.aggregate(pipeline))
+            if input("Fast approximate summary? [y/N]: ").strip().lower() == 'y':
+                started = time.perf_counter()
+                estimates = self.estimate_user_activity(days)
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"\n{'Metric':<20} {'Estimate':>12}   {'95% CI':<10}")
+                print("-" * 46)
+                for entry in estimates:
+                    print(f"{entry['metric']:<20} {entry['estimate']:>12.0f} ± {entry['error']:<10.0f}")
+                print(f"\nEstimated in {elapsed:.0f} ms")
+                if input("\nRun the exact per-user report? [y/N]: ").strip().lower() != 'y':
+                    return
+            results = self.get_user_activity(days)
+            if results.cached:
+                print("\n(served from cache - no new logins since last run)")
+            elif results.from_mirror:
+                print(f"\n(from the analytics mirror as of {self.mirror_synced_at('login_logs')})")
             
             print(f"\n{'Email':<25} {'Last Login':<20} {'Success':<8} {'Failed':<8}")
             print("-" * 65)
             for entry in results:
-                user = self.users.find_one({'_id': entry['_id']})
-                email = user['email'] if user else 'Deleted User'
                 last_login = entry['last_login'].strftime("%Y-%m-%d %H:%M")
-                print(f"{email[:24]:<25} {last_login:<20} {entry['success_count']:<8} {entry['failed_count']:<8}")
+                print(f"{entry['email'][:24]:<25} {last_login:<20} {entry['success_count']:<8} {entry['failed_count']:<8}")
             
             input("\nPress Enter to continue...")
         except Exception as e:
             print(f"Error generating report: {str(e)}")
             input("Press Enter to continue...")
 
-    def view_admin_logs(self):
-        """View admin action logs"""
-        try:
-            logs = list(self.admin_logs.find().sort('timestamp', DESCENDING).limit(50))
+    def get_user_activity(self, days):
+        """Login counts per user over the last `days`, most recent login first"""
+        if self.reports_from_mirror:
+            rows = self._mirror_report(lambda: self.mirror.user_activity(datetime.now() - timedelta(days=days)))
+            if rows is not None:
+                return rows
+        return self._cached_report('user_activity', {'days': days}, ('login_logs', 'users'),
+                                   lambda: list(self._iter_user_activity(days)))
+
+    def _iter_user_activity(self, days):
+        cutoff_date = datetime.now() - timedelta(days=days)
+        archive_since, hot_since = self.retention.split('login_logs', cutoff_date)
+        entries = self.login_logs.aggregate(self._user_activity_pipeline(hot_since))
+        if archive_since:
+            entries = self._merge_archived_activity(entries, archive_since, hot_since)
+        batch = []
+        for entry in entries:
+            batch.append({
+                'user_id': entry['_id'],
+                'last_login': entry['last_login'],
+                'success_count': entry['success_count'],
+                'failed_count': entry['failed_count']
+            })
+            if len(batch) >= self.BATCH_SIZE:
+                yield from self._with_emails(batch)
+                batch = []
+        yield from self._with_emails(batch)
+
+    def _user_activity_pipeline(self, since):
+        """Per-user login counts since a date
+
+        The leading timestamp $match is rewritten to a bucket-bounds filter on
+        time-series storage, the $project keeps bucket unpacking to three
+        fields, and grouping on the metaField (user_id) never splits a bucket.
+        """
+        return [
+            {'$match': {'timestamp': {'$gte': since}}},
+            {'$project': {'_id': 0, 'user_id': 1, 'timestamp': 1, 'success': 1}},
+            {'$group': {
+                '_id': '$user_id',
+                'last_login': {'$max': '$timestamp'},
+                'success_count': {'$sum': {'$cond': ['$success', 1, 0]}},
+                'failed_count': {'$sum': {'$cond': ['$success', 0, 1]}}
+            }},
+            {'$sort': {'last_login': DESCENDING}}
+        ]
+
+    def _merge_archived_activity(self, entries, since, until):
+        """Fold archived login attempts into the hot per-user groups"""
+        groups = {entry['_id']: entry for entry in entries}
+        for log in self.retention.iter_archive('login_logs', since, until):
+            entry = groups.setdefault(log['user_id'], {
+                '_id': log['user_id'], 'last_login': log['timestamp'], 'success_count': 0, 'failed_count': 0})
+            entry['last_login'] = max(entry['last_login'], log['timestamp'])
+            entry['success_count' if log.get('success') else 'failed_count'] += 1
+        return sorted(groups.values(), key=lambda entry: entry['last_login'], reverse=True)
+
+    def _with_emails(self, entries, key='user_id'):
+        """Attach owner emails to rows keyed by user id, one users query per batch"""
+        if not entries:
+            return entries
+        ids = list({entry[key] for entry in entries})
+        emails = {u['_id']: u['email'] for u in self.users.find({'_id': {'$in': ids}}, {'email': 1})}
+        for entry in entries:
+            entry['email'] = emails.get(entry[key], 'Deleted User')
+        return entries
+
+    def view_admin_logs(self, per_page=20):
+        """Browse admin action logs with filters, newest first, paging by keyset cursor"""
+        filters = {}
+        cursors = [None]
+        while True:
             self.clear_screen()
-            print("╔════════════════════════════════════════════════╗")
-            print("║               ADMIN ACTION LOGS               ║")
-            print("╠════════════════════════════════════════════════╣")
-            print(f"║ {'Timestamp':<19} {'Admin':<25} {'Action':<15} ║")
+            try:
+                started = time.perf_counter()
+                logs = self.query_admin_logs(after=cursors[-1], limit=per_page + 1, **filters)
+                elapsed = (time.perf_counter() - started) * 1000
+            except Exception as e:
+                print(f"Error loading logs: {str(e)}")
+                input("Press Enter to continue...")
+                return
+            has_next = len(logs) > per_page
+            logs = logs[:per_page]
+
+            targets = self._admin_log_targets(logs)
+            print("╔══════════════════════════════════════════════════════════════════════════════╗")
+            print("║                              ADMIN ACTION LOGS                               ║")
+            print("╠══════════════════════════════════════════════════════════════════════════════╣")
+            print(f"║ {'Timestamp':<16} {'Admin':<22} {'Action':<18} {'Target User':<17} ║")
             for log in logs:
                 timestamp = log['timestamp'].strftime("%Y-%m-%d %H:%M")
-                print(f"║ {timestamp:<19} {log['email'][:24]:<25} {log['action'][:14]:<15} ║")
-            print("╚════════════════════════════════════════════════╝")
-            input("\nPress Enter to continue...")
-        except Exception as e:
-            print(f"Error loading logs: {str(e)}")
+                target = targets.get(log.get('details_user_id')) or log.get('details_target_user') or '-'
+                print(f"║ {timestamp:<16} {log['email'][:21]:<22} {log['action'][:17]:<18} {target[:17]:<17} ║")
+            print("╚══════════════════════════════════════════════════════════════════════════════╝")
+            shown = dict(filters)
+            if 'until' in shown:
+                shown['until'] = shown['until'] - timedelta(days=1)
+            active = ', '.join(f"{k}={v.strftime('%Y-%m-%d') if isinstance(v, datetime) else v}"
+                               for k, v in shown.items()) or 'none'
+            print(f"\nPage {len(cursors)} ({len(logs)} entries, {elapsed:.1f} ms) - Filters: {active}")
+
+            nav = input("\nActions: [N]ext, [P]revious, [F]ilter, [C]lear filters, [B]ack: ").lower()
+            if nav == 'n' and has_next:
+                cursors.append((logs[-1]['timestamp'], logs[-1]['_id']))
+            elif nav == 'p' and len(cursors) > 1:
+                cursors.pop()
+            elif nav == 'f':
+                new_filters = self._prompt_admin_log_filters()
+                if new_filters is not None:
+                    filters = new_filters
+                    cursors = [None]
+            elif nav == 'c':
+                filters = {}
+                cursors = [None]
+            elif nav == 'b':
+                return
+            elif nav not in ('n', 'p'):
+                print("Invalid option!")
+                input("Press Enter to continue...")
+
+    def _admin_log_targets(self, logs):
+        """Map the target user ids on a page of logs to emails with one users query"""
+        ids = {log.get('details_user_id') for log in logs} - {None}
+        emails = {str(u['_id']): u['email']
+                  for u in self.users.find({'_id': {'$in': self._id_variants(*ids)}}, {'email': 1})}
+        return {i: emails.get(i, f"Deleted ({i[-6:]})") for i in ids}
+
+    @staticmethod
+    def _id_variants(*ids):
+        """User ids as stored: ObjectIds for console-created users, strings (uuid4) for imported ones"""
+        variants = []
+        for i in ids:
+            variants.append(str(i))
+            if ObjectId.is_valid(i):
+                variants.append(ObjectId(i))
+        return variants
+
+    def find_target_user(self, target):
+        """A user by email or id (ObjectId or string), or None"""
+        return self.users.find_one({'$or': [{'email': target}, {'_id': {'$in': self._id_variants(target)}}]},
+                                   {'_id': 1, 'email': 1})
+
+    def _prompt_admin_log_filters(self):
+        """Ask for explorer filters; blank answers leave a filter unset"""
+        filters = {}
+        action = input("Action (e.g. edit_user, create_transaction): ").strip()
+        if action:
+            filters['action'] = action
+        admin_email = input("Admin email: ").strip()
+        if admin_email:
+            filters['admin_email'] = admin_email
+        target = input("Target user email or id: ").strip()
+        if target:
+            user = self.find_target_user(target)
+            if user:
+                filters['target_user_id'] = str(user['_id'])
+            elif '@' not in target:
+                filters['target_user_id'] = target  # a deleted user's id
+            else:
+                print("User not found!")
+                input("Press Enter to continue...")
+                return None
+        try:
+            since = input("From date (YYYY-MM-DD): ").strip()
+            if since:
+                filters['since'] = datetime.strptime(since, "%Y-%m-%d")
+            until = input("To date, inclusive (YYYY-MM-DD): ").strip()
+            if until:
+                filters['until'] = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            print("Invalid date format!")
             input("Press Enter to continue...")
+            return None
+        return filters
+
+    def query_admin_logs(self, action=None, admin_email=None, target_user_id=None,
+                         since=None, until=None, after=None, limit=50):
+        """Filtered admin log entries, newest first, starting after a (timestamp, _id) cursor
+
+        Equality filters lead and timestamp/_id follow, matching the compound
+        (field, timestamp, _id) indexes, so every page is an index range scan.
+        Entries older than the retention high-water mark come from the
+        archive once the hot collection runs out. A target user matches
+        details.user_id, or details.target_user (an email) in imported logs.
+        """
+        filters = {}
+        if action:
+            filters['action'] = action
+        if admin_email:
+            filters['email'] = admin_email
+        if target_user_id:
+            user = self.find_target_user(str(target_user_id))
+            if user:
+                filters['$or'] = [{'details.user_id': str(target_user_id)}, {'details.target_user': user['email']}]
+            else:
+                filters['details.user_id'] = str(target_user_id)
+        archive_since, hot_since = self.retention.split('admin_logs', since or datetime.min)
+        query = dict(filters)
+        if since or archive_since or until:
+            query['timestamp'] = {}
+            if since or archive_since:
+                query['timestamp']['$gte'] = hot_since
+            if until:
+                query['timestamp']['$lt'] = until
+        if after:
+            timestamp, last_id = after
+            cursor = [
+                {'timestamp': {'$lt': timestamp}},
+                {'timestamp': timestamp, '_id': {'$lt': last_id}}
+            ]
+            if '$or' in query:
+                query['$and'] = [{'$or': query.pop('$or')}, {'$or': cursor}]
+            else:
+                query['$or'] = cursor
+        rows = self.find_rows(self.admin_logs, 'admin_log_explorer', query,
+                              sort=[('timestamp', DESCENDING), ('_id', DESCENDING)], limit=limit)
+        if not archive_since or len(rows) >= limit:
+            return rows
+        end = min(hot_since, until or hot_since)
+        if after:
+            end = min(end, after[0] + timedelta(microseconds=1))
+            last = log_retention.sort_key({'timestamp': after[0], '_id': after[1]})
+        archived = (doc for doc in self.retention.iter_archive('admin_logs', archive_since, end, filters, reverse=True)
+                    if not after or log_retention.sort_key(doc) < last)
+        view = LIST_VIEWS['admin_log_explorer']
+        return rows + [view.decode(doc) for doc in itertools.islice(archived, limit - len(rows))]
+
+    def iter_admin_logs(self, batch_size=None, **filters):
+        """Every matching admin log entry, fetched in keyset batches"""
+        batch_size = batch_size or self.BATCH_SIZE
+        after = None
+        while True:
+            rows = self.query_admin_logs(after=after, limit=batch_size, **filters)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1]['timestamp'], rows[-1]['_id'])
+
+    def get_admin_logs(self, limit=50):
+        """Latest admin log entries, newest first"""
+        return self.find_rows(self.admin_logs, 'admin_log_list', sort=[('timestamp', DESCENDING)], limit=limit)
 
     def system_settings(self):
         """Modify system settings"""
@@ -969,6 +1619,52 @@ class CasinoAdminDesktop:
         
         input("\nPress Enter to continue...")
 
+    def log_retention(self):
+        """Show log retention status and archive old entries on demand"""
+        self.clear_screen()
+        print("╔════════════════════════════════╗")
+        print("║        LOG RETENTION           ║")
+        print("╚════════════════════════════════╝\n")
+
+        if not self.retention.enabled:
+            print("Archiving is disabled. Set 'archive = files' or 'archive = collection'")
+            print(f"in the [RETENTION] section of {self.CONFIG_FILE} to enable it.")
+            input("\nPress Enter to continue...")
+            return
+
+        print(f"Archive: {self.retention.mode}, "
+              f"archived entries deleted {self.retention.ttl_grace_days} days past the window\n")
+        print(f"{'Collection':<12} {'Hot Days':<9} {'Archived Until':<16} {'Archived':<10} {'Last Run':<16}")
+        print("-" * 67)
+        for row in self.retention.status():
+            archived_until = row['archived_until'].strftime("%Y-%m-%d") if row['archived_until'] else 'never'
+            last_run = row['last_run'].strftime("%Y-%m-%d %H:%M") if row['last_run'] else 'never'
+            print(f"{row['collection']:<12} {row['hot_days']:<9} {archived_until:<16} {row['archived_docs']:<10} {last_run:<16}")
+        if self.retention.last_error:
+            print(f"\n⚠ Background archiver error: {self.retention.last_error}")
+
+        if input("\nArchive now? (y/N): ").strip().lower() == 'y':
+            try:
+                archived = self.retention.archive(
+                    progress=lambda name, day, count: print(f"  {name} {day:%Y-%m-%d}: {count} entries"))
+                print(f"\n✓ Archived {', '.join(f'{n} {c} entries' for n, c in archived.items())}")
+                self.log_action("archive_logs", archived)
+            except Exception as e:
+                print(f"\n✗ Archiving failed: {str(e)}")
+        input("\nPress Enter to continue...")
+
+    def start_background_jobs(self):
+        """Start the log archiver, login monitor and mirror sync threads that are configured"""
+        interval = self.config.getint('RETENTION', 'background_interval', fallback=0)
+        if interval > 0:
+            self.retention.start(interval)
+        interval = self.config.getint('MONITOR', 'interval', fallback=0)
+        if interval > 0:
+            self.login_monitor.start(interval)
+        interval = self.config.getint('MIRROR', 'sync_interval', fallback=0)
+        if self.mirror and interval > 0:
+            self.mirror.start(self.db, self.transaction_router, interval)
+
     def change_password(self):
         """Change current user's password"""
         self.clear_screen()
@@ -1033,23 +1729,86 @@ class CasinoAdminDesktop:
     def recent_transactions_report(self):
         """Display recent transactions report"""
         try:
-            transactions = list(self.transactions.find().sort('date', DESCENDING).limit(50))
+            transactions = self.get_recent_transactions()
             self.clear_screen()
             print("╔══════════════════════════════════════════════════════════╗")
             print("║                  RECENT TRANSACTIONS                     ║")
             print("╠══════════════════════════════════════════════════════════╣")
             print(f"║ {'Date':<20} {'User':<25} {'Type':<12} {'Amount':<10} ║")
             for tx in transactions:
-                user = self.users.find_one({'_id': tx['user_id']})
-                email = user['email'] if user else 'Deleted User'
                 date_str = tx['date'].strftime("%Y-%m-%d %H:%M")
-                print(f"║ {date_str:<20} {email[:24]:<25} {tx['type'][:11]:<12} ${tx['amount']:<9.2f} ║")
+                print(f"║ {date_str:<20} {tx['email'][:24]:<25} {tx['type'][:11]:<12} ${tx['amount']:<9.2f} ║")
             print("╚══════════════════════════════════════════════════════════╝")
             input("\nPress Enter to continue...")
         except Exception as e:
             print(f"Error loading transactions: {str(e)}")
             input("Press Enter to continue...")
 
+    def get_recent_transactions(self, limit=50):
+        """Latest transactions across all users, with the owner's email"""
+        transactions = self.find_rows(self.transaction_router, 'recent_transactions',
+                                      sort=[('date', DESCENDING)], limit=limit)
+        return self._with_emails(transactions)
+
+    def export_statements(self):
+        """Export per-player statements with running balance for a date range"""
+        self.clear_screen()
+        print("╔════════════════════════════════╗")
+        print("║      EXPORT STATEMENTS         ║")
+        print("╚════════════════════════════════╝\n")
+        try:
+            since = input("First day (YYYY-MM-DD, blank for all history): ").strip()
+            until = input("Last day (YYYY-MM-DD, blank for today): ").strip()
+            since = datetime.strptime(since, "%Y-%m-%d") if since else None
+            until = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1) if until else None
+        except ValueError:
+            print("\n✗ Dates must be YYYY-MM-DD")
+            input("Press Enter to continue...")
+            return
+        fmt = 'jsonl' if input("Format [C]SV or [J]SONL: ").strip().lower().startswith('j') else 'csv'
+        emails = input("User emails, comma-separated (blank for every user with transactions in the range): ")
+        emails = [email.strip() for email in emails.split(',') if email.strip()]
+        directory = input("Directory to save statements in [statements]: ").strip() or 'statements'
+        try:
+            users, missing = self.statement_users(emails, since, until)
+            for email in missing:
+                print(f"⚠ User not found: {email}")
+            if not users:
+                print("\nNo statements to export.")
+                input("Press Enter to continue...")
+                return
+            started = time.perf_counter()
+            summaries = self.statements.export_many(
+                users, directory, since, until, fmt,
+                workers=self.config.getint('APP', 'statement_workers', fallback=4),
+                progress=lambda summary: print(f"  {summary['email']}: {summary['transactions']} transactions, "
+                                               f"closing {summary['closing_balance']:.2f}")
+            )
+            print(f"\n✓ Exported {len(summaries)} statements to {directory} in {time.perf_counter() - started:.1f}s")
+            self.log_action("export_statements", {'users': len(summaries), 'directory': directory,
+                                                  'since': since, 'until': until})
+        except Exception as e:
+            print(f"\n✗ Statement export failed: {str(e)}")
+        input("Press Enter to continue...")
+
+    def statement_users(self, emails=None, since=None, until=None):
+        """([{_id, email}], missing emails) for the given emails, or every user with transactions in the range"""
+        if emails:
+            users = list(self.users.find({'email': {'$in': emails}}, {'email': 1}))
+            found = {user['email'] for user in users}
+            return users, [email for email in emails if email not in found]
+        dates = {}
+        if since:
+            dates['$gte'] = since
+        if until:
+            dates['$lt'] = until
+        pipeline = ([{'$match': {'date': dates}}] if dates else []) + [{'$group': {'_id': '$user_id'}}]
+        ids = [entry['_id'] for entry in self.transaction_router.aggregate(pipeline, allowDiskUse=True)]
+        users = []
+        for start in range(0, len(ids), self.BATCH_SIZE):
+            users.extend(self.users.find({'_id': {'$in': ids[start:start + self.BATCH_SIZE]}}, {'email': 1}))
+        return sorted(users, key=lambda user: user.get('email') or ''), []
+
     def export_data(self):
         """Export data to JSON file"""
         self.clear_screen()
@@ -1058,14 +1817,9 @@ class CasinoAdminDesktop:
         print("╚════════════════════════════════╝\n")
         
         try:
-            data = {
-                'users': list(self.users.find()),
-                'transactions': list(self.transactions.find())
-            }
-            
             file_path = input("Enter full path to save file: ")
             with open(file_path, 'w') as f:
-                json.dump(data, f, default=json_util.default)
+                self.export_to_stream(f)
             
             print("\n✓ Data exported successfully!")
             self.log_action("export_data", {"file_path": file_path})
@@ -1074,6 +1828,23 @@ class CasinoAdminDesktop:
             print(f"Export failed: {str(e)}")
             input("Press Enter to continue...")
 
+    def export_to_stream(self, stream):
+        """Write users and transactions as one JSON document, streaming cursor by cursor"""
+        counts = {}
+        stream.write('{')
+        sources = (('users', self.users.find().batch_size(self.BATCH_SIZE)),
+                   ('transactions', self.transaction_router.find(batch_size=self.BATCH_SIZE)))
+        for idx, (name, cursor) in enumerate(sources):
+            stream.write(f'{", " if idx else ""}"{name}": [')
+            count = 0
+            for doc in cursor:
+                stream.write((', ' if count else '') + json.dumps(doc, default=json_util.default))
+                count += 1
+            stream.write(']')
+            counts[name] = count
+        stream.write('}')
+        return counts
+
     def import_data(self):
         """Import data from JSON file"""
         self.clear_screen()
@@ -1088,36 +1859,109 @@ class CasinoAdminDesktop:
             return
             
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                
-            if not all(key in data for key in ['users', 'transactions']):
-                raise ValueError("Invalid data format")
-                
-            users_inserted = 0
-            for user in data['users']:
-                if not self.users.find_one({'email': user['email']}):
-                    self.users.insert_one(user)
-                    users_inserted += 1
-                    
-            transactions_inserted = 0
-            for tx in data['transactions']:
-                self.transactions.insert_one(tx)
-                transactions_inserted += 1
+            users_inserted, transactions_inserted, logs_inserted = self.import_from_file(file_path)
                 
             print(f"\nImport complete:")
             print(f"- {users_inserted} new users added")
             print(f"- {transactions_inserted} transactions added")
-            self.log_action("import_data", {
-                'file': file_path,
-                'users': users_inserted,
-                'transactions': transactions_inserted
-            })
+            if logs_inserted:
+                print(f"- {logs_inserted} login logs added")
             input("\nPress Enter to continue...")
         except Exception as e:
             print(f"Import failed: {str(e)}")
             input("Press Enter to continue...")
 
+    def import_from_file(self, file_path):
+        """Import users (skipping known emails), transactions and optional login_logs; returns the inserted counts"""
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+            
+        if not all(key in data for key in ['users', 'transactions']):
+            raise ValueError("Invalid data format")
+            
+        users_inserted = 0
+        for user in data['users']:
+            if not self.users.find_one({'email': user['email']}):
+                # JSON carries datetimes as strings; store them as dates so range queries see them
+                self.users.insert_one(migrations.normalize(user, 'users'))
+                users_inserted += 1
+                
+        transactions_inserted = 0
+        for tx in data['transactions']:
+            self.transaction_router.insert_one(migrations.normalize(tx, 'transactions'))
+            transactions_inserted += 1
+            
+        self.bump_data_version('users')
+        self.bump_data_version('transactions')
+        if transactions_inserted:
+            # Imported games may be backdated into periods that are already rolled up
+            self.game_analytics.rebuild()
+            self.cohorts.rebuild()
+            self.distinct_transacting_users.forget()
+
+        logs = [migrations.normalize(log, 'login_logs') for log in data.get('login_logs', [])]
+        for start in range(0, len(logs), self.BATCH_SIZE):
+            self.login_logs.insert_many(logs[start:start + self.BATCH_SIZE], ordered=False)
+        if logs:
+            self.bump_data_version('login_logs')
+            # Backdated logs change finished days' distinct users and geo rollups
+            days = {log['timestamp'] for log in logs if isinstance(log.get('timestamp'), datetime)}
+            self.distinct_login_users.forget(days)
+            self.geo_analytics.rebuild()
+        if self.mirror:
+            self.mirror.forget()
+        self.log_action("import_data", {
+            'file': file_path,
+            'users': users_inserted,
+            'transactions': transactions_inserted,
+            'login_logs': len(logs)
+        })
+        return users_inserted, transactions_inserted, len(logs)
+
+    def balance_reconciliation(self):
+        """Check stored balances against the transaction ledger"""
+        self.clear_screen()
+        print("╔════════════════════════════════════════╗")
+        print("║        BALANCE RECONCILIATION          ║")
+        print("╚════════════════════════════════════════╝\n")
+        reconciler = self.get_reconciler()
+        previous = reconciler.last_run()
+        if previous:
+            print(f"Last completed run: {previous['started_at'].strftime('%Y-%m-%d %H:%M')} "
+                  f"({previous['discrepancies']} discrepancies)")
+        incremental = previous and input("Only users active since then? (Y/n): ").strip().lower() != 'n'
+        try:
+            summary = reconciler.run(
+                incremental=incremental,
+                progress=lambda s: print(f"\r  {s['users_checked']} users checked, "
+                                         f"{s['discrepancies']} discrepancies", end='', flush=True)
+            )
+            print(f"\n\n✓ {summary['mode'].capitalize()} run finished in {summary['elapsed_s']:.1f}s: "
+                  f"{summary['users_checked']} users, {summary['discrepancies']} discrepancies, "
+                  f"total drift ${summary['total_drift']:.2f}")
+            self.log_action("reconcile_balances", {
+                "run_id": summary['_id'], "mode": summary['mode'], "discrepancies": summary['discrepancies']})
+            issues = reconciler.discrepancies(summary['_id'], limit=20)
+            if issues:
+                print(f"\n{'Email':<25} {'Stored':>10} {'Ledger':>10} {'Drift':>9}  Issues")
+                print("-" * 75)
+                for issue in issues:
+                    print(f"{(issue['email'] or '')[:24]:<25} {issue['stored_balance']:>10.2f} "
+                          f"{issue['ledger_balance']:>10.2f} {issue['drift']:>9.2f}  {', '.join(issue['issues'])}")
+        except Exception as e:
+            print(f"\n✗ Reconciliation failed: {str(e)}")
+        input("\nPress Enter to continue...")
+
+    def get_reconciler(self):
+        """Balance reconciler configured from the [RECONCILIATION] section"""
+        return BalanceReconciler(
+            self.db,
+            self.transaction_router,
+            workers=self.config.getint('RECONCILIATION', 'workers', fallback=4),
+            chunk_size=self.config.getint('RECONCILIATION', 'chunk_size', fallback=1000),
+            tolerance=self.config.getfloat('RECONCILIATION', 'tolerance', fallback=0.01)
+        )
+
     def deposit_withdraw_report(self):
         """Generate deposit/withdraw report"""
         try:
@@ -1127,34 +1971,870 @@ class CasinoAdminDesktop:
             print("╚════════════════════════════════════════╝\n")
             
             days = int(input("Enter days to report (7/30/90): ") or 7)
-            cutoff_date = datetime.now() - timedelta(days=days)
-            
-            pipeline = [
-                {'$match': {
-                    'date': {'$gte': cutoff_date},
-                    'type': {'$in': ['deposit', 'withdraw']}
-                }},
-                {'$group': {
-                    '_id': '$type',
-                    'total_amount': {'$sum': '$amount'},
-                    'count': {'$sum': 1}
-                }},
-                {'$sort': {'_id': ASCENDING}}
-            ]
-            
-            results = list(self.transactions.aggregate(pipeline))
+            if input("Fast approximate run? [y/N]: ").strip().lower() == 'y':
+                started = time.perf_counter()
+                estimates = self.estimate_deposit_withdraw_summary(days)
+                players, players_error = self.distinct_transacting_users.count(datetime.now() - timedelta(days=days))
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"\n{'Type':<10} {'Count (95% CI)':<24} {'Total Amount (95% CI)':<30}")
+                print("-" * 64)
+                for entry in estimates:
+                    print(f"{entry['type'].capitalize():<10} {entry['count']:>10.0f} ± {entry['count_error']:<10.0f} "
+                          f"${entry['total_amount']:>14.2f} ± {entry['total_error']:<12.2f}")
+                print(f"\nActive players ≈ {players:.0f} ± {players_error:.0f}")
+                sampled = sum(entry['sampled'] for entry in estimates)
+                print(f"Estimated from {sampled} sampled transactions in {elapsed:.0f} ms")
+                if input("\nRun the exact report? [y/N]: ").strip().lower() != 'y':
+                    return
+            results = self.get_deposit_withdraw_summary(days)
+            if results.cached:
+                print("\n(served from cache - no new transactions since last run)")
+            elif results.from_mirror:
+                print(f"\n(from the analytics mirror as of {self.mirror_synced_at('transactions')})")
             
             print(f"\n{'Type':<15} {'Count':<10} {'Total Amount':<15}")
             print("-" * 40)
             for entry in results:
-                print(f"{entry['_id'].capitalize():<15} {entry['count']:<10} ${entry['total_amount']:<15.2f}")
+                print(f"{entry['type'].capitalize():<15} {entry['count']:<10} ${entry['total_amount']:<15.2f}")
             
             input("\nPress Enter to continue...")
         except Exception as e:
             print(f"Error generating report: {str(e)}")
             input("Press Enter to continue...")
 
-if __name__ == "__main__":
+    def security_alerts(self):
+        """Check new login attempts and show recent security alerts"""
+        try:
+            self.clear_screen()
+            print("╔════════════════════════════════════════════════════════════════════════════╗")
+            print("║                             SECURITY ALERTS                                ║")
+            print("╚════════════════════════════════════════════════════════════════════════════╝\n")
+            monitor = self.login_monitor
+            new_alerts = monitor.poll()
+            print(f"Checked {monitor.processed} login attempts this session, {len(new_alerts)} new alerts "
+                  f"(window {monitor.window}s, user/IP thresholds {monitor.user_threshold}/{monitor.ip_threshold}, "
+                  f"auto-disable {'on' if monitor.auto_disable else 'off'})")
+            if monitor.last_error:
+                print(f"⚠ Background monitor error: {monitor.last_error}")
+
+            alerts = self._with_emails(monitor.recent_alerts(30))
+            print(f"\n{'Detected':<17} {'Type':<16} {'User':<25} {'IP':<15} {'Count':>5}  Action")
+            print("-" * 92)
+            for alert in alerts:
+                detail = alert['type'] + (f" {alert['country']}" if alert.get('country') else '')
+                print(f"{alert['detected_at'].strftime('%Y-%m-%d %H:%M'):<17} {detail[:15]:<16} "
+                      f"{alert['email'][:24]:<25} {(alert.get('ip') or '-')[:14]:<15} {alert['count']:>5}  {alert['action']}")
+            input("\nPress Enter to continue...")
+        except Exception as e:
+            print(f"Error loading alerts: {str(e)}")
+            input("Press Enter to continue...")
+
+    def game_analytics_report(self):
+        """Per-game RTP, house edge and volatility by day or week"""
+        try:
+            self.clear_screen()
+            print("╔════════════════════════════════════════╗")
+            print("║        GAME ANALYTICS REPORT           ║")
+            print("╚════════════════════════════════════════╝\n")
+
+            days = int(input("Enter days to report (7/30/90): ") or 7)
+            unit = 'week' if input("Group by [D]ay or [W]eek: ").strip().lower() == 'w' else 'day'
+            started = time.perf_counter()
+            results = self.get_game_analytics(days, unit)
+            elapsed = (time.perf_counter() - started) * 1000
+            if results.cached:
+                print("\n(served from cache - no new transactions since last run)")
+
+            print(f"\n{'Period':<11} {'Game':<10} {'Rounds':>7} {'Wagered':>12} {'House Net':>11} "
+                  f"{'RTP':>7} {'Win %':>6} {'Vol':>8} {'P50':>8} {'P90':>8} {'P99':>8}")
+            print("-" * 105)
+            for row in results:
+                percentiles = ' '.join(f"{row[p]:>8.2f}" if row.get(p) is not None else f"{'-':>8}"
+                                       for p in ('p50', 'p90', 'p99'))
+                rtp = f"{row['rtp'] * 100:>6.2f}%" if row['rtp'] is not None else f"{'-':>7}"
+                print(f"{row['period'].strftime('%Y-%m-%d'):<11} {(row['game_type'] or '-')[:9]:<10} "
+                      f"{row['rounds']:>7} {row['wagered']:>12.2f} {row['house_net']:>11.2f} {rtp} "
+                      f"{row['win_rate'] * 100:>5.1f}% {row['volatility']:>8.2f} {percentiles}")
+            print(f"\n{len(results)} rows in {elapsed:.0f} ms (finished {unit}s served from rollups)")
+            input("\nPress Enter to continue...")
+        except Exception as e:
+            print(f"Error generating report: {str(e)}")
+            input("Press Enter to continue...")
+
+    def cohort_report(self):
+        """Signup cohorts by month since signup: retention, deposits, NGR or LTV"""
+        try:
+            self.clear_screen()
+            print("╔════════════════════════════════════════╗")
+            print("║        COHORT RETENTION REPORT         ║")
+            print("╚════════════════════════════════════════╝\n")
+
+            months = int(input("Cohorts from the last N months (6/12/24): ") or 12)
+            metric = {'d': 'deposits', 'n': 'ngr', 'l': 'ltv'}.get(
+                input("Show [R]etention, [D]eposits, [N]GR or [L]TV: ").strip().lower()[:1], 'retention')
+            started = time.perf_counter()
+            rows = self.get_cohort_report(months)
+            elapsed = (time.perf_counter() - started) * 1000
+            if rows.cached:
+                print("\n(served from cache - no new transactions since last run)")
+
+            matrix = {}
+            for row in rows:
+                matrix.setdefault((row['cohort'], row['cohort_size']), {})[row['month']] = row[metric]
+            width = min(max((row['month'] for row in rows), default=0) + 1, 12)
+            cell = 7 if metric == 'retention' else 10
+            print(f"\n{'Cohort':<8} {'Users':>6} " + ' '.join(f"{'M' + str(m):>{cell}}" for m in range(width)))
+            print("-" * (16 + (cell + 1) * width))
+            for (cohort, size), values in sorted(matrix.items()):
+                cells = []
+                for m in range(width):
+                    value = values.get(m)
+                    if value is None:
+                        cells.append(f"{'':>{cell}}")
+                    elif metric == 'retention':
+                        cells.append(f"{value * 100:>{cell - 1}.1f}%")
+                    else:
+                        cells.append(f"{value:>{cell}.2f}")
+                print(f"{cohort:<8} {size:>6} " + ' '.join(cells))
+            print(f"\n{len(matrix)} cohorts in {elapsed:.0f} ms (matrix updated incrementally from new transactions)")
+            input("\nPress Enter to continue...")
+        except Exception as e:
+            print(f"Error generating report: {str(e)}")
+            input("Press Enter to continue...")
+
+    def geo_report(self):
+        """Logins, failure rate and distinct users per country, or per city of one country"""
+        try:
+            self.clear_screen()
+            print("╔════════════════════════════════════════╗")
+            print("║        GEOGRAPHIC LOGIN REPORT         ║")
+            print("╚════════════════════════════════════════╝\n")
+
+            days = int(input("Enter days to report (7/30/365): ") or 30)
+            country = input("Country code for a city breakdown (blank for all countries): ").strip().upper() or None
+            started = time.perf_counter()
+            rows = self.get_geo_report(days, country)
+            elapsed = (time.perf_counter() - started) * 1000
+            if rows.cached:
+                print("\n(served from cache - no new logins since last run)")
+
+            label = 'City' if country else 'Country'
+            print(f"\n{label:<22} {'Logins':>9} {'Failed':>8} {'Fail %':>7} {'Users (95% CI)':>18}")
+            print("-" * 68)
+            for row in rows[:50]:
+                name = row['city'] if country else row['country']
+                print(f"{str(name)[:21]:<22} {row['logins']:>9} {row['failed']:>8} {row['failure_rate'] * 100:>6.1f}% "
+                      f"{row['users']:>9} ± {row['users_error']:<6}")
+            shown = " (top 50 shown)" if len(rows) > 50 else ""
+            print(f"\n{len(rows)} rows in {elapsed:.0f} ms{shown} (finished days served from daily rollups)")
+            input("\nPress Enter to continue...")
+        except Exception as e:
+            print(f"Error generating report: {str(e)}")
+            input("Press Enter to continue...")
+
+    def get_geo_report(self, days, country=None):
+        """Login counts and distinct users per country (or per city of `country`) over the last `days`"""
+        return self._cached_report('geo', {'days': days, 'country': country}, ('login_logs',),
+                                   lambda: self.geo_analytics.report(days, country))
+
+    def analytics_mirror_menu(self):
+        """Sync, inspect and query the local analytics mirror"""
+        while True:
+            self.clear_screen()
+            print("╔════════════════════════════════════════╗")
+            print("║           ANALYTICS MIRROR             ║")
+            print("╚════════════════════════════════════════╝\n")
+            if not self.mirror:
+                print("The analytics mirror is disabled (set [MIRROR] enabled = true in the config).")
+                input("\nPress Enter to continue...")
+                return
+            print(f"Backend: {self.mirror.backend} ({self.mirror.path})")
+            print(f"Reports read from: {'mirror' if self.reports_from_mirror else 'MongoDB'}")
+            if self.mirror.last_error:
+                print(f"⚠ Last background sync failed: {self.mirror.last_error}")
+            print(f"\n{'Table':<14} {'Rows':>10}   {'High-water':<20} {'Synced':<20}")
+            print("-" * 68)
+            for row in self.mirror.status():
+                print(f"{row['table']:<14} {row['rows']:>10}   {_plain(row['high_water']) or '-'!s:<20} "
+                      f"{_plain(row['synced_at'])!s:<20}")
+            print("\n1. Sync now  2. Full resync  3. Toggle report source  4. Run SQL query  5. Back")
+            choice = input("\nSelect option (1-5): ").strip()
+            try:
+                if choice in ('1', '2'):
+                    started = time.perf_counter()
+                    loaded = self.sync_mirror(full=choice == '2')
+                    print(f"\n✓ Loaded {', '.join(f'{c} {n}' for n, c in loaded.items())} rows "
+                          f"in {time.perf_counter() - started:.1f}s")
+                elif choice == '3':
+                    self.reports_from_mirror = not self.reports_from_mirror
+                    print(f"\n✓ Reports now read from {'the mirror' if self.reports_from_mirror else 'MongoDB'}")
+                elif choice == '4':
+                    sql = input("SQL> ").strip()
+                    if not sql:
+                        continue
+                    started = time.perf_counter()
+                    rows = self.mirror.query(sql)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    columns = [(key, max(12, min(len(key) + 2, 25))) for key in (rows[0] if rows else {})]
+                    write_rows(rows[:100], columns)
+                    print(f"\n{len(rows)} rows in {elapsed:.0f} ms" + (" (first 100 shown)" if len(rows) > 100 else ""))
+                elif choice == '5':
+                    return
+                else:
+                    print("Invalid option!")
+            except Exception as e:
+                print(f"\n✗ Mirror operation failed: {str(e)}")
+            input("\nPress Enter to continue...")
+
+    def sync_mirror(self, full=False, names=None):
+        """Copy new documents into the analytics mirror; returns rows loaded per table"""
+        loaded = self.mirror.sync(self.db, self.transaction_router, names=names, full=full)
+        self.log_action("sync_mirror", {'full': full, 'loaded': loaded})
+        return loaded
+
+    def _mirror_report(self, compute):
+        """Report rows from the analytics mirror, or None while another process holds its write lock"""
+        try:
+            return ReportRows(compute(), from_mirror=True)
+        except analytics_mirror.MirrorLocked:
+            return None
+
+    def mirror_synced_at(self, table):
+        """When a mirror table was last synced, as text"""
+        try:
+            status = self.mirror.status()
+        except analytics_mirror.MirrorLocked:
+            return 'unknown (mirror busy)'
+        for row in status:
+            if row['table'] == table:
+                return _plain(row['synced_at'])
+        return 'never'
+
+    def get_cohort_report(self, months=12):
+        """Cohort by month-since-signup rows for cohorts from the last `months` months"""
+        return self._cached_report('cohorts', {'months': months}, ('transactions', 'users'),
+                                   lambda: self.cohorts.report(months))
+
+    def get_game_analytics(self, days, unit='day'):
+        """Game profitability per game_type and day/week over the last `days`"""
+        return self._cached_report('game_analytics', {'days': days, 'unit': unit}, ('transactions',),
+                                   lambda: self.game_analytics.report(days, unit))
+
+    def get_deposit_withdraw_summary(self, days):
+        """Deposit and withdraw counts and totals over the last `days`"""
+        if self.reports_from_mirror:
+            rows = self._mirror_report(
+                lambda: self.mirror.deposit_withdraw_summary(datetime.now() - timedelta(days=days)))
+            if rows is not None:
+                return rows
+        return self._cached_report('deposit_withdraw', {'days': days}, ('transactions',),
+                                   lambda: self._compute_deposit_withdraw_summary(days))
+
+    def estimate_deposit_withdraw_summary(self, days):
+        """Deposit and withdraw counts and totals estimated from a sample, with 95% half-widths"""
+        cutoff_date = datetime.now() - timedelta(days=days)
+        estimates = sampled_totals(
+            self.transaction_router.collections(cutoff_date),
+            {'date': {'$gte': cutoff_date}, 'type': {'$in': ['deposit', 'withdraw']}},
+            '$type', '$amount', self.approx_sample_size,
+            decode=self.transaction_router.decode_stages(), translate=self.transaction_router.translate
+        )
+        return [
+            {'type': kind, 'count': entry['count'], 'count_error': entry['count_error'],
+             'total_amount': entry['total'], 'total_error': entry['total_error'], 'sampled': entry['sampled']}
+            for kind, entry in sorted(estimates.items()) if kind != OVERALL
+        ]
+
+    def estimate_user_activity(self, days):
+        """Login attempt totals estimated from a sample and distinct users from HyperLogLog sketches"""
+        cutoff_date = datetime.now() - timedelta(days=days)
+        archive_since, hot_since = self.retention.split('login_logs', cutoff_date)
+        collections = [(self.login_logs, {'timestamp': {'$gte': hot_since}})]
+        archived_attempts = archived_succeeded = 0
+        if archive_since and self.retention.mode == 'collection':
+            collections.append((self.db['login_logs_archive'],
+                                {'timestamp': {'$gte': archive_since, '$lt': hot_since}}))
+        elif archive_since:
+            # Archive files cannot be sampled, so count them in full as the exact report does
+            for log in self.retention.iter_archive('login_logs', archive_since, hot_since):
+                archived_attempts += 1
+                archived_succeeded += 1 if log.get('success') else 0
+        estimates = sampled_totals(collections, None, '$success', 1, self.approx_sample_size)
+        empty = {'count': 0, 'count_error': 0}
+        attempts = dict(estimates.get(OVERALL, empty))
+        succeeded = dict(estimates.get(True, empty))
+        attempts['count'] += archived_attempts
+        succeeded['count'] += archived_succeeded
+        users, users_error = self.distinct_login_users.count(cutoff_date)
+        return [
+            {'metric': 'login attempts', 'estimate': attempts['count'], 'error': attempts['count_error']},
+            {'metric': 'successful logins', 'estimate': succeeded['count'], 'error': succeeded['count_error']},
+            # Failed is attempts minus successful, so it has the same sampling error as successful
+            {'metric': 'failed logins', 'estimate': attempts['count'] - succeeded['count'],
+             'error': succeeded['count_error']},
+            {'metric': 'distinct users', 'estimate': users, 'error': users_error}
+        ]
+
+    def _compute_deposit_withdraw_summary(self, days):
+        cutoff_date = datetime.now() - timedelta(days=days)
+        pipeline = [
+            {'$match': {
+                'date': {'$gte': cutoff_date},
+                'type': {'$in': ['deposit', 'withdraw']}
+            }},
+            {'$group': {
+                '_id': '$type',
+                'total_amount': {'$sum': '$amount'},
+                'count': {'$sum': 1}
+            }},
+            {'$sort': {'_id': ASCENDING}}
+        ]
+        return [
+            {'type': entry['_id'], 'count': entry['count'], 'total_amount': entry['total_amount']}
+            for entry in self.transaction_router.aggregate(pipeline)
+        ]
+
+REPORT_COLUMNS = {
+    'deposits': [('type', 15), ('count', 10), ('total_amount', 15)],
+    'deposits-approx': [('type', 10), ('count', 12), ('count_error', 12), ('total_amount', 15), ('total_error', 13),
+                        ('sampled', 9)],
+    'activity-approx': [('metric', 20), ('estimate', 12), ('error', 10)],
+    'activity': [('email', 25), ('last_login', 20), ('success_count', 8), ('failed_count', 8)],
+    'recent': [('date', 20), ('email', 25), ('type', 12), ('amount', 10)],
+    'admin-logs': [('timestamp', 20), ('email', 25), ('action', 15)],
+    'geo': [('country', 8), ('city', 22), ('logins', 9), ('failed', 8), ('failure_rate', 13), ('users', 9),
+            ('users_error', 12)],
+    'cohorts': [('cohort', 8), ('month', 6), ('cohort_size', 12), ('active', 8), ('retention', 10),
+                ('deposits', 12), ('ngr', 12), ('ltv', 10)],
+    'games': [('period', 20), ('game_type', 10), ('rounds', 8), ('wagered', 12), ('house_net', 11), ('rtp', 8),
+              ('house_edge', 11), ('win_rate', 9), ('volatility', 11), ('p50', 9), ('p90', 9), ('p99', 9)],
+    'reconcile': [('email', 25), ('stored_balance', 12), ('ledger_balance', 12), ('drift', 10), ('issues', 28)],
+    'archive-logs': [('collection', 12), ('hot_days', 9), ('archived_until', 20), ('archived_now', 13),
+                     ('archived_docs', 14)],
+    'login-log-storage': [('collection', 18), ('timeseries', 11), ('documents', 11), ('buckets', 9),
+                          ('storage_bytes', 14), ('index_bytes', 12), ('report_ms', 10)],
+    'migration': [('collection', 24), ('scanned', 10), ('rewritten', 10), ('seconds', 9), ('docs_per_second', 15),
+                  ('avg_bytes_before', 17), ('avg_bytes_after', 16)],
+    'mirror': [('table', 14), ('loaded', 10), ('rows', 12), ('high_water', 20)],
+    'alerts': [('timestamp', 20), ('type', 14), ('email', 25), ('ip', 16), ('count', 6), ('country', 8),
+               ('action', 9)],
+    'audit': [('timestamp', 20), ('email', 25), ('action', 20), ('details_user_id', 25),
+              ('details_target_user', 25)],
+    'transactions': [('date', 20), ('type', 12), ('amount', 10), ('balance_after', 10)]
+}
+
+def _plain(value):
+    """Render a Mongo value for text output"""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+def write_rows(rows, columns, fmt='table', stream=None):
+    """Stream rows as a table, csv, json array or json lines; returns the row count"""
+    stream = stream or sys.stdout
+    keys = [key for key, _ in columns]
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(keys)
+        for row in rows:
+            writer.writerow([_plain(row.get(key)) for key in keys])
+            count += 1
+    elif fmt in ('json', 'jsonl'):
+        if fmt == 'json':
+            stream.write('[')
+        for row in rows:
+            line = json.dumps({key: _plain(row.get(key)) for key in keys}, default=str)
+            if fmt == 'json':
+                stream.write(('\n  ' if not count else ',\n  ') + line)
+            else:
+                stream.write(line + '\n')
+            count += 1
+        if fmt == 'json':
+            stream.write('\n]\n' if count else ']\n')
+    else:
+        stream.write(' '.join(f"{key:<{width}}" for key, width in columns) + '\n')
+        stream.write('-' * (sum(width for _, width in columns) + len(columns) - 1) + '\n')
+        for row in rows:
+            cells = []
+            for key, width in columns:
+                value = _plain(row.get(key))
+                value = f"{value:.2f}" if isinstance(value, float) else str(value)
+                cells.append(f"{value[:width - 1]:<{width}}")
+            stream.write(' '.join(cells) + '\n')
+            count += 1
+    stream.flush()
+    return count
+
+def load_credentials(keyfile=None):
+    """Headless credentials from a keyfile ([AUTH] email/password) or the environment"""
+    if keyfile:
+        if os.name == 'posix' and os.stat(keyfile).st_mode & 0o077:
+            print(f"⚠ {keyfile} is readable by other users (chmod 600 it)", file=sys.stderr)
+        keys = configparser.ConfigParser()
+        keys.read(keyfile)
+        return keys.get('AUTH', 'email', fallback=None), keys.get('AUTH', 'password', fallback=None)
+    return os.environ.get('CASINO_ADMIN_EMAIL'), os.environ.get('CASINO_ADMIN_PASSWORD')
+
+def _cmd_report(app, args):
+    if args.approximate and args.name in ('deposits', 'activity'):
+        if args.name == 'deposits':
+            rows = app.estimate_deposit_withdraw_summary(args.days)
+        else:
+            rows = app.estimate_user_activity(args.days)
+        args.rows = write_rows(rows, REPORT_COLUMNS[args.name + '-approx'], args.format)
+        return EXIT_OK
+    if args.mirror:
+        if not app.mirror:
+            print("✗ The analytics mirror is disabled (set [MIRROR] enabled = true)", file=sys.stderr)
+            return EXIT_USAGE
+        app.reports_from_mirror = True
+    if args.name == 'deposits':
+        rows = app.get_deposit_withdraw_summary(args.days)
+    elif args.name == 'activity':
+        rows = app.get_user_activity(args.days)
+    elif args.name == 'recent':
+        rows = app.get_recent_transactions(args.limit)
+    elif args.name == 'games':
+        rows = app.get_game_analytics(args.days, args.unit)
+    elif args.name == 'cohorts':
+        rows = app.get_cohort_report(args.months)
+    elif args.name == 'geo':
+        rows = app.get_geo_report(args.days, args.country)
+    else:
+        rows = app.get_admin_logs(args.limit)
+    args.rows = write_rows(rows, REPORT_COLUMNS[args.name], args.format)
+    return EXIT_OK
+
+def _cmd_transactions(app, args):
+    user = app.users.find_one({'email': args.email}, {'_id': 1})
+    if not user:
+        print(f"✗ User not found: {args.email}", file=sys.stderr)
+        return EXIT_ERROR
+    args.rows = write_rows(app.get_user_transactions(user['_id'], args.limit),
+                           REPORT_COLUMNS['transactions'], args.format)
+    return EXIT_OK
+
+def _cmd_audit(app, args):
+    target = args.user
+    if target:
+        user = app.find_target_user(target)
+        if user:
+            target = user['_id']
+        elif '@' in target:
+            print(f"✗ User not found: {target}", file=sys.stderr)
+            return EXIT_ERROR
+    try:
+        since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+        until = datetime.strptime(args.until, "%Y-%m-%d") + timedelta(days=1) if args.until else None
+    except ValueError:
+        print("✗ Dates must be YYYY-MM-DD", file=sys.stderr)
+        return EXIT_USAGE
+    rows = app.iter_admin_logs(action=args.action, admin_email=args.admin, target_user_id=target,
+                               since=since, until=until)
+    if args.limit:
+        rows = itertools.islice(rows, args.limit)
+    args.rows = write_rows(rows, REPORT_COLUMNS['audit'], args.format)
+    return EXIT_OK
+
+def _cmd_reconcile(app, args):
+    reconciler = app.get_reconciler()
+    if args.workers:
+        reconciler.workers = args.workers
+    summary = reconciler.run(incremental=args.incremental)
+    app.log_action("reconcile_balances", {
+        "run_id": summary['_id'], "mode": summary['mode'], "discrepancies": summary['discrepancies']})
+    print(f"✓ {summary['mode']} run {summary['_id']}: {summary['users_checked']} users, "
+          f"{summary['discrepancies']} discrepancies, total drift {summary['total_drift']:.2f}", file=sys.stderr)
+    rows = ({**issue, 'issues': ','.join(issue['issues'])}
+            for issue in reconciler.discrepancies(summary['_id'], limit=args.limit))
+    args.rows = write_rows(rows, REPORT_COLUMNS['reconcile'], args.format)
+    return EXIT_ERROR if summary['discrepancies'] and args.strict else EXIT_OK
+
+def _cmd_archive_logs(app, args):
+    if not app.retention.enabled:
+        print("✗ Archiving is disabled; set 'archive' in the [RETENTION] config section", file=sys.stderr)
+        return EXIT_USAGE
+    archived = app.retention.archive(args.collection or None)
+    app.log_action("archive_logs", archived)
+    rows = ({**row, 'archived_now': archived.get(row['collection'], 0)} for row in app.retention.status())
+    args.rows = write_rows(rows, REPORT_COLUMNS['archive-logs'], args.format)
+    return EXIT_OK
+
+def _cmd_migrate_login_logs(app, args):
+    granularity = args.granularity or app.config.get('MONGODB', 'login_logs_granularity', fallback='hours')
+    started = time.perf_counter()
+    copied = login_log_storage.migrate(
+        app.db, 'login_logs', granularity, args.batch_size, args.drop_legacy,
+        progress=lambda n: print(f"\r  {n} login logs copied", end='', file=sys.stderr, flush=True)
+    )
+    app.login_logs_timeseries = True
+    app.report_cache.clear()
+    print(f"\n✓ login_logs is a time-series collection ({copied} documents copied in "
+          f"{time.perf_counter() - started:.1f}s)", file=sys.stderr)
+    app.log_action("migrate_login_logs", {"copied": copied, "granularity": granularity,
+                                          "dropped_legacy": args.drop_legacy})
+    return EXIT_OK
+
+def _cmd_benchmark_login_logs(app, args):
+    since = datetime.now() - timedelta(days=args.days)
+    pipeline = app._user_activity_pipeline(since)
+    rows = []
+    for name in ('login_logs', 'login_logs' + login_log_storage.LEGACY_SUFFIX):
+        if name not in app.db.list_collection_names():
+            continue
+        row = login_log_storage.storage_stats(app.db, name)
+        row['report_ms'] = login_log_storage.time_pipeline(app.db[name], pipeline, args.runs)
+        rows.append(row)
+    args.rows = write_rows(rows, REPORT_COLUMNS['login-log-storage'], args.format)
+    return EXIT_OK
+
+def _cmd_partition_transactions(app, args):
+    router = TransactionRouter(app.db, partitioned=True)
+    # The same indexes as the configured router, on existing partitions and those migrate() creates
+    for keys, kwargs in app.transaction_router.index_specs:
+        router.create_index(keys, **kwargs)
+    copied = router.migrate(
+        args.batch_size, args.drop_source,
+        progress=lambda n: print(f"\r  {n} transactions copied", end='', file=sys.stderr, flush=True)
+    )
+    print(f"\n✓ Copied {copied} transactions into {len(router.names())} monthly collections", file=sys.stderr)
+    if not app.transaction_router.partitioned:
+        print("⚠ Set transactions_partitioned = true in [MONGODB] to read and write the partitions", file=sys.stderr)
+    app.log_action("partition_transactions", {"copied": copied, "dropped_source": args.drop_source})
+    return EXIT_OK
+
+def _cmd_compact_transactions(app, args):
+    router = app.transaction_router
+    if not router.codec:
+        print("✗ Set transactions_schema = compact in [MONGODB] (for every process) before rewriting documents",
+              file=sys.stderr)
+        return EXIT_USAGE
+    before = {c.name: login_log_storage.storage_stats(app.db, c.name) for c in router.collections()}
+    results = migrations.compact_transactions(
+        router, args.workers, args.batch_size,
+        progress=lambda scanned, rewritten: print(f"\r  {scanned} scanned, {rewritten} rewritten",
+                                                  end='', file=sys.stderr, flush=True)
+    )
+    print(file=sys.stderr)
+    rows = []
+    for name, result in results.items():
+        after = login_log_storage.storage_stats(app.db, name)
+        rows.append({'collection': name, **result,
+                     'avg_bytes_before': before[name]['avg_document_bytes'],
+                     'avg_bytes_after': after['avg_document_bytes']})
+    app.bump_data_version('transactions')
+    app.report_cache.clear()
+    app.log_action("compact_transactions", {name: result['rewritten'] for name, result in results.items()})
+    args.rows = write_rows(rows, REPORT_COLUMNS['migration'], args.format)
+    return EXIT_OK
+
+def _cmd_normalize_types(app, args):
+    results = migrations.normalize_types(
+        app.db, app.transaction_router, args.collection, args.workers, args.batch_size,
+        progress=lambda scanned, rewritten: print(f"\r  {scanned} scanned, {rewritten} rewritten",
+                                                  end='', file=sys.stderr, flush=True)
+    )
+    print(file=sys.stderr)
+    if any(result['rewritten'] for result in results.values()):
+        for name in migrations.TYPED_FIELDS:
+            app.bump_data_version(name)
+        app.report_cache.clear()
+        # Rewritten dates can fall in periods that are already rolled up
+        app.game_analytics.rebuild()
+        app.cohorts.rebuild()
+        app.distinct_transacting_users.forget()
+        app.distinct_login_users.forget()
+        app.geo_analytics.rebuild()
+        if app.mirror:
+            app.mirror.forget()
+    app.log_action("normalize_types", {name: result['rewritten'] for name, result in results.items()})
+    rows = ({'collection': name, **result} for name, result in results.items())
+    args.rows = write_rows(rows, REPORT_COLUMNS['migration'][:5], args.format)
+    return EXIT_OK
+
+def _cmd_sync_mirror(app, args):
+    if not app.mirror:
+        print("✗ The analytics mirror is disabled (set [MIRROR] enabled = true)", file=sys.stderr)
+        return EXIT_USAGE
+    started = time.perf_counter()
+    loaded = app.mirror.sync(
+        app.db, app.transaction_router, names=args.table, full=args.full,
+        progress=lambda name, count: print(f"\r  {name}: {count} rows", end='', file=sys.stderr, flush=True)
+    )
+    print(file=sys.stderr)
+    app.log_action("sync_mirror", {'full': args.full, 'loaded': loaded})
+    status = {row['table']: row for row in app.mirror.status()}
+    rows = ({'table': name, 'loaded': count, 'rows': status[name]['rows'], 'high_water': status[name]['high_water']}
+            for name, count in loaded.items())
+    args.rows = write_rows(rows, REPORT_COLUMNS['mirror'], args.format)
+    print(f"✓ Synced in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return EXIT_OK
+
+def _cmd_monitor(app, args):
+    monitor = app.login_monitor
+    if args.auto_disable:
+        monitor.auto_disable = True
+    columns = REPORT_COLUMNS['alerts']
+    while True:
+        alerts = app._with_emails(monitor.poll())
+        if alerts or args.once:
+            write_rows(alerts, columns, args.format)
+            sys.stdout.flush()
+        if args.once:
+            return EXIT_OK
+        time.sleep(args.interval)
+
+def _cmd_export(app, args):
+    if args.path == '-':
+        counts = app.export_to_stream(sys.stdout)
+        sys.stdout.flush()
+    else:
+        with open(args.path, 'w') as f:
+            counts = app.export_to_stream(f)
+    app.log_action("export_data", {"file_path": args.path, **counts})
+    print(f"✓ Exported {counts['users']} users and {counts['transactions']} transactions", file=sys.stderr)
+    return EXIT_OK
+
+def _cmd_statement(app, args):
+    try:
+        since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+        until = datetime.strptime(args.until, "%Y-%m-%d") + timedelta(days=1) if args.until else None
+    except ValueError:
+        print("✗ Dates must be YYYY-MM-DD", file=sys.stderr)
+        return EXIT_USAGE
+    if not args.email and not args.all_active:
+        print("✗ Give user emails or --all-active", file=sys.stderr)
+        return EXIT_USAGE
+    users, missing = app.statement_users(args.email, since, until)
+    for email in missing:
+        print(f"✗ User not found: {email}", file=sys.stderr)
+    if missing:
+        return EXIT_ERROR
+    if args.out == '-':
+        if len(users) != 1:
+            print("✗ Only a single user's statement can go to stdout; use --out DIR", file=sys.stderr)
+            return EXIT_USAGE
+        summaries = [app.statements.write(sys.stdout, users[0], since, until, args.format)]
+    else:
+        summaries = app.statements.export_many(users, args.out, since, until, args.format, args.workers)
+    app.log_action("export_statements", {'users': len(summaries), 'directory': args.out,
+                                         'since': since, 'until': until})
+    args.rows = len(summaries)
+    print(f"✓ Exported {len(summaries)} statements ({sum(s['transactions'] for s in summaries)} transactions)",
+          file=sys.stderr)
+    return EXIT_OK
+
+def _cmd_import(app, args):
+    if not os.path.exists(args.path):
+        print(f"✗ File not found: {args.path}", file=sys.stderr)
+        return EXIT_ERROR
+    users_inserted, transactions_inserted, logs_inserted = app.import_from_file(args.path)
+    print(f"✓ Imported {users_inserted} new users, {transactions_inserted} transactions and {logs_inserted} login logs",
+          file=sys.stderr)
+    return EXIT_OK
+
+def _cmd_serve(app, args):
+    from report_server import ReportServer
+    api = app.config['API'] if app.config.has_section('API') else {}
+    server = ReportServer(
+        app,
+        host=args.host or api.get('host', '127.0.0.1'),
+        port=args.port or int(api.get('port', '8080')),
+        ttl=args.ttl if args.ttl is not None else int(api.get('cache_ttl', '30')),
+        workers=int(api.get('workers', '8')),
+        token=api.get('token') or None
+    )
+    app.log_action("start_report_api", {"host": server.host, "port": server.port})
+    app.start_background_jobs()
+    server.run()
+    return EXIT_OK
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog='casino_admin_desktop.py',
+        description="Casino admin console. Run without arguments for the interactive menu; "
+                    "commands authenticate with --keyfile or CASINO_ADMIN_EMAIL/CASINO_ADMIN_PASSWORD."
+    )
+    parser.add_argument('--keyfile', default=os.environ.get('CASINO_ADMIN_KEYFILE'),
+                        help="INI file with an [AUTH] section holding email and password")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_format(command):
+        command.add_argument('--format', choices=['table', 'csv', 'json', 'jsonl'], default='table')
+
+    report = commands.add_parser('report', help="run a report and stream the rows")
+    report.add_argument('name', choices=['deposits', 'activity', 'recent', 'admin-logs', 'games', 'cohorts', 'geo'])
+    report.add_argument('--days', type=int, default=7, help="reporting window for deposits/activity/games/geo")
+    report.add_argument('--unit', choices=['day', 'week'], default='day', help="period for the games report")
+    report.add_argument('--limit', type=int, default=50, help="row limit for recent/admin-logs")
+    report.add_argument('--months', type=int, default=12, help="cohorts from the last N months for cohorts")
+    report.add_argument('--country', type=str.upper, help="city breakdown of one country code for geo")
+    report.add_argument('--approximate', action='store_true',
+                        help="sampled estimates with 95%% intervals for deposits/activity (sub-second on large ranges)")
+    report.add_argument('--mirror', action='store_true',
+                        help="run deposits/activity against the local analytics mirror instead of MongoDB")
+    add_format(report)
+    report.set_defaults(handler=_cmd_report)
+
+    transactions = commands.add_parser('transactions', help="latest transactions for one user")
+    transactions.add_argument('email')
+    transactions.add_argument('--limit', type=int, default=50)
+    add_format(transactions)
+    transactions.set_defaults(handler=_cmd_transactions)
+
+    statement = commands.add_parser('statement', help="per-user statements with running balance for a date range")
+    statement.add_argument('email', nargs='*', help="user emails (or --all-active)")
+    statement.add_argument('--all-active', action='store_true', help="every user with transactions in the range")
+    statement.add_argument('--since', help="first day, YYYY-MM-DD")
+    statement.add_argument('--until', help="last day (inclusive), YYYY-MM-DD")
+    statement.add_argument('--format', choices=list(statements.FORMATS), default='csv')
+    statement.add_argument('--out', default='statements',
+                           help="directory for one file per user, or - for a single user's statement on stdout")
+    statement.add_argument('--workers', type=int, default=4, help="statements exported in parallel")
+    statement.set_defaults(handler=_cmd_statement)
+
+    audit = commands.add_parser('audit', help="search admin logs by action, admin, target user and dates")
+    audit.add_argument('--action')
+    audit.add_argument('--admin', help="admin email")
+    audit.add_argument('--user', help="target user email or id")
+    audit.add_argument('--since', help="first day, YYYY-MM-DD")
+    audit.add_argument('--until', help="last day (inclusive), YYYY-MM-DD")
+    audit.add_argument('--limit', type=int, default=0, help="stop after this many entries (default all)")
+    add_format(audit)
+    audit.set_defaults(handler=_cmd_audit)
+
+    reconcile = commands.add_parser('reconcile', help="check user balances against the transaction ledger")
+    reconcile.add_argument('--incremental', action='store_true',
+                           help="only users with activity since the last completed run")
+    reconcile.add_argument('--workers', type=int, help="parallel partitions (default from [RECONCILIATION])")
+    reconcile.add_argument('--limit', type=int, default=0, help="discrepancies to print, largest first (default all)")
+    reconcile.add_argument('--strict', action='store_true', help="exit with status 1 when discrepancies are found")
+    add_format(reconcile)
+    reconcile.set_defaults(handler=_cmd_reconcile)
+
+    archive_logs = commands.add_parser('archive-logs', help="archive log entries older than their hot window")
+    archive_logs.add_argument('--collection', action='append', choices=['login_logs', 'admin_logs'],
+                              help="collection to archive, repeatable (default all)")
+    add_format(archive_logs)
+    archive_logs.set_defaults(handler=_cmd_archive_logs)
+
+    migrate_logs = commands.add_parser('migrate-login-logs',
+                                       help="convert login_logs to a time-series collection (keeps login_logs_legacy)")
+    migrate_logs.add_argument('--granularity', choices=['seconds', 'minutes', 'hours'],
+                              help="bucket granularity (default from [MONGODB] login_logs_granularity, else hours)")
+    migrate_logs.add_argument('--batch-size', type=int, default=5000)
+    migrate_logs.add_argument('--drop-legacy', action='store_true', help="drop login_logs_legacy after copying")
+    migrate_logs.set_defaults(handler=_cmd_migrate_login_logs)
+
+    benchmark_logs = commands.add_parser('benchmark-login-logs',
+                                         help="compare storage size and activity report latency of "
+                                              "login_logs and login_logs_legacy")
+    benchmark_logs.add_argument('--days', type=int, default=30, help="activity report window")
+    benchmark_logs.add_argument('--runs', type=int, default=5, help="timed runs per collection (median reported)")
+    add_format(benchmark_logs)
+    benchmark_logs.set_defaults(handler=_cmd_benchmark_login_logs)
+
+    partition = commands.add_parser('partition-transactions',
+                                    help="copy the transactions collection into monthly transactions_YYYY_MM collections")
+    partition.add_argument('--batch-size', type=int, default=5000)
+    partition.add_argument('--drop-source', action='store_true', help="drop the unpartitioned collection afterwards")
+    partition.set_defaults(handler=_cmd_partition_transactions)
+
+    compact = commands.add_parser('compact-transactions',
+                                  help="rewrite transactions in the compact schema (cents, coded types)")
+    compact.add_argument('--workers', type=int, default=4, help="parallel _id-range workers")
+    compact.add_argument('--batch-size', type=int, default=1000)
+    add_format(compact)
+    compact.set_defaults(handler=_cmd_compact_transactions)
+
+    normalize = commands.add_parser('normalize-types',
+                                    help="convert string dates and numbers (e.g. from JSON imports) to native types")
+    normalize.add_argument('--collection', action='append', choices=list(migrations.TYPED_FIELDS),
+                           help="collection to normalize (repeatable; default all)")
+    normalize.add_argument('--workers', type=int, default=4, help="parallel _id-range workers")
+    normalize.add_argument('--batch-size', type=int, default=1000)
+    add_format(normalize)
+    normalize.set_defaults(handler=_cmd_normalize_types)
+
+    sync_mirror = commands.add_parser('sync-mirror', help="copy new documents into the local analytics mirror")
+    sync_mirror.add_argument('--table', action='append', choices=list(analytics_mirror.TABLES),
+                             help="table to sync (repeatable; default all)")
+    sync_mirror.add_argument('--full', action='store_true', help="reload the tables instead of syncing the new tail")
+    add_format(sync_mirror)
+    sync_mirror.set_defaults(handler=_cmd_sync_mirror)
+
+    monitor = commands.add_parser('monitor', help="watch new login attempts and raise security alerts")
+    monitor.add_argument('--once', action='store_true', help="process new attempts once and exit (for cron)")
+    monitor.add_argument('--interval', type=float, default=5, help="seconds between polls")
+    monitor.add_argument('--auto-disable', action='store_true', help="disable users that cross the failure threshold")
+    monitor.add_argument('--format', choices=['table', 'csv', 'json', 'jsonl'], default='jsonl')
+    monitor.set_defaults(handler=_cmd_monitor)
+
+    export = commands.add_parser('export', help="export users and transactions as JSON")
+    export.add_argument('path', nargs='?', default='-', help="output file, '-' for stdout (default)")
+    export.set_defaults(handler=_cmd_export)
+
+    import_cmd = commands.add_parser('import', help="import users and transactions from an export file")
+    import_cmd.add_argument('path')
+    import_cmd.set_defaults(handler=_cmd_import)
+
+    serve = commands.add_parser('serve', help="serve reports as JSON over HTTP (see [API] in the config)")
+    serve.add_argument('--host', help="bind address (default 127.0.0.1)")
+    serve.add_argument('--port', type=int, help="port (default 8080)")
+    serve.add_argument('--ttl', type=int, help="seconds to cache each endpoint result (default 30)")
+    serve.set_defaults(handler=_cmd_serve)
+    return parser
+
+def run_headless(argv):
+    """Run one non-interactive command; returns a process exit code"""
+    args = build_cli_parser().parse_args(argv)
+    email, password = load_credentials(args.keyfile)
+    if not email or not password:
+        print("✗ No credentials: pass --keyfile or set CASINO_ADMIN_EMAIL and CASINO_ADMIN_PASSWORD", file=sys.stderr)
+        return EXIT_AUTH
+
+    try:
+        app = CasinoAdminDesktop(interactive=False)
+    except ConnectionError:
+        return EXIT_DB
+
+    try:
+        user, error = app.authenticate(email, password)
+    except Exception as e:
+        print(f"✗ Login error: {str(e)}", file=sys.stderr)
+        return EXIT_AUTH
+    if not user:
+        print(f"✗ {error}", file=sys.stderr)
+        return EXIT_AUTH
+
+    started = time.perf_counter()
+    try:
+        code = args.handler(app, args)
+    except BrokenPipeError:
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    except Exception as e:
+        print(f"✗ {args.command} failed: {str(e)}", file=sys.stderr)
+        return EXIT_ERROR
+    rows = getattr(args, 'rows', None)
+    detail = f" ({rows} rows)" if rows is not None else ""
+    print(f"✓ {args.command} finished in {time.perf_counter() - started:.3f}s{detail}", file=sys.stderr)
+    return code
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_headless(argv)
     app = CasinoAdminDesktop()
     if app.login():
-        app.show_main_menu()
\ No newline at end of file
+        app.start_background_jobs()
+        app.show_main_menu()
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
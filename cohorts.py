@@ -0,0 +1,196 @@
+# cohorts.py - signup cohort retention and lifetime value, maintained incrementally
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from transaction_router import TransactionRouter
+
+MONTH = {'$dateFromParts': {'year': {'$year': '$date'}, 'month': {'$month': '$date'}}}
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def month_offset(cohort, month):
+    return (month.year - cohort.year) * 12 + month.month - cohort.month
+
+
+class CohortReport:
+    """Activity of users grouped by signup month, per calendar month since signup
+
+    Each cohort_cells document holds one cell of the matrix: active users,
+    deposits and net gaming revenue (the house's side of game amounts) of a
+    cohort in a month. A refresh aggregates only the transactions dated
+    between the stored mark and a cutoff SETTLE_SECONDS in the past,
+    grouped by (user, month). The mark is a date rather than an _id because
+    _ids mix uuid strings and ObjectIds, which neither compare nor sort in
+    insertion order. The settle delay leaves room for writes still in
+    flight with a slightly earlier date. Each user's active months are
+    upserted into cohort_user_months, and only the pairs that were new add
+    to a cell's active count, so the transactions never have to be joined
+    to users again. Refreshes take a lease on the state document (plus a
+    lock within the process), so report threads and other consoles never
+    fold in the same transactions twice. A refresh that dies midway leaves
+    the state marked as building. The next refresh then rebuilds from
+    scratch rather than counting the same transactions twice.
+    """
+    SETTLE_SECONDS = 30
+    LEASE_SECONDS = 600
+
+    def __init__(self, db, transactions=None, batch_size=5000):
+        self.users = db.users
+        self.cells = db.cohort_cells
+        self.user_months = db.cohort_user_months
+        self.transactions = transactions or TransactionRouter(db)
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def ensure_indexes(db):
+        db.cohort_cells.create_index([('cohort', ASCENDING), ('month', ASCENDING)])
+
+    def _acquire(self, owner, now):
+        free = {'_id': 'state', '$or': [{'lease_until': {'$exists': False}}, {'lease_until': {'$lt': now}}]}
+        try:
+            state = self.cells.find_one_and_update(
+                free, {'$set': {'lease_until': now + timedelta(seconds=self.LEASE_SECONDS), 'lease_owner': owner}},
+                upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            return None  # the state exists and another refresh holds the lease
+        return state if state and state.get('lease_owner') == owner else None
+
+    def refresh(self, now=None):
+        """Fold in transactions dated since the last refresh; returns the number of (user, month) groups read
+
+        Returns 0 without waiting when another refresh holds the lease.
+        """
+        now = now or datetime.now()
+        owner = uuid.uuid4().hex
+        with self.lock:
+            state = self._acquire(owner, now)
+            if state is None:
+                return 0
+            try:
+                return self._refresh(state, now)
+            finally:
+                self.cells.update_one({'_id': 'state', 'lease_owner': owner}, {'$unset': {'lease_until': 1}})
+
+    def _refresh(self, state, now):
+        resets = state.get('resets')
+        # Marks from before the switch to dates (an _id) cannot be continued from
+        if state.get('building') or ('high_water' in state and 'rolled_until' not in state):
+            self._clear()
+            state = {}
+        after = state.get('rolled_until')
+        cutoff = now - timedelta(seconds=self.SETTLE_SECONDS)
+        if after is not None and cutoff <= after:
+            return 0
+
+        self.cells.update_one({'_id': 'state'}, {'$set': {'building': True}})
+        dates = {'$lt': cutoff, **({'$gte': after} if after is not None else {})}
+        groups = self.transactions.aggregate([
+            {'$match': {'date': dates}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'month': MONTH},
+                'transactions': {'$sum': 1},
+                'deposits': {'$sum': {'$cond': [{'$eq': ['$type', 'deposit']}, {'$abs': '$amount'}, 0]}},
+                'ngr': {'$sum': {'$cond': [{'$eq': ['$type', 'game']}, {'$multiply': [-1, '$amount']}, 0]}}
+            }}
+        ], allowDiskUse=True)
+        read = 0
+        batch = []
+        for group in groups:
+            batch.append(group)
+            if len(batch) >= self.batch_size:
+                read += self._apply(batch)
+                batch = []
+        if batch:
+            read += self._apply(batch)
+        # A rebuild() requested meanwhile bumped resets and keeps the state building
+        self.cells.update_one({'_id': 'state', 'resets': resets},
+                              {'$set': {'rolled_until': cutoff, 'building': False, 'updated_at': datetime.now()}})
+        return read
+
+    def _apply(self, groups):
+        user_ids = list({g['_id']['user_id'] for g in groups})
+        # String dates (mongoimport data not yet normalized) are left out, as the cohort size $match leaves them out
+        cohorts = {u['_id']: month_start(u['created_at'])
+                   for u in self.users.find({'_id': {'$in': user_ids}, 'created_at': {'$type': 'date'}},
+                                            {'created_at': 1})}
+        groups = [g for g in groups if g['_id']['user_id'] in cohorts]
+        if not groups:
+            return 0
+
+        # Only (user, month) pairs seen for the first time add an active user
+        result = self.user_months.bulk_write([
+            UpdateOne({'_id': {'user_id': g['_id']['user_id'], 'month': g['_id']['month']}},
+                      {'$setOnInsert': {'cohort': cohorts[g['_id']['user_id']]}}, upsert=True)
+            for g in groups
+        ], ordered=False)
+        new_pairs = set(result.upserted_ids)
+
+        cells = {}
+        for i, g in enumerate(groups):
+            key = (cohorts[g['_id']['user_id']], g['_id']['month'])
+            cell = cells.setdefault(key, {'active': 0, 'transactions': 0, 'deposits': 0, 'ngr': 0})
+            cell['active'] += 1 if i in new_pairs else 0
+            cell['transactions'] += g['transactions']
+            cell['deposits'] += g['deposits']
+            cell['ngr'] += g['ngr']
+        self.cells.bulk_write([
+            UpdateOne({'cohort': cohort, 'month': month}, {'$inc': cell}, upsert=True)
+            for (cohort, month), cell in cells.items()
+        ], ordered=False)
+        return len(groups)
+
+    def rebuild(self):
+        """Forget the matrix (e.g. after importing transactions); the next refresh recomputes it"""
+        self.cells.update_one({'_id': 'state'}, {'$set': {'building': True}, '$inc': {'resets': 1}}, upsert=True)
+
+    def _clear(self):
+        self.cells.delete_many({'_id': {'$ne': 'state'}})
+        self.user_months.delete_many({})
+        self.cells.update_one({'_id': 'state'}, {'$unset': {'rolled_until': 1, 'high_water': 1}})
+
+    def report(self, months=12, now=None):
+        """One row per cohort and month since signup for cohorts from the last `months` months
+
+        Rows carry active users, retention (active / cohort size), deposits,
+        NGR and LTV (cumulative NGR per cohort user up to that month).
+        """
+        now = now or datetime.now()
+        self.refresh(now)
+        index = now.year * 12 + now.month - months
+        first = datetime(index // 12, index % 12 + 1, 1)
+        sizes = {
+            entry['_id']: entry['users'] for entry in self.users.aggregate([
+                {'$match': {'created_at': {'$gte': first}}},
+                {'$group': {'_id': {'$dateFromParts': {'year': {'$year': '$created_at'},
+                                                       'month': {'$month': '$created_at'}}},
+                            'users': {'$sum': 1}}}
+            ])
+        }
+        rows = []
+        cumulative = {}
+        cells = self.cells.find({'cohort': {'$gte': first}}).sort([('cohort', ASCENDING), ('month', ASCENDING)])
+        for cell in cells:
+            offset = month_offset(cell['cohort'], cell['month'])
+            size = sizes.get(cell['cohort'], 0)
+            if offset < 0 or not size:
+                continue
+            cumulative[cell['cohort']] = cumulative.get(cell['cohort'], 0) + cell['ngr']
+            rows.append({
+                'cohort': cell['cohort'].strftime('%Y-%m'),
+                'month': offset,
+                'cohort_size': size,
+                'active': cell['active'],
+                'retention': round(cell['active'] / size, 4),
+                'deposits': round(cell['deposits'], 2),
+                'ngr': round(cell['ngr'], 2),
+                'ltv': round(cumulative[cell['cohort']] / size, 2)
+            })
+        return rows
@@ -0,0 +1,170 @@
+# game_analytics.py - per-game RTP, house edge and volatility with period rollups
+import math
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+PERCENTILES = (0.5, 0.9, 0.99)
+UNITS = ('day', 'week')
+ROLLUP_KEY = [('unit', ASCENDING), ('period', ASCENDING), ('game_type', ASCENDING)]
+
+
+def period_start(value, unit):
+    day = datetime(value.year, value.month, value.day)
+    return day - timedelta(days=day.weekday()) if unit == 'week' else day
+
+
+class GameAnalytics:
+    """Profitability of `game` transactions per game_type and day or week
+
+    Amounts are signed from the player's side (wins positive, losses
+    negative), and each round's absolute amount is taken as its stake:
+    - wagered = sum(|amount|), house net = -sum(amount)
+    - RTP = 1 - house net / wagered, house edge = 1 - RTP
+
+    One $group computes every metric per (game_type, period), with
+    $percentile for the amount distribution. Finished periods never change,
+    so they are written once to game_rollups, and later reports read them
+    instead of the ledger. Only the current period is aggregated live. A
+    unique (unit, period, game_type) index keeps concurrent refreshes from
+    writing a row twice.
+    Variance is kept as sums and sums of squares, so volatility is exact
+    for any period.
+    """
+
+    def __init__(self, db, transactions=None):
+        self.rollups = db.game_rollups
+        self.transactions = transactions or db.transactions
+        self.percentiles_supported = True
+
+    @staticmethod
+    def ensure_indexes(db):
+        # State documents have no unit, so only rollup rows are covered
+        options = {'unique': True, 'partialFilterExpression': {'unit': {'$exists': True}}}
+        try:
+            db.game_rollups.create_index(ROLLUP_KEY, **options)
+        except OperationFailure:
+            # An earlier non-unique index with the same keys, or duplicate rows it let through
+            try:
+                db.game_rollups.drop_index(ROLLUP_KEY)
+            except OperationFailure:
+                pass
+            GameAnalytics._drop_duplicates(db.game_rollups)
+            db.game_rollups.create_index(ROLLUP_KEY, **options)
+
+    @staticmethod
+    def _drop_duplicates(rollups):
+        """Keep the most recently built row of each (unit, period, game_type)"""
+        duplicates = rollups.aggregate([
+            {'$match': {'unit': {'$exists': True}}},
+            {'$sort': {'built_at': DESCENDING}},
+            {'$group': {'_id': {'unit': '$unit', 'period': '$period', 'game_type': '$game_type'},
+                        'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}}
+        ], allowDiskUse=True)
+        for group in duplicates:
+            rollups.delete_many({'_id': {'$in': group['ids'][1:]}})
+
+    def _pipeline(self, unit, since, until):
+        group = {
+            '_id': {
+                'game_type': '$game_type',
+                'period': {'$dateTrunc': {'date': '$date', 'unit': unit, 'startOfWeek': 'monday'}}
+            },
+            'rounds': {'$sum': 1},
+            'wins': {'$sum': {'$cond': [{'$gt': ['$amount', 0]}, 1, 0]}},
+            'wagered': {'$sum': {'$abs': '$amount'}},
+            'player_net': {'$sum': '$amount'},
+            'sum_sq': {'$sum': {'$multiply': ['$amount', '$amount']}},
+            'largest_win': {'$max': '$amount'},
+            'largest_loss': {'$min': '$amount'}
+        }
+        if self.percentiles_supported:
+            group['percentiles'] = {'$percentile': {'input': '$amount', 'p': list(PERCENTILES), 'method': 'approximate'}}
+        return [
+            {'$match': {'date': {'$gte': since, '$lt': until}, 'type': 'game'}},
+            {'$group': group}
+        ]
+
+    def _aggregate(self, unit, since, until):
+        try:
+            entries = list(self.transactions.aggregate(self._pipeline(unit, since, until), allowDiskUse=True))
+        except OperationFailure as e:
+            if not self.percentiles_supported or '$percentile' not in str(e):
+                raise
+            # $percentile needs MongoDB 7.0; older servers get every other metric
+            self.percentiles_supported = False
+            entries = list(self.transactions.aggregate(self._pipeline(unit, since, until), allowDiskUse=True))
+        rows = []
+        for entry in entries:
+            row = {k: v for k, v in entry.items() if k not in ('_id', 'percentiles')}
+            row.update(unit=unit, game_type=entry['_id']['game_type'], period=entry['_id']['period'])
+            for p, value in zip(PERCENTILES, entry.get('percentiles') or (None,) * len(PERCENTILES)):
+                row[f'p{round(p * 100)}'] = value
+            rows.append(row)
+        return rows
+
+    def refresh(self, unit, now=None):
+        """Roll up every finished period not rolled up yet; returns the number of rollup rows written"""
+        current = period_start(now or datetime.now(), unit)
+        state = self.rollups.find_one({'_id': f'state:{unit}'})
+        since = state['rolled_until'] if state else self._first_game_date()
+        if since is None or since >= current:
+            return 0
+        rows = self._aggregate(unit, period_start(since, unit), current)
+        if rows:
+            requests = [
+                UpdateOne({'unit': unit, 'game_type': row['game_type'], 'period': row['period']},
+                          {'$set': {**row, 'built_at': datetime.now()}}, upsert=True)
+                for row in rows
+            ]
+            try:
+                self.rollups.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                # Another refresh inserted the same rows first; retried, the upserts match and update them
+                errors = e.details.get('writeErrors', [])
+                if any(err.get('code') != 11000 for err in errors):
+                    raise
+                self.rollups.bulk_write([requests[err['index']] for err in errors], ordered=False)
+        self.rollups.update_one({'_id': f'state:{unit}'}, {'$set': {'rolled_until': current}}, upsert=True)
+        return len(rows)
+
+    def rebuild(self, unit=None):
+        """Forget rollups (e.g. after importing backdated transactions); the next report rebuilds them"""
+        for u in ([unit] if unit else UNITS):
+            self.rollups.delete_many({'unit': u})
+            self.rollups.delete_one({'_id': f'state:{u}'})
+
+    def _first_game_date(self):
+        first = next(self.transactions.aggregate([
+            {'$match': {'type': 'game'}},
+            {'$group': {'_id': None, 'first': {'$min': '$date'}}}
+        ]), None)
+        return first['first'] if first else None
+
+    def report(self, days, unit='day', now=None):
+        """Rows per period and game_type for the last `days`, newest period first"""
+        now = now or datetime.now()
+        current = period_start(now, unit)
+        since = period_start(now - timedelta(days=days), unit)
+        self.refresh(unit, now)
+        rows = list(self.rollups.find(
+            {'unit': unit, 'period': {'$gte': since, '$lt': current}}, {'_id': 0, 'built_at': 0}))
+        rows.extend(self._aggregate(unit, current, now + timedelta(seconds=1)))
+        for row in rows:
+            self._derive(row)
+        rows.sort(key=lambda row: (row['period'], row['game_type'] or ''), reverse=True)
+        return rows
+
+    @staticmethod
+    def _derive(row):
+        rounds, wagered = row['rounds'], row['wagered']
+        house_net = -row['player_net']
+        mean = row['player_net'] / rounds
+        row['house_net'] = round(house_net, 2)
+        row['rtp'] = round(1 - house_net / wagered, 4) if wagered else None
+        row['house_edge'] = round(house_net / wagered, 4) if wagered else None
+        row['win_rate'] = round(row['wins'] / rounds, 4)
+        row['volatility'] = round(math.sqrt(max(row['sum_sq'] / rounds - mean * mean, 0)), 2)
+        return row
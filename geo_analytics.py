@@ -0,0 +1,186 @@
+# geo_analytics.py - logins, failure rate and distinct users per country and city
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from approx_stats import HyperLogLog, Z_95
+
+COUNTRY_P = 12
+CITY_P = 8
+UNKNOWN = '??'
+
+
+def _day(value):
+    return datetime(value.year, value.month, value.day)
+
+
+class GeoAnalytics:
+    """Login attempts per country and city, rolled up per day
+
+    Each geo_rollups document holds one (day, country): logins, failures, a
+    HyperLogLog sketch of the users, and the same per city (with smaller
+    sketches). Finished days never change, so they are rolled up once and
+    a report over a year merges 365 small documents per country. Only
+    today is aggregated live. The rollup pass reads one day range through
+    the (timestamp, country, city, user_id, success) index, grouped down to
+    one row per user. Distinct users are estimates (about 1.6% standard
+    error per country, 6.5% per city), so the report returns them with 95%
+    half-widths. Days already moved out by the retention archiver are read
+    from `archive(since, until)` instead.
+    """
+
+    def __init__(self, db, login_logs=None, archive=None, archived_until=None):
+        self.rollups = db.geo_rollups
+        self.login_logs = login_logs if login_logs is not None else db.login_logs
+        self.archive = archive
+        self.archived_until = archived_until or (lambda: None)
+
+    @staticmethod
+    def ensure_indexes(db, login_logs=None):
+        login_logs = login_logs if login_logs is not None else db.login_logs
+        try:
+            login_logs.create_index([('timestamp', ASCENDING), ('location.country', ASCENDING),
+                                     ('location.city', ASCENDING), ('user_id', ASCENDING), ('success', ASCENDING)])
+        except OperationFailure:
+            pass  # time-series collections before MongoDB 6.0 only index the time and meta fields
+        db.geo_rollups.create_index([('day', ASCENDING), ('country', ASCENDING)])
+
+    def _scan(self, since, until):
+        """(day, country, city, user_id, logins, failures) per user, from the hot collection"""
+        pipeline = [
+            {'$match': {'timestamp': {'$gte': since, '$lt': until}}},
+            {'$project': {'_id': 0, 'timestamp': 1, 'location.country': 1, 'location.city': 1,
+                          'user_id': 1, 'success': 1}},
+            {'$group': {
+                '_id': {
+                    'day': {'$dateFromParts': {'year': {'$year': '$timestamp'},
+                                               'month': {'$month': '$timestamp'},
+                                               'day': {'$dayOfMonth': '$timestamp'}}},
+                    'country': '$location.country',
+                    'city': '$location.city',
+                    'user_id': '$user_id'
+                },
+                'logins': {'$sum': 1},
+                'failures': {'$sum': {'$cond': ['$success', 0, 1]}}
+            }}
+        ]
+        for entry in self.login_logs.aggregate(pipeline, allowDiskUse=True):
+            key = entry['_id']
+            yield key['day'], key.get('country'), key.get('city'), key.get('user_id'), entry['logins'], entry['failures']
+
+    def _archived(self, since, until):
+        for log in self.archive(since, until):
+            location = log.get('location') or {}
+            yield (_day(log['timestamp']), location.get('country'), location.get('city'), log.get('user_id'),
+                   1, 0 if log.get('success') else 1)
+
+    def _collect(self, since, until):
+        """{(day, country): cell} for [since, until), with sketches as HyperLogLog objects"""
+        cells = {}
+        rows = []
+        boundary = self.archived_until()
+        if self.archive and boundary and since < boundary:
+            rows.append(self._archived(since, min(boundary, until)))
+            since = max(since, boundary)
+        if since < until:
+            rows.append(self._scan(since, until))
+        for source in rows:
+            for day, country, city, user_id, logins, failures in source:
+                cell = cells.get((day, country or UNKNOWN))
+                if cell is None:
+                    cell = cells[(day, country or UNKNOWN)] = {
+                        'logins': 0, 'failures': 0, 'users': HyperLogLog(COUNTRY_P), 'cities': {}}
+                city_cell = cell['cities'].get(city or UNKNOWN)
+                if city_cell is None:
+                    city_cell = cell['cities'][city or UNKNOWN] = {
+                        'logins': 0, 'failures': 0, 'users': HyperLogLog(CITY_P)}
+                for target in (cell, city_cell):
+                    target['logins'] += logins
+                    target['failures'] += failures
+                    target['users'].add(user_id)
+        return cells
+
+    def refresh(self, now=None):
+        """Roll up every finished day not rolled up yet, one day per pass; returns the number of days rolled up"""
+        today = _day(now or datetime.now())
+        state = self.rollups.find_one({'_id': 'state'})
+        since = state['rolled_until'] if state else self._first_day()
+        rolled = 0
+        while since is not None and since < today:
+            until = since + timedelta(days=1)
+            for (day, country), cell in self._collect(since, until).items():
+                self.rollups.replace_one({'_id': f"{day:%Y-%m-%d}:{country}"}, {
+                    'day': day, 'country': country, 'logins': cell['logins'], 'failures': cell['failures'],
+                    'users': bytes(cell['users'].registers),
+                    'cities': [{'city': city, 'logins': c['logins'], 'failures': c['failures'],
+                                'users': bytes(c['users'].registers)} for city, c in cell['cities'].items()]
+                }, upsert=True)
+            self.rollups.update_one({'_id': 'state'}, {'$set': {'rolled_until': until}}, upsert=True)
+            since = until
+            rolled += 1
+        return rolled
+
+    def rebuild(self):
+        """Forget rollups (e.g. after rewriting login timestamps); the next report rebuilds them"""
+        self.rollups.delete_many({})
+
+    def _first_day(self):
+        starts = []
+        first = next(self.login_logs.find({}, {'timestamp': 1}).sort('timestamp', ASCENDING).limit(1), None)
+        if first and isinstance(first.get('timestamp'), datetime):
+            starts.append(first['timestamp'])
+        boundary = self.archived_until()
+        if self.archive and boundary:
+            # One pass over the archive, only before the first rollup
+            archived = min((doc['timestamp'] for doc in self.archive(datetime(1970, 1, 1), boundary)), default=None)
+            if archived:
+                starts.append(archived)
+        return _day(min(starts)) if starts else None
+
+    def report(self, days, country=None, now=None):
+        """Rows per country (or per city of `country`) over the last `days`, most logins first
+
+        Rows carry logins, failed, failure_rate and users (distinct, with a
+        95% half-width in users_error).
+        """
+        now = now or datetime.now()
+        today = _day(now)
+        self.refresh(now)
+        since = _day(now - timedelta(days=days))
+        query = {'day': {'$gte': since, '$lt': today}}
+        if country:
+            query['country'] = country
+        totals = {}
+
+        def add(key, p, logins, failures, registers):
+            row = totals.get(key)
+            if row is None:
+                row = totals[key] = {'logins': 0, 'failed': 0, 'users': HyperLogLog(p)}
+            row['logins'] += logins
+            row['failed'] += failures
+            row['users'].merge(registers if isinstance(registers, HyperLogLog) else HyperLogLog(p, registers))
+
+        cells = [(doc['country'], doc) for doc in self.rollups.find(query, None if country else {'cities': 0})]
+        for (_, day_country), cell in self._collect(today, now + timedelta(seconds=1)).items():
+            if not country or day_country == country:
+                cell = dict(cell, cities=[{'city': city, **c} for city, c in cell['cities'].items()])
+                cells.append((day_country, cell))
+        for cell_country, cell in cells:
+            if country:
+                for city in cell['cities']:
+                    add((cell_country, city['city']), CITY_P, city['logins'], city['failures'], city['users'])
+            else:
+                add((cell_country, None), COUNTRY_P, cell['logins'], cell['failures'], cell['users'])
+
+        rows = []
+        for (row_country, city), row in totals.items():
+            sketch = row.pop('users')
+            users = sketch.count()
+            rows.append({
+                'country': row_country, 'city': city, **row,
+                'failure_rate': round(row['failed'] / row['logins'], 4) if row['logins'] else 0,
+                'users': round(users), 'users_error': round(Z_95 * sketch.relative_error * users)
+            })
+        rows.sort(key=lambda row: (-row['logins'], row['country'], row['city'] or ''))
+        return rows
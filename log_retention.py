@@ -0,0 +1,384 @@
+# log_retention.py - hot window, cold archive and expiry for log collections
+import gzip
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId, json_util
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from login_log_storage import is_timeseries
+
+DEFAULT_HOT_DAYS = {'login_logs': 90, 'admin_logs': 365}
+
+
+def _day(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def _field(doc, path):
+    for part in path.split('.'):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+def _matches(doc, query):
+    """Equality on (dotted) fields, and $or lists of such filters"""
+    return all(any(_matches(doc, branch) for branch in value) if key == '$or' else _field(doc, key) == value
+               for key, value in query.items())
+
+
+def sort_key(doc):
+    """(timestamp, _id) order as MongoDB sorts it: string ids before ObjectIds"""
+    return doc['timestamp'], isinstance(doc['_id'], ObjectId), str(doc['_id'])
+
+
+class LogRetention:
+    """Keep recent log entries hot and move older ones to a cold archive
+
+    Each collection has a hot window in days. The archiver copies whole days
+    older than the window, oldest first, to gzip JSON-lines files partitioned
+    by date (archive_dir/<collection>/YYYY/MM/<collection>-YYYY-MM-DD.jsonl.gz)
+    or to a <collection>_archive collection. It then records the day it got up
+    to as the archive high-water mark. After archiving, the same run deletes
+    hot documents older than the window plus ttl_grace_days, but never past
+    the mark, so nothing leaves the hot collection unarchived even when no
+    archiver is scheduled. (A TTL index would keep deleting after the last
+    run; ensure_indexes removes the ones earlier versions installed.)
+    Backdated inserts (imports) can land below the mark; each run compares
+    the hot days below it with the counts recorded when they were archived
+    and merges any new documents into the archive before deleting them.
+    Runs take a lease in retention_state, so two consoles never write the
+    same day at once.
+
+    Range queries are split at the high-water mark: the archive answers
+    everything older, the hot collection everything newer. Documents that
+    are archived but not yet expired are never counted twice.
+    """
+
+    LEASE_SECONDS = 3600
+
+    def __init__(self, db, hot_days=None, mode='none', archive_dir='archive',
+                 ttl_grace_days=7, batch_size=5000):
+        self.db = db
+        self.hot_days = dict(DEFAULT_HOT_DAYS if hot_days is None else hot_days)
+        self.mode = mode
+        self.archive_dir = archive_dir
+        self.ttl_grace_days = ttl_grace_days
+        self.batch_size = batch_size
+        self.state = db.retention_state
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.last_error = None
+        self.owner = None
+
+    @classmethod
+    def from_config(cls, db, config):
+        section = config['RETENTION'] if config.has_section('RETENTION') else {}
+        hot_days = {name: int(section.get(f'{name}_hot_days', days)) for name, days in DEFAULT_HOT_DAYS.items()}
+        return cls(
+            db,
+            hot_days=hot_days,
+            mode=section.get('archive', 'none'),
+            archive_dir=section.get('archive_dir', 'archive'),
+            ttl_grace_days=int(section.get('ttl_grace_days', '7')),
+            batch_size=int(section.get('batch_size', '5000'))
+        )
+
+    @property
+    def enabled(self):
+        return self.mode in ('files', 'collection')
+
+    def ensure_indexes(self):
+        """Drop TTL expiry left by earlier versions and index the archive collections"""
+        messages = []
+        for name in self.hot_days:
+            message = self._drop_ttl(name)
+            if message:
+                messages.append(message)
+            if self.mode == 'collection':
+                self.db[f'{name}_archive'].create_index([('timestamp', DESCENDING)])
+        return messages
+
+    def _drop_ttl(self, name):
+        # A TTL deletes whether or not the archiver ran; expiry now happens in _expire
+        try:
+            if is_timeseries(self.db, name):
+                info = next(self.db.list_collections(filter={'name': name}), None) or {}
+                if 'expireAfterSeconds' in info.get('options', {}):
+                    self.db.command('collMod', name, expireAfterSeconds='off')
+                return None
+            for index in self.db[name].list_indexes():
+                if 'expireAfterSeconds' in index and list(index['key'].items()) == [('timestamp', DESCENDING)]:
+                    self.db[name].drop_index(index['name'])
+                    self.db[name].create_index([('timestamp', DESCENDING)])
+        except OperationFailure as e:
+            return f"⚠ Expiry not removed from {name}: {str(e)}"
+        return None
+
+    def _expire(self, name, cutoff):
+        """Delete hot documents past the window and grace period, up to the archive mark; returns the number deleted"""
+        boundary = self.archived_until(name)
+        if boundary is None:
+            return 0
+        until = min(boundary, cutoff - timedelta(days=self.ttl_grace_days))
+        try:
+            return self.db[name].delete_many({'timestamp': {'$lt': until}}).deleted_count
+        except OperationFailure as e:
+            # Time-series collections before MongoDB 7.0 only delete by their metaField
+            self.last_error = f"⚠ Expiry skipped on {name}: {str(e)}"
+            return 0
+
+    def _acquire(self, now):
+        self.owner = uuid.uuid4().hex
+        free = {'_id': 'lease', '$or': [{'lease_until': {'$exists': False}}, {'lease_until': {'$lt': now}}]}
+        try:
+            lease = self.state.find_one_and_update(
+                free, {'$set': {'lease_until': now + timedelta(seconds=self.LEASE_SECONDS), 'lease_owner': self.owner}},
+                upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            return False  # another process is archiving
+        return bool(lease) and lease.get('lease_owner') == self.owner
+
+    def _renew(self):
+        """Extend the lease before writing a day; raises if another process took it over"""
+        renewed = self.state.update_one(
+            {'_id': 'lease', 'lease_owner': self.owner},
+            {'$set': {'lease_until': datetime.now() + timedelta(seconds=self.LEASE_SECONDS)}})
+        if not renewed.matched_count:
+            raise RuntimeError("Archive lease lost to another process")
+
+    def archived_until(self, name):
+        state = self.state.find_one({'_id': name})
+        return state.get('archived_until') if state else None
+
+    def cutoff(self, name, now=None):
+        return _day((now or datetime.now()) - timedelta(days=self.hot_days[name]))
+
+    def archive(self, names=None, now=None, progress=None):
+        """Archive every complete day older than each hot window; returns documents archived per collection"""
+        if not self.enabled:
+            return {}
+        archived = {}
+        with self.lock:
+            if not self._acquire(datetime.now()):
+                self.last_error = "⚠ Another process is archiving; skipped this run"
+                return archived
+            try:
+                for name in names or self.hot_days:
+                    if self.hot_days.get(name, 0) > 0:
+                        cutoff = self.cutoff(name, now)
+                        archived[name] = self._archive_collection(name, cutoff, progress)
+                        self._expire(name, cutoff)
+            finally:
+                self.state.update_one({'_id': 'lease', 'lease_owner': self.owner}, {'$unset': {'lease_until': 1}})
+        return archived
+
+    def _archive_collection(self, name, cutoff, progress):
+        collection = self.db[name]
+        day = self.archived_until(name)
+        if day is None:
+            oldest = collection.find_one({'timestamp': {'$lt': cutoff}}, {'timestamp': 1},
+                                         sort=[('timestamp', ASCENDING)])
+            day = _day(oldest['timestamp']) if oldest else cutoff
+            total = 0
+        else:
+            total = self._rearchive(name, day, progress)
+
+        while day < cutoff:
+            next_day = day + timedelta(days=1)
+            cursor = collection.find({'timestamp': {'$gte': day, '$lt': next_day}}).sort('timestamp', ASCENDING)
+            read, count = self._write_day(name, day, cursor.batch_size(self.batch_size))
+            total += count
+            if progress and count:
+                progress(name, day, count)
+
+            following = collection.find_one({'timestamp': {'$gte': next_day, '$lt': cutoff}}, {'timestamp': 1},
+                                            sort=[('timestamp', ASCENDING)])
+            archived_day, day = day, _day(following['timestamp']) if following else cutoff
+            self._set_archived_until(name, day, count, {archived_day: read})
+        if self.archived_until(name) is None:
+            self._set_archived_until(name, cutoff, 0)
+        return total
+
+    def _rearchive(self, name, boundary, progress):
+        """Merge hot documents below the mark that are not archived yet; returns the number added
+
+        Only days still in the hot collection are looked at, and a day is
+        re-read only when it holds more documents than when it was archived.
+        """
+        collection = self.db[name]
+        seen = (self.state.find_one({'_id': name}) or {}).get('days', {})
+        oldest = collection.find_one({'timestamp': {'$lt': boundary}}, {'timestamp': 1},
+                                     sort=[('timestamp', ASCENDING)])
+        day = _day(oldest['timestamp']) if oldest else boundary
+        # Days before the oldest hot document have expired and cannot change any more
+        expired = [key for key in seen if key < f"{day:%Y-%m-%d}"]
+        if expired:
+            self.state.update_one({'_id': name}, {'$unset': {f'days.{key}': '' for key in expired}})
+
+        total = 0
+        while day < boundary:
+            next_day = day + timedelta(days=1)
+            query = {'timestamp': {'$gte': day, '$lt': next_day}}
+            if collection.count_documents(query) > seen.get(f"{day:%Y-%m-%d}", 0):
+                cursor = collection.find(query).sort('timestamp', ASCENDING).batch_size(self.batch_size)
+                read, count = self._write_day(name, day, cursor)
+                self.state.update_one({'_id': name}, {'$set': {f"days.{day:%Y-%m-%d}": read},
+                                                      '$inc': {'archived_docs': count}})
+                total += count
+                if progress and count:
+                    progress(name, day, count)
+            following = collection.find_one({'timestamp': {'$gte': next_day, '$lt': boundary}}, {'timestamp': 1},
+                                            sort=[('timestamp', ASCENDING)])
+            day = _day(following['timestamp']) if following else boundary
+        return total
+
+    def _set_archived_until(self, name, day, count, seen=None):
+        # `seen` records how many hot documents each archived day had, for _rearchive
+        self.state.update_one(
+            {'_id': name},
+            {'$set': {'archived_until': day, 'last_run': datetime.now(), 'mode': self.mode,
+                      **{f"days.{d:%Y-%m-%d}": n for d, n in (seen or {}).items()}},
+             '$inc': {'archived_docs': count}},
+            upsert=True
+        )
+
+    def _day_path(self, name, day):
+        return os.path.join(self.archive_dir, name, f"{day:%Y}", f"{day:%m}", f"{name}-{day:%Y-%m-%d}.jsonl.gz")
+
+    def _write_day(self, name, day, cursor):
+        """Merge one day's documents into the archive; returns (documents read, documents added)
+
+        Documents already archived (matched by _id) are kept once, so
+        re-running a day never duplicates it.
+        """
+        self._renew()
+        read = count = 0
+        if self.mode == 'files':
+            path = self._day_path(name, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            archived = set()
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+                if os.path.exists(path):
+                    with gzip.open(path, 'rt', encoding='utf-8') as existing:
+                        for line in existing:
+                            archived.add(json_util.loads(line)['_id'])
+                            f.write(line)
+                for doc in cursor:
+                    read += 1
+                    if doc['_id'] not in archived:
+                        f.write(json_util.dumps(doc) + '\n')
+                        count += 1
+            if count:
+                os.replace(path + '.tmp', path)
+            else:
+                os.remove(path + '.tmp')
+            return read, count
+
+        target = self.db[f'{name}_archive']
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            read += 1
+            if len(batch) >= self.batch_size:
+                count += self._insert_archive(target, batch)
+                batch = []
+        if batch:
+            count += self._insert_archive(target, batch)
+        return read, count
+
+    def _insert_archive(self, target, docs):
+        try:
+            target.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Documents archived by an earlier or interrupted run hit their own copies
+            if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                raise
+            return e.details.get('nInserted', 0)
+        return len(docs)
+
+    def split(self, name, since):
+        """(archive_since, hot_since) for a range starting at `since`; archive_since is None when the hot data covers it"""
+        boundary = self.archived_until(name) if self.enabled else None
+        if boundary is None or since is None or since >= boundary:
+            return None, since
+        return since, boundary
+
+    def iter_archive(self, name, since, until, query=None, reverse=False):
+        """Archived documents with since <= timestamp < until matching `query` (see _matches)
+
+        With `reverse` they come newest first in sort_key order.
+        """
+        query = query or {}
+        if self.mode == 'collection':
+            cursor = self.db[f'{name}_archive'].find({**query, 'timestamp': {'$gte': since, '$lt': until}})
+            if reverse:
+                cursor = cursor.sort([('timestamp', DESCENDING), ('_id', DESCENDING)])
+            yield from cursor.batch_size(self.batch_size)
+            return
+        days = self._archived_days(name, since, until)
+        for day in reversed(days) if reverse else days:
+            docs = []
+            with gzip.open(self._day_path(name, day), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    doc = json_util.loads(line)
+                    if since <= doc['timestamp'] < until and _matches(doc, query):
+                        if not reverse:
+                            yield doc
+                        else:
+                            docs.append(doc)
+            yield from sorted(docs, key=sort_key, reverse=True)
+
+    def _archived_days(self, name, since, until):
+        """Days in [since, until) that have an archive file, oldest first"""
+        days = []
+        for _, _, files in os.walk(os.path.join(self.archive_dir, name)):
+            for file in files:
+                if not (file.startswith(f'{name}-') and file.endswith('.jsonl.gz')):
+                    continue
+                try:
+                    day = datetime.strptime(file[len(name) + 1:-len('.jsonl.gz')], '%Y-%m-%d')
+                except ValueError:
+                    continue
+                if _day(since) <= day < until:
+                    days.append(day)
+        return sorted(days)
+
+    def start(self, interval=3600, on_error=None):
+        """Run the archiver every `interval` seconds on a daemon thread"""
+        if not self.enabled or self.thread:
+            return
+
+        def loop():
+            while not self.stopping.is_set():
+                try:
+                    self.last_error = None
+                    self.archive()
+                except Exception as e:
+                    self.last_error = str(e)
+                    if on_error:
+                        on_error(e)
+                self.stopping.wait(interval)
+
+        self.thread = threading.Thread(target=loop, name='log-archiver', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def status(self):
+        rows = []
+        for name, days in self.hot_days.items():
+            state = self.state.find_one({'_id': name}) or {}
+            rows.append({
+                'collection': name,
+                'hot_days': days,
+                'archived_until': state.get('archived_until'),
+                'archived_docs': state.get('archived_docs', 0),
+                'last_run': state.get('last_run')
+            })
+        return rows
@@ -0,0 +1,145 @@
+# login_limiter.py - failed-login throttling shared between local processes, and batched login logs
+import sqlite3
+import threading
+import time
+
+from pymongo.errors import BulkWriteError
+
+
+class LoginLimiter:
+    """Token buckets of failed logins per email, kept in a local SQLite file
+
+    Each email holds up to `capacity` tokens and refills at capacity/window
+    tokens per second. Every attempt reserves a token before the password
+    is hashed, and an empty bucket means the attempt is refused. A
+    successful login refills the email's bucket, so only failures use it
+    up. Reserving in the same transaction as the check means N parallel
+    attempts cannot all pass and all reach bcrypt. One row per email is all
+    the state there is, and every console process on the host opens the
+    same file, so a burst split across processes is still counted once.
+    Updates run inside BEGIN IMMEDIATE transactions, so processes never
+    lose each other's counts. Logins only come from local consoles, so
+    there is no per-source bucket: every attempt has the same source.
+    """
+
+    def __init__(self, path='login_limiter.db', window=300, email_failures=5):
+        self.path = path
+        self.window = window
+        self.capacity = email_failures
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated)")
+
+    @classmethod
+    def from_config(cls, config):
+        section = config['LOGIN_LIMITER'] if config.has_section('LOGIN_LIMITER') else {}
+        if str(section.get('enabled', 'true')).lower() not in ('1', 'true', 'yes', 'on'):
+            return None
+        return cls(
+            path=section.get('path', 'login_limiter.db'),
+            window=int(section.get('window', '300')),
+            email_failures=int(section.get('email_failures', '5'))
+        )
+
+    @staticmethod
+    def _key(email):
+        return f"email:{email.strip().lower()}"
+
+    def _tokens(self, row, now):
+        if row is None:
+            return self.capacity
+        tokens, updated = row
+        return min(self.capacity, tokens + (now - updated) * self.capacity / self.window)
+
+    def check(self, email):
+        """Seconds until an attempt is allowed; 0 when it may go ahead, with a token reserved"""
+        now = time.time()
+        key = self._key(email)
+        wait = 0
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = self._tokens(row, now)
+                if tokens < 1:
+                    wait = (1 - tokens) * self.window / self.capacity
+                else:
+                    self.conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                                      (key, tokens - 1, now))
+                # A bucket untouched for a whole window is full again, so its row carries nothing
+                self.conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.window,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def succeeded(self, email):
+        """Refill the email's bucket"""
+        with self.lock:
+            self.conn.execute("DELETE FROM buckets WHERE key = ?", (self._key(email),))
+
+    def close(self):
+        self.conn.close()
+
+
+class LoginLogWriter:
+    """Buffer login_logs entries and write them with insert_many
+
+    Entries are flushed once `batch_size` are waiting, every
+    `flush_interval` seconds from a background thread, or on an explicit
+    flush (on successful login and at exit). `timestamp` stays the attempt
+    time, so an entry can land up to a flush interval behind readers that
+    follow login_logs by timestamp; they hold back a lag or settle window
+    for that.
+    """
+
+    def __init__(self, collection, batch_size=100, flush_interval=2, on_flush=None):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.pending = []
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='login-log-writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # entries stay pending and go out with the next flush
+
+    def add(self, entry):
+        with self.lock:
+            self.pending.append(entry)
+            due = len(self.pending) >= self.batch_size
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write everything pending; returns the number of entries written"""
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return 0
+        try:
+            self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError:
+            pass  # the entries that could be written were; the rest would fail again
+        except Exception:
+            with self.lock:
+                self.pending[:0] = batch
+            raise
+        if self.on_flush:
+            self.on_flush(len(batch))
+        return len(batch)
+
+    def stop(self):
+        self.stopping.set()
+        self.flush()
@@ -0,0 +1,135 @@
+# login_log_storage.py - time-series storage for login_logs
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+TIMESERIES_OPTIONS = {'timeField': 'timestamp', 'metaField': 'user_id'}
+LEGACY_SUFFIX = '_legacy'
+
+
+def is_timeseries(db, name):
+    for info in db.list_collections(filter={'name': name}):
+        return info.get('type') == 'timeseries'
+    return False
+
+
+def create_timeseries(db, name='login_logs', granularity='hours'):
+    """Create `name` as a time-series collection bucketed per user"""
+    db.create_collection(name, timeseries={**TIMESERIES_OPTIONS, 'granularity': granularity})
+    ensure_indexes(db[name])
+    return db[name]
+
+
+def ensure_indexes(collection):
+    # Bucket-level (meta, time) index: serves per-user "last login" lookups and user-grouped scans
+    collection.create_index([('user_id', ASCENDING), ('timestamp', DESCENDING)])
+    collection.create_index([('timestamp', DESCENDING)])
+
+
+def migrate(db, name='login_logs', granularity='hours', batch_size=5000, drop_legacy=False, progress=None):
+    """Move a plain collection into a new time-series collection of the same name
+
+    The plain collection is renamed to <name>_legacy first so logins keep
+    landing in `name` throughout. Documents are copied in (user_id,
+    timestamp) order, which fills each user's buckets in sequence instead of
+    reopening them. Progress is kept in migration_state: a finished
+    migration is never repeated, and a run interrupted after the rename
+    resumes by copying only the legacy documents not yet in `name`, so
+    logins written since the rename are never touched. Documents whose
+    timestamp is not a date cannot go into a time-series collection, so the
+    migration refuses to start while the plain collection has any (run
+    normalize-types first). Returns the number of documents copied.
+    """
+    legacy_name = name + LEGACY_SUFFIX
+    state_id = f'timeseries:{name}'
+    state = db.migration_state.find_one({'_id': state_id}) or {}
+    existing = db.list_collection_names()
+    if state.get('completed'):
+        if drop_legacy and legacy_name in existing:
+            db.drop_collection(legacy_name)
+        return 0
+
+    resuming = name in existing and is_timeseries(db, name)
+    if resuming:
+        if legacy_name not in existing:
+            return 0
+        target = db[name]
+    elif name in existing:
+        if legacy_name in existing:
+            raise RuntimeError(f"{legacy_name} already exists; drop or rename it before migrating")
+        if db[name].find_one({'timestamp': {'$exists': True, '$not': {'$type': 'date'}}}, {'_id': 1}):
+            raise RuntimeError(f"{name} has timestamps that are not dates; run normalize-types before migrating")
+        db.migration_state.update_one({'_id': state_id}, {'$set': {'started': datetime.now(), 'completed': False}},
+                                      upsert=True)
+        db[name].rename(legacy_name)
+        target = create_timeseries(db, name, granularity)
+    else:
+        create_timeseries(db, name, granularity)
+        return 0
+
+    legacy = db[legacy_name]
+    copied = 0
+    batch = []
+    cursor = legacy.find({}).sort([('user_id', ASCENDING), ('timestamp', ASCENDING)]).batch_size(batch_size)
+    for doc in cursor.allow_disk_use(True):
+        # Written after the pre-check (or by an old client); a time-series insert would reject it
+        if not isinstance(doc.get('timestamp'), datetime):
+            continue
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            copied += _copy_missing(target, batch) if resuming else _copy(target, batch)
+            batch = []
+            if progress:
+                progress(copied)
+    if batch:
+        copied += _copy_missing(target, batch) if resuming else _copy(target, batch)
+        if progress:
+            progress(copied)
+
+    db.migration_state.update_one({'_id': state_id}, {'$set': {'completed': True, 'completed_at': datetime.now()}},
+                                  upsert=True)
+    if drop_legacy:
+        db.drop_collection(legacy_name)
+    return copied
+
+
+def _copy(target, docs):
+    target.insert_many(docs, ordered=False)
+    return len(docs)
+
+
+def _copy_missing(target, docs):
+    """Insert the documents whose _id is not in the target yet; the user_id filter narrows the scan to their buckets"""
+    present = {doc['_id'] for doc in target.find(
+        {'user_id': {'$in': list({doc.get('user_id') for doc in docs})}, '_id': {'$in': [doc['_id'] for doc in docs]}},
+        {'_id': 1})}
+    missing = [doc for doc in docs if doc['_id'] not in present]
+    return _copy(target, missing) if missing else 0
+
+
+def storage_stats(db, name):
+    """Document count, uncompressed data size and on-disk sizes in bytes (time-series report their buckets)"""
+    stats = next(db[name].aggregate([{'$collStats': {'storageStats': {}}}]), {}).get('storageStats', {})
+    return {
+        'collection': name,
+        'timeseries': is_timeseries(db, name),
+        'documents': stats.get('count', 0),
+        'data_bytes': stats.get('size', 0),
+        'avg_document_bytes': stats.get('avgObjSize', 0),
+        'storage_bytes': stats.get('storageSize', 0),
+        'index_bytes': stats.get('totalIndexSize', 0),
+        'buckets': stats.get('timeseries', {}).get('bucketCount')
+    }
+
+
+def time_pipeline(collection, pipeline, runs=5):
+    """Median wall time in ms of running an aggregation to completion"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in collection.aggregate(pipeline, allowDiskUse=True):
+            pass
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return round(samples[len(samples) // 2], 2)
@@ -0,0 +1,248 @@
+# login_monitor.py - incremental brute-force and anomaly detection over login_logs
+import threading
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING
+
+
+class SlidingCounter:
+    """Event count over the last `window` seconds in a fixed ring of buckets
+
+    Memory is `buckets` integers whatever the event rate; buckets that fall out
+    of the window are zeroed as time moves past them.
+    """
+    __slots__ = ('counts', 'bucket_width', 'head', 'last_seen', 'alerted_at')
+
+    def __init__(self, window, buckets):
+        self.counts = [0] * buckets
+        self.bucket_width = window / buckets
+        self.head = None
+        self.last_seen = 0.0
+        self.alerted_at = None
+
+    def add(self, at):
+        """Count an event at epoch seconds `at`; returns the total inside the window"""
+        slot = int(at // self.bucket_width)
+        size = len(self.counts)
+        if self.head is None or slot - self.head >= size:
+            self.counts = [0] * size
+            self.head = slot
+        elif slot > self.head:
+            for expired in range(self.head + 1, slot + 1):
+                self.counts[expired % size] = 0
+            self.head = slot
+        elif self.head - slot >= size:
+            return sum(self.counts)  # older than the window: too late to count
+        self.counts[slot % size] += 1
+        self.last_seen = max(self.last_seen, at)
+        return sum(self.counts)
+
+
+class LoginMonitor:
+    """Watch new login attempts for brute force, password spraying and new countries
+
+    Login logs are read incrementally in (timestamp, _id) order from a
+    persisted keyset mark, so history is never re-scanned and any number of
+    logs can share one timestamp. Only logs older than `lag` seconds are
+    read, which leaves buffered writers time to commit attempts stamped a
+    little earlier. Change streams are not
+    used because they are unavailable on standalone servers and on time-series
+    login_logs. Per-user and per-IP failures are counted in SlidingCounter
+    rings, and counters idle for a whole window are dropped. Each user's
+    recent countries (at most `max_countries`) live in login_profiles, and a
+    successful login from an unseen country raises an alert.
+
+    Alerts go to security_alerts. Users crossing the failure threshold can be
+    disabled automatically (admins are only alerted).
+    """
+
+    def __init__(self, db, window=300, buckets=10, user_threshold=5, ip_threshold=20,
+                 auto_disable=False, max_countries=5, batch_size=1000, lag=5):
+        self.db = db
+        self.window = window
+        self.buckets = buckets
+        self.user_threshold = user_threshold
+        self.ip_threshold = ip_threshold
+        self.auto_disable = auto_disable
+        self.max_countries = max_countries
+        self.batch_size = batch_size
+        self.lag = lag
+        self.user_failures = {}
+        self.ip_failures = {}
+        self.state_id = 'login_monitor'
+        self.processed = 0
+        self.alerts_raised = 0
+        self.thread = None
+        self.stopping = threading.Event()
+        self.last_error = None
+        self._high_water = None
+        self._last_id = None
+
+    @classmethod
+    def from_config(cls, db, config):
+        section = config['MONITOR'] if config.has_section('MONITOR') else {}
+        return cls(
+            db,
+            window=int(section.get('window', '300')),
+            buckets=int(section.get('buckets', '10')),
+            user_threshold=int(section.get('user_failures', '5')),
+            ip_threshold=int(section.get('ip_failures', '20')),
+            auto_disable=str(section.get('auto_disable', 'false')).lower() in ('1', 'true', 'yes', 'on'),
+            max_countries=int(section.get('max_countries', '5')),
+            lag=int(section.get('lag', '5'))
+        )
+
+    @staticmethod
+    def ensure_indexes(db):
+        db.security_alerts.create_index([('detected_at', DESCENDING)])
+        db.security_alerts.create_index([('user_id', ASCENDING), ('detected_at', DESCENDING)])
+
+    def _load_state(self):
+        state = self.db.monitor_state.find_one({'_id': self.state_id})
+        if state:
+            self._high_water = state['high_water']
+            self._last_id = state.get('last_id')
+        else:
+            # First run: start one window back instead of replaying history
+            self._high_water = datetime.now() - timedelta(seconds=self.window)
+            self._last_id = None
+
+    def _save_state(self):
+        self.db.monitor_state.update_one(
+            {'_id': self.state_id},
+            {'$set': {'high_water': self._high_water, 'last_id': self._last_id, 'updated_at': datetime.now()},
+             '$unset': {'seen_at_high_water': 1}},
+            upsert=True
+        )
+
+    def _page_query(self, until):
+        query = {'timestamp': {'$gte': self._high_water, '$lt': until}}
+        if self._last_id is not None:
+            after = [{'timestamp': {'$gt': self._high_water}},
+                     {'timestamp': self._high_water, '_id': {'$gt': self._last_id}}]
+            if isinstance(self._last_id, str):
+                # $gt only compares within one BSON type; ObjectIds sort after every string
+                after.append({'timestamp': self._high_water, '_id': {'$type': 'objectId'}})
+            query['$or'] = after
+        return query
+
+    def poll(self, now=None):
+        """Process login attempts logged since the last poll, up to `lag` seconds ago; returns the alerts raised"""
+        if self._high_water is None:
+            self._load_state()
+        until = (now or datetime.now()) - timedelta(seconds=self.lag)
+        alerts = []
+        while True:
+            batch = list(self.db.login_logs.find(
+                self._page_query(until),
+                {'user_id': 1, 'success': 1, 'timestamp': 1, 'ip': 1, 'location': 1}
+            ).sort([('timestamp', ASCENDING), ('_id', ASCENDING)]).limit(self.batch_size))
+            for log in batch:
+                alerts.extend(self._process(log))
+            if batch:
+                self._high_water, self._last_id = batch[-1]['timestamp'], batch[-1]['_id']
+                self.processed += len(batch)
+                self._save_state()
+            if len(batch) < self.batch_size:
+                break
+        self._expire()
+        if alerts:
+            self.db.security_alerts.insert_many(alerts)
+            self.alerts_raised += len(alerts)
+        return alerts
+
+    def _process(self, log):
+        alerts = []
+        at = log['timestamp'].timestamp()
+        if not log.get('success'):
+            counter = self._counter(self.user_failures, log['user_id'])
+            failures = counter.add(at)
+            if failures >= self.user_threshold and self._should_alert(counter, at):
+                alerts.append(self._alert('user_failures', log, failures, action=self._disable(log['user_id'])))
+            if log.get('ip'):
+                counter = self._counter(self.ip_failures, log['ip'])
+                failures = counter.add(at)
+                if failures >= self.ip_threshold and self._should_alert(counter, at):
+                    alerts.append(self._alert('ip_failures', log, failures))
+        else:
+            country = (log.get('location') or {}).get('country')
+            if country and self._is_new_country(log['user_id'], country, log['timestamp']):
+                alerts.append(self._alert('new_country', log, 1, country=country))
+        return alerts
+
+    def _counter(self, counters, key):
+        counter = counters.get(key)
+        if counter is None:
+            counter = counters[key] = SlidingCounter(self.window, self.buckets)
+        return counter
+
+    def _should_alert(self, counter, at):
+        # One alert per key per window, however long the attack goes on
+        if counter.alerted_at is not None and at - counter.alerted_at < self.window:
+            return False
+        counter.alerted_at = at
+        return True
+
+    def _expire(self):
+        # Idle for a whole window (in log time) means every bucket is empty
+        cutoff = self._high_water.timestamp() - self.window
+        for counters in (self.user_failures, self.ip_failures):
+            for key in [k for k, c in counters.items() if c.last_seen < cutoff]:
+                del counters[key]
+
+    def _is_new_country(self, user_id, country, seen_at):
+        profile = self.db.login_profiles.find_one({'_id': user_id}, {'countries': 1}) or {}
+        known = profile.get('countries', {})
+        is_new = bool(known) and country not in known
+        if known.get(country) != seen_at:
+            latest = {**known, country: max(seen_at, known.get(country, seen_at))}
+            recent = dict(sorted(latest.items(), key=lambda item: item[1], reverse=True)[:self.max_countries])
+            self.db.login_profiles.update_one({'_id': user_id}, {'$set': {'countries': recent}}, upsert=True)
+        return is_new
+
+    def _disable(self, user_id):
+        if not self.auto_disable:
+            return 'flagged'
+        result = self.db.users.update_one(
+            {'_id': user_id, 'role': {'$ne': 'admin'}, 'active': {'$ne': False}},
+            {'$set': {'active': False, 'disabled_reason': 'login_monitor', 'updated_at': datetime.now()}}
+        )
+        return 'disabled' if result.modified_count else 'flagged'
+
+    def _alert(self, kind, log, count, action='flagged', **extra):
+        return {
+            'type': kind,
+            'user_id': log.get('user_id'),
+            'ip': log.get('ip'),
+            'count': count,
+            'window_s': self.window,
+            'timestamp': log['timestamp'],
+            'detected_at': datetime.now(),
+            'action': action,
+            **extra
+        }
+
+    def recent_alerts(self, limit=50):
+        return list(self.db.security_alerts.find().sort('detected_at', DESCENDING).limit(limit))
+
+    def start(self, interval=5, on_alert=None):
+        """Poll every `interval` seconds on a daemon thread"""
+        if self.thread:
+            return
+
+        def loop():
+            while not self.stopping.is_set():
+                try:
+                    alerts = self.poll()
+                    self.last_error = None
+                    if alerts and on_alert:
+                        on_alert(alerts)
+                except Exception as e:
+                    self.last_error = str(e)
+                self.stopping.wait(interval)
+
+        self.thread = threading.Thread(target=loop, name='login-monitor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
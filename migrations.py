@@ -0,0 +1,207 @@
+# migrations.py - parallel, batched rewrites of existing collections
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from login_log_storage import is_timeseries
+
+# _id types with their own range bracket; a $gte/$lt bound only matches values of its own type
+ID_TYPES = ('objectId', 'string', 'number', 'binData')
+
+
+def id_ranges(collection, chunks):
+    """Filters splitting a collection into about `chunks` contiguous _id ranges per _id type
+
+    Boundaries are quantiles of a random sample of _ids (a $sample random
+    cursor, not an index walk), so chunks come out roughly even without
+    reading the collection first. Documents whose _id is of another type
+    (embedded documents, dates) are not covered.
+    """
+    ranges = []
+    sample_size = max(chunks * 20, 100)
+    for id_type in ID_TYPES:
+        typed = {'$type': id_type}
+        if collection.find_one({'_id': typed}, {'_id': 1}) is None:
+            continue
+        sample = sorted(doc['_id'] for doc in collection.aggregate([
+            {'$sample': {'size': sample_size}},
+            {'$match': {'_id': typed}},
+            {'$project': {'_id': 1}}
+        ]))
+        bounds = []
+        for i in range(1, chunks):
+            if sample:
+                bound = sample[len(sample) * i // chunks]
+                if not bounds or bound > bounds[-1]:
+                    bounds.append(bound)
+        edges = [None] + bounds + [None]
+        for low, high in zip(edges[:-1], edges[1:]):
+            condition = dict(typed)
+            if low is not None:
+                condition['$gte'] = low
+            if high is not None:
+                condition['$lt'] = high
+            ranges.append({'_id': condition})
+    return ranges
+
+
+def rewrite(collection, convert, match=None, workers=4, batch_size=1000, progress=None):
+    """Run `convert(doc)` over every document matching `match`, writing the operations it returns
+
+    `convert` returns a write operation, None to leave the document alone,
+    or True when it has already written the document itself. Operations are sent in unordered bulk_writes of `batch_size`.
+    Chunks of _id ranges are spread over `workers` threads, and every
+    conversion should filter on the old value so a re-run (or a document
+    changed meanwhile) is skipped instead of overwritten. `progress(scanned,
+    rewritten)` is called after each batch. Returns {'scanned', 'rewritten',
+    'seconds', 'docs_per_second'}.
+    """
+    match = match or {}
+    totals = {'scanned': 0, 'rewritten': 0}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def report(scanned, rewritten):
+        with lock:
+            totals['scanned'] += scanned
+            totals['rewritten'] += rewritten
+            if progress and scanned:
+                progress(totals['scanned'], totals['rewritten'])
+
+    def flush(ops, handled):
+        if not ops:
+            return handled
+        return handled + collection.bulk_write(ops, ordered=False).modified_count
+
+    def work(id_range):
+        scanned = handled = 0
+        ops = []
+        for doc in collection.find({**match, **id_range}).batch_size(batch_size):
+            scanned += 1
+            op = convert(doc)
+            if op is True:
+                handled += 1
+            elif op is not None:
+                ops.append(op)
+            if scanned >= batch_size:
+                report(scanned, flush(ops, handled))
+                scanned = handled = 0
+                ops = []
+        report(scanned, flush(ops, handled))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='migration') as pool:
+        for _ in pool.map(work, id_ranges(collection, workers * 4)):
+            pass
+    seconds = time.perf_counter() - started
+    return {**totals, 'seconds': round(seconds, 2),
+            'docs_per_second': round(totals['scanned'] / seconds) if seconds else 0}
+
+
+def compact_transactions(router, workers=4, batch_size=1000, progress=None):
+    """Rewrite legacy transactions in every partition into the router codec's compact schema"""
+    codec = router.codec
+    results = {}
+    for collection in router.collections():
+        results[collection.name] = rewrite(
+            collection,
+            lambda doc: ReplaceOne({'_id': doc['_id'], 'type': doc['type']}, codec.encode(doc)),
+            match={'type': {'$type': 'string'}},
+            workers=workers, batch_size=batch_size, progress=progress
+        )
+    return results
+
+
+# Fields the generator and JSON imports can leave as strings, per collection
+TYPED_FIELDS = {
+    'users': {'dates': ('created_at', 'updated_at', 'last_login'), 'numbers': ('balance',)},
+    'transactions': {'dates': ('date',), 'numbers': ('amount', 'balance_after')},
+    'login_logs': {'dates': ('timestamp',), 'numbers': ()},
+    'admin_logs': {'dates': ('timestamp',), 'numbers': ()},
+}
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?)?$')
+NUMBER_PATTERN = re.compile(r'^-?\d+(\.\d+)?$')
+
+
+def parse_date(value):
+    """A datetime for str(datetime) / ISO strings, else None"""
+    if isinstance(value, str) and DATE_PATTERN.match(value.strip()):
+        try:
+            return datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def normalized_fields(doc, name):
+    """{field: native value} for the string dates and numbers in a document of collection `name`"""
+    fields = TYPED_FIELDS.get(name, {})
+    changes = {}
+    for field in fields.get('dates', ()):
+        parsed = parse_date(doc.get(field))
+        if parsed is not None:
+            changes[field] = parsed
+    for field in fields.get('numbers', ()):
+        value = doc.get(field)
+        if isinstance(value, str) and NUMBER_PATTERN.match(value.strip()):
+            number = float(value)
+            # Compact transactions keep amounts in cents
+            changes[field] = round(number * 100) if isinstance(doc.get('type'), int) else number
+    return changes
+
+
+def normalize(doc, name):
+    """The document with string dates and numbers converted in place (for imports)"""
+    doc.update(normalized_fields(doc, name))
+    return doc
+
+
+def _string_fields_filter(name):
+    fields = TYPED_FIELDS[name]
+    return {'$or': [{field: {'$type': 'string'}} for field in fields['dates'] + fields['numbers']]}
+
+
+def normalize_types(db, router, names=None, workers=4, batch_size=1000, progress=None):
+    """Rewrite string dates and numbers as native BSON types; returns results per collection
+
+    Only documents with a string in one of the typed fields are read, and
+    each update is conditional on the old string values. Partitioned
+    transactions whose date was a string sit in the wrong monthly
+    collection, so they are re-inserted through the router, which places
+    them by date, and removed from where they were.
+    """
+    results = {}
+    for name in names or TYPED_FIELDS:
+        if name == 'transactions':
+            collections = router.collections()
+        elif name == 'login_logs' and is_timeseries(db, name):
+            continue  # the time field of a time-series collection can only ever hold dates
+        else:
+            collections = [db[name]]
+        for collection in collections:
+            results[collection.name] = rewrite(
+                collection, _normalizer(name, collection, router),
+                match=_string_fields_filter(name), workers=workers, batch_size=batch_size, progress=progress
+            )
+    return results
+
+
+def _normalizer(name, collection, router):
+    def convert(doc):
+        changes = normalized_fields(doc, name)
+        if not changes:
+            return None
+        if name == 'transactions' and router.partitioned and 'date' in changes \
+                and router.partition_name(changes['date']) != collection.name:
+            try:
+                router.insert_one({**doc, **changes})
+            except DuplicateKeyError:
+                pass  # copied by an earlier, interrupted run
+            collection.delete_one({'_id': doc['_id']})
+            return True
+        return UpdateOne({'_id': doc['_id'], **{field: doc[field] for field in changes}}, {'$set': changes})
+    return convert
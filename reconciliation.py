@@ -0,0 +1,206 @@
+# reconciliation.py - check users.balance against the transaction ledger
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+# Admin withdrawals are stored with a positive amount; everything else is signed.
+# SIGNED_AMOUNT is the rule for pipelines, signed_amount() the same rule for fetched documents.
+SIGNED_AMOUNT = {
+    '$cond': [
+        {'$eq': ['$type', 'withdraw']},
+        {'$multiply': [-1, {'$abs': '$amount'}]},
+        '$amount'
+    ]
+}
+
+
+def signed_amount(tx):
+    amount = tx.get('amount') or 0
+    return -abs(amount) if tx.get('type') == 'withdraw' else amount
+
+
+class BalanceReconciler:
+    """Compare each user's stored balance with their transaction ledger
+
+    Users are streamed in _id order and cut into partitions that parallel
+    workers reconcile independently: one users query and one ledger
+    aggregation per partition. The opening balance is derived from the first
+    transaction (balance_after - amount), so a user's ledger balance is the
+    opening balance plus the signed sum of their transactions. Two issues are
+    reported:
+
+    - balance_mismatch: users.balance differs from the last balance_after
+    - ledger_gap: the balance_after chain disagrees with the summed amounts
+
+    Discrepancies and a per-run summary go to reconciliation_reports.
+    Incremental runs only check users with transactions dated, or profiles
+    updated, since the last completed run.
+    """
+
+    def __init__(self, db, transactions=None, workers=4, chunk_size=1000, tolerance=0.01):
+        self.db = db
+        self.transactions = transactions or db.transactions
+        self.reports = db.reconciliation_reports
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.tolerance = tolerance
+
+    @staticmethod
+    def ensure_indexes(db, transactions=None):
+        (transactions or db.transactions).create_index([('user_id', ASCENDING), ('date', ASCENDING), ('_id', ASCENDING)])
+        db.reconciliation_reports.create_index([('kind', ASCENDING), ('started_at', DESCENDING)])
+        db.reconciliation_reports.create_index([('run_id', ASCENDING), ('drift', DESCENDING)])
+
+    def last_run(self):
+        return self.reports.find_one({'kind': 'run', 'status': 'completed'}, sort=[('started_at', DESCENDING)])
+
+    def run(self, incremental=False, progress=None):
+        """Reconcile all (or recently active) users; returns the run summary document"""
+        started = datetime.now()
+        since = None
+        if incremental:
+            previous = self.last_run()
+            since = previous['started_at'] if previous else None
+
+        summary = {
+            '_id': uuid.uuid4().hex,
+            'kind': 'run',
+            'mode': 'incremental' if since else 'full',
+            'since': since,
+            'started_at': started,
+            'status': 'running',
+            'users_checked': 0,
+            'users_without_transactions': 0,
+            'discrepancies': 0,
+            'total_drift': 0.0
+        }
+        self.reports.insert_one(summary)
+        clock = time.perf_counter()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='reconcile') as executor:
+                pending = set()
+                for chunk in self._partitions(since):
+                    if len(pending) >= self.workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self._collect(done, summary, progress)
+                    pending.add(executor.submit(self._reconcile_partition, summary['_id'], chunk))
+                self._collect(pending, summary, progress)
+        except Exception as e:
+            summary['status'] = 'failed'
+            summary['error'] = str(e)
+            raise
+        else:
+            summary['status'] = 'completed'
+        finally:
+            summary['finished_at'] = datetime.now()
+            summary['elapsed_s'] = round(time.perf_counter() - clock, 3)
+            summary['total_drift'] = round(summary['total_drift'], 2)
+            self.reports.replace_one({'_id': summary['_id']}, summary)
+        return summary
+
+    def discrepancies(self, run_id, limit=50):
+        """Largest discrepancies of a run first"""
+        cursor = self.reports.find({'run_id': run_id}).sort('drift', DESCENDING)
+        return list(cursor.limit(limit)) if limit else list(cursor)
+
+    def _collect(self, futures, summary, progress):
+        for future in futures:
+            checked, without, found, drift = future.result()
+            summary['users_checked'] += checked
+            summary['users_without_transactions'] += without
+            summary['discrepancies'] += found
+            summary['total_drift'] += drift
+            if progress:
+                progress(summary)
+
+    def _partitions(self, since):
+        """Yield lists of user ids, chunk_size at a time"""
+        if since is None:
+            ids = (doc['_id'] for doc in self.db.users.find({}, {'_id': 1}).sort('_id', ASCENDING))
+        else:
+            ids = self._active_user_ids(since)
+        chunk = []
+        for user_id in ids:
+            chunk.append(user_id)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _active_user_ids(self, since):
+        seen = set()
+        sources = (
+            self.transactions.aggregate([
+                {'$match': {'date': {'$gte': since}}},
+                {'$group': {'_id': '$user_id'}}
+            ], allowDiskUse=True),
+            self.db.users.find({'updated_at': {'$gte': since}}, {'_id': 1})
+        )
+        for source in sources:
+            for doc in source:
+                if doc['_id'] not in seen:
+                    seen.add(doc['_id'])
+                    yield doc['_id']
+
+    def _reconcile_partition(self, run_id, user_ids):
+        users = {u['_id']: u for u in self.db.users.find({'_id': {'$in': user_ids}}, {'email': 1, 'balance': 1})}
+        ledgers = self.transactions.aggregate([
+            {'$match': {'user_id': {'$in': user_ids}}},
+            {'$sort': {'user_id': 1, 'date': 1, '_id': 1}},
+            {'$group': {
+                '_id': '$user_id',
+                'transactions': {'$sum': 1},
+                'ledger_sum': {'$sum': SIGNED_AMOUNT},
+                'first_amount': {'$first': SIGNED_AMOUNT},
+                'first_balance_after': {'$first': '$balance_after'},
+                'last_balance_after': {'$last': '$balance_after'},
+                'last_date': {'$last': '$date'}
+            }}
+        ], allowDiskUse=True)
+
+        found = []
+        with_ledger = 0
+        checked_at = datetime.now()
+        for ledger in ledgers:
+            user = users.get(ledger['_id'])
+            if not user:
+                continue
+            with_ledger += 1
+            issue = self._check(user, ledger)
+            if issue:
+                issue.update({'run_id': run_id, 'kind': 'discrepancy', 'checked_at': checked_at})
+                found.append(issue)
+        if found:
+            self.reports.insert_many(found, ordered=False)
+        drift = sum(issue['drift'] for issue in found)
+        return len(users), len(users) - with_ledger, len(found), drift
+
+    def _check(self, user, ledger):
+        stored = user.get('balance') or 0
+        last_after = ledger['last_balance_after'] or 0
+        opening = (ledger['first_balance_after'] or 0) - (ledger['first_amount'] or 0)
+        ledger_balance = opening + ledger['ledger_sum']
+        issues = []
+        if abs(stored - last_after) > self.tolerance:
+            issues.append('balance_mismatch')
+        if abs(last_after - ledger_balance) > self.tolerance:
+            issues.append('ledger_gap')
+        if not issues:
+            return None
+        return {
+            'user_id': user['_id'],
+            'email': user.get('email'),
+            'issues': issues,
+            'stored_balance': round(stored, 2),
+            'ledger_balance': round(last_after, 2),
+            'summed_balance': round(ledger_balance, 2),
+            'difference': round(stored - last_after, 2),
+            'drift': round(max(abs(stored - last_after), abs(last_after - ledger_balance)), 2),
+            'transactions': ledger['transactions'],
+            'last_transaction': ledger['last_date']
+        }
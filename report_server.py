@@ -0,0 +1,298 @@
+# report_server.py - read-only JSON reporting API for the casino admin data
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from bson import ObjectId
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ResultCache:
+    """TTL cache keyed by (endpoint, parameters) with single-flight loading
+
+    Concurrent requests for a key that is being computed wait on the same
+    future, so N simultaneous viewers of a report cost one aggregation.
+    """
+
+    def __init__(self, ttl=30, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key, loader):
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+
+        pending = self.inflight.get(key)
+        if pending:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await loader()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            self._store(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self.inflight[key]
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        if len(self.entries) >= self.max_entries:
+            self.entries = {k: v for k, v in self.entries.items() if v[0] > now}
+            while len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (now + self.ttl, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'ttl_s': self.ttl,
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_ratio': round((self.hits + self.coalesced) / lookups, 3) if lookups else None
+        }
+
+
+def _json_default(value):
+    if hasattr(value, '_asdict'):
+        return value._asdict()
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+class ReportServer:
+    """Serve reports, user lookup and transaction history as JSON over HTTP
+
+    Queries run on a bounded thread pool sharing the app's MongoClient
+    connection pool; results are cached per endpoint and parameters.
+    """
+    MAX_LIMIT = 1000
+    STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+                   405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+    def __init__(self, app, host='127.0.0.1', port=8080, ttl=30, workers=8, token=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.token = token
+        self.cache = ResultCache(ttl)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-query')
+        self.latency = {}
+        self.requests = 0
+        self.started_at = None
+        self.routes = {
+            '/health': self._health,
+            '/stats': self._stats,
+            '/reports/deposits': self._deposits,
+            '/reports/activity': self._activity,
+            '/reports/recent': self._recent,
+            '/reports/games': self._games,
+            '/reports/cohorts': self._cohorts,
+            '/reports/geo': self._geo,
+            '/users': self._user_lookup,
+        }
+
+    def run(self):
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.started_at = time.monotonic()
+        print(f"✓ Report API listening on http://{self.host}:{self.port} (cache TTL {self.cache.ttl}s)")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        started = time.perf_counter()
+        route = None
+        try:
+            try:
+                method, target, headers = await self._read_request(reader)
+                if method != 'GET':
+                    raise HTTPError(405, "Only GET is supported")
+                if self.token and headers.get('authorization') != f"Bearer {self.token}":
+                    raise HTTPError(401, "Missing or invalid bearer token")
+                url = urlsplit(target)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                route, handler, args = self._route(url.path)
+                status, body = 200, await handler(params, *args)
+            except HTTPError as e:
+                status, body = e.status, {'error': e.message}
+            except Exception as e:
+                status, body = 500, {'error': str(e)}
+            payload = json.dumps(body, default=_json_default).encode('utf-8')
+            writer.write(
+                f"HTTP/1.1 {status} {self.STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode('ascii') + payload
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            self.requests += 1
+            if route:
+                samples = self.latency.setdefault(route, deque(maxlen=2000))
+                samples.append((time.perf_counter() - started) * 1000)
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return parts[0].upper(), parts[1], headers
+
+    def _route(self, path):
+        path = path.rstrip('/') or '/'
+        if path in self.routes:
+            return path, self.routes[path], ()
+        segments = path.strip('/').split('/')
+        if len(segments) == 3 and segments[0] == 'users' and segments[2] == 'transactions':
+            return '/users/{email}/transactions', self._user_transactions, (unquote(segments[1]),)
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    def _int_param(self, params, name, default, low=1, high=None):
+        try:
+            value = int(params.get(name, default))
+        except ValueError:
+            raise HTTPError(400, f"'{name}' must be an integer")
+        high = high or self.MAX_LIMIT
+        if not low <= value <= high:
+            raise HTTPError(400, f"'{name}' must be between {low} and {high}")
+        return value
+
+    async def _query(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _cached(self, endpoint, params, func, *args):
+        key = (endpoint, tuple(sorted(params.items())))
+        return await self.cache.get(key, lambda: self._query(func, *args))
+
+    async def _health(self, params):
+        return {'status': 'ok'}
+
+    async def _stats(self, params):
+        endpoints = {}
+        for route, samples in self.latency.items():
+            ordered = sorted(samples)
+            endpoints[route] = {'requests': len(ordered)}
+            for p in (50, 95, 99):
+                endpoints[route][f'p{p}_ms'] = round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 2)
+        return {
+            'uptime_s': round(time.monotonic() - self.started_at, 1),
+            'requests': self.requests,
+            'cache': self.cache.stats(),
+            'latency': endpoints
+        }
+
+    async def _deposits(self, params):
+        days = self._int_param(params, 'days', 7, high=3650)
+        if params.get('approximate') in ('1', 'true'):
+            return await self._cached('deposits-approx', {'days': days}, self.app.estimate_deposit_withdraw_summary, days)
+        return await self._cached('deposits', {'days': days}, self.app.get_deposit_withdraw_summary, days)
+
+    async def _activity(self, params):
+        days = self._int_param(params, 'days', 7, high=3650)
+        limit = self._int_param(params, 'limit', 100)
+        if params.get('approximate') in ('1', 'true'):
+            return await self._cached('activity-approx', {'days': days}, self.app.estimate_user_activity, days)
+        return await self._cached('activity', {'days': days, 'limit': limit}, self._activity_rows, days, limit)
+
+    def _activity_rows(self, days, limit):
+        rows = []
+        for row in self.app.get_user_activity(days):
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+        return rows
+
+    async def _games(self, params):
+        days = self._int_param(params, 'days', 7, high=3650)
+        unit = params.get('unit', 'day')
+        if unit not in ('day', 'week'):
+            raise HTTPError(400, "'unit' must be day or week")
+        return await self._cached('games', {'days': days, 'unit': unit}, self.app.get_game_analytics, days, unit)
+
+    async def _cohorts(self, params):
+        months = self._int_param(params, 'months', 12, high=120)
+        return await self._cached('cohorts', {'months': months}, self.app.get_cohort_report, months)
+
+    async def _geo(self, params):
+        days = self._int_param(params, 'days', 30, high=3650)
+        country = params.get('country', '').strip().upper() or None
+        return await self._cached('geo', {'days': days, 'country': country}, self.app.get_geo_report, days, country)
+
+    async def _recent(self, params):
+        limit = self._int_param(params, 'limit', 50)
+        return await self._cached('recent', {'limit': limit}, self.app.get_recent_transactions, limit)
+
+    async def _user_lookup(self, params):
+        email = params.get('email')
+        if not email:
+            raise HTTPError(400, "'email' is required")
+        user = await self._cached('user', {'email': email}, self._find_user, email)
+        if not user:
+            raise HTTPError(404, f"User not found: {email}")
+        return user
+
+    def _find_user(self, email):
+        return self.app.users.find_one(
+            {'email': email},
+            {'email': 1, 'role': 1, 'balance': 1, 'active': 1, 'created_at': 1, 'updated_at': 1}
+        )
+
+    async def _user_transactions(self, params, email):
+        limit = self._int_param(params, 'limit', 50)
+        user = await self._cached('user', {'email': email}, self._find_user, email)
+        if not user:
+            raise HTTPError(404, f"User not found: {email}")
+        return await self._cached('transactions', {'email': email, 'limit': limit},
+                                  self._transaction_rows, user['_id'], limit)
+
+    def _transaction_rows(self, user_id, limit):
+        return list(self.app.get_user_transactions(user_id, limit))
@@ -0,0 +1,148 @@
+# statements.py - per-user transaction statements streamed in keyset order
+import csv
+import itertools
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+from reconciliation import signed_amount
+
+PROJECTION = {'date': 1, 'type': 1, 'amount': 1, 'balance_after': 1, 'description': 1}
+COLUMNS = ('date', 'type', 'description', 'amount', 'running_balance', 'balance_after')
+FORMATS = ('csv', 'jsonl')
+
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, float):
+        return round(value, 2)
+    return value
+
+
+class StatementExporter:
+    """One player's transactions for a date range with running balance and totals
+
+    Transactions are read in (date, _id) order through the (user_id, date,
+    _id) index the reconciler creates, one page of `page_size` at a time. Each page restarts after
+    the last (date, _id) seen rather than skipping, so page N costs the same
+    as page 1 and no cursor stays open while rows are written out. The
+    opening balance is the balance_after of the user's last transaction
+    before the range. Without one, it is taken from the first transaction
+    in the range (balance_after - amount), which is the reconciler's
+    convention. Within a date tie, _id order is only total for _ids of one
+    BSON type.
+    """
+
+    def __init__(self, transactions, page_size=1000):
+        self.transactions = transactions
+        self.page_size = page_size
+
+    def _pages(self, user_id, since, until):
+        bounds = {}
+        if since:
+            bounds['$gte'] = since
+        if until:
+            bounds['$lt'] = until
+        last = None
+        while True:
+            query = {'user_id': user_id}
+            if last:
+                query['date'] = {**bounds, '$gte': last['date']}
+                query['$or'] = [{'date': {'$gt': last['date']}}, {'date': last['date'], '_id': {'$gt': last['_id']}}]
+            elif bounds:
+                query['date'] = dict(bounds)
+            page = list(self.transactions.find(query, PROJECTION, sort=[('date', ASCENDING), ('_id', ASCENDING)],
+                                               limit=self.page_size))
+            if page:
+                yield page
+            if len(page) < self.page_size:
+                return
+            last = page[-1]
+
+    def opening_balance(self, user_id, since):
+        if not since:
+            return None
+        before = list(self.transactions.find(
+            {'user_id': user_id, 'date': {'$lt': since}}, {'date': 1, 'balance_after': 1},
+            sort=[('date', DESCENDING), ('_id', DESCENDING)], limit=1))
+        return before[0].get('balance_after') if before else None
+
+    def rows(self, user_id, since=None, until=None, summary=None):
+        """Statement rows oldest first; `summary` (a dict) is filled with the totals once the rows are consumed"""
+        summary = summary if summary is not None else {}
+        opening = self.opening_balance(user_id, since)
+        summary['opening_balance'] = round(opening or 0, 2)
+        balance = opening
+        credits = debits = 0
+        count = 0
+        for page in self._pages(user_id, since, until):
+            for tx in page:
+                amount = signed_amount(tx)
+                if balance is None:
+                    balance = opening = (tx.get('balance_after') or 0) - amount
+                    summary['opening_balance'] = round(opening, 2)
+                balance += amount
+                if amount >= 0:
+                    credits += amount
+                else:
+                    debits += amount
+                count += 1
+                yield {'date': tx.get('date'), 'type': tx.get('type'), 'description': tx.get('description'),
+                       'amount': amount, 'running_balance': round(balance, 2),
+                       'balance_after': tx.get('balance_after')}
+        summary.update(opening_balance=round(opening or 0, 2), closing_balance=round(balance or 0, 2),
+                       credits=round(credits, 2), debits=round(debits, 2), transactions=count)
+
+    def write(self, stream, user, since=None, until=None, fmt='csv'):
+        """Stream one user's statement to a text stream; returns the summary
+
+        CSV gets OPENING and CLOSING rows around the transactions, JSONL a
+        header object, one object per transaction and a totals object.
+        """
+        summary = {'user_id': str(user['_id']), 'email': user.get('email'),
+                   'since': _text(since), 'until': _text(until)}
+        totals = {}
+        rows = self.rows(user['_id'], since, until, totals)
+        if fmt == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(COLUMNS)
+            # The opening balance can come from the first transaction, so it is known once that row is read
+            first = next(rows, None)
+            writer.writerow([_text(since), 'OPENING', summary['email'], '', totals['opening_balance'], ''])
+            for row in itertools.chain([first] if first is not None else [], rows):
+                writer.writerow([_text(row[column]) for column in COLUMNS])
+            writer.writerow([_text(until), 'CLOSING', f"{totals['transactions']} transactions",
+                             round(totals['credits'] + totals['debits'], 2), totals['closing_balance'], ''])
+        else:
+            stream.write(json.dumps({'statement': summary}) + '\n')
+            for row in rows:
+                stream.write(json.dumps({column: _text(row[column]) for column in COLUMNS}) + '\n')
+            stream.write(json.dumps({'totals': totals}) + '\n')
+        stream.flush()
+        return {**summary, **totals}
+
+    def export_many(self, users, directory, since=None, until=None, fmt='csv', workers=4, progress=None):
+        """One statement file per user in `directory`, `workers` users at a time; returns the summaries"""
+        os.makedirs(directory, exist_ok=True)
+        lock = threading.Lock()
+        suffix = f"{since:%Y%m%d}-{until:%Y%m%d}" if since and until else datetime.now().strftime("%Y%m%d")
+
+        def export(user):
+            name = re.sub(r'[^A-Za-z0-9._@-]', '_', user.get('email') or str(user['_id']))
+            path = os.path.join(directory, f"statement_{name}_{suffix}.{fmt}")
+            with open(path, 'w', newline='' if fmt == 'csv' else None, encoding='utf-8') as f:
+                summary = self.write(f, user, since, until, fmt)
+            summary['file'] = path
+            if progress:
+                with lock:
+                    progress(summary)
+            return summary
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='statement') as pool:
+            return list(pool.map(export, users))
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def _list_collections(self, filter=None, **kwargs):
+    # mongomock has no list_collections; plain collections are all it can hold
+    for name in self.list_collection_names():
+        if not filter or filter.get('name') == name:
+            yield {'name': name, 'type': 'collection', 'options': {}}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(mongomock.database.Database, 'list_collections', _list_collections, raising=False)
+    return mongomock.MongoClient().casino_test
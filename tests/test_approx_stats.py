@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from approx_stats import OVERALL, sampled_totals
+
+NOW = datetime(2026, 3, 1)
+
+
+def _fill(collection, total, recent):
+    collection.insert_many([
+        {'date': NOW - timedelta(days=1 if i < recent else 30), 'type': 'deposit' if i % 2 else 'withdraw',
+         'amount': 10}
+        for i in range(total)
+    ])
+
+
+def test_matches_that_fit_the_budget_are_counted_exactly(db):
+    _fill(db.transactions, 2000, 30)
+    estimates = sampled_totals([db.transactions], {'date': {'$gte': NOW - timedelta(days=7)}},
+                               '$type', '$amount', sample_size=50)
+    assert estimates[OVERALL]['count'] == 30
+    assert estimates[OVERALL]['count_error'] == 0
+    assert estimates['deposit']['total'] == 150
+
+
+def test_budget_over_the_sample_fraction_reads_the_stratum_exactly(db):
+    _fill(db.transactions, 2000, 1000)
+    estimates = sampled_totals([db.transactions], {'date': {'$gte': NOW - timedelta(days=7)}},
+                               '$type', '$amount', sample_size=100)
+    assert estimates[OVERALL]['count'] == 1000
+    assert estimates[OVERALL]['count_error'] == 0
+
+
+def test_large_strata_are_sampled(db):
+    _fill(db.transactions, 2000, 1000)
+    estimates = sampled_totals([db.transactions], {'date': {'$gte': NOW - timedelta(days=7)}},
+                               '$type', '$amount', sample_size=40)
+    assert estimates[OVERALL]['sampled'] <= 40
+    assert estimates[OVERALL]['count_error'] > 0
+
+
+def test_each_stratum_uses_its_own_filter(db):
+    _fill(db.logs, 20, 20)
+    _fill(db.logs_archive, 20, 0)
+    estimates = sampled_totals([(db.logs, {'date': {'$gte': NOW - timedelta(days=7)}}),
+                                (db.logs_archive, {'date': {'$lt': NOW - timedelta(days=7)}})],
+                               None, '$type', 1, sample_size=100)
+    assert estimates[OVERALL]['count'] == 40
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from log_retention import LogRetention
+
+NOW = datetime(2026, 6, 30, 12)
+
+
+def _logs(db, days):
+    for i in range(days):
+        db.login_logs.insert_one({'_id': f'l{i}', 'user_id': 'u1', 'success': True,
+                                  'timestamp': NOW - timedelta(days=i, hours=1)})
+
+
+@pytest.fixture(params=['files', 'collection'])
+def retention(request, db, tmp_path):
+    return LogRetention(db, {'login_logs': 30}, mode=request.param, archive_dir=str(tmp_path),
+                        ttl_grace_days=5, batch_size=7)
+
+
+def test_archive_then_expire_up_to_the_mark(db, retention):
+    _logs(db, 60)
+    archived = retention.archive(now=NOW)
+    mark = retention.archived_until('login_logs')
+    assert mark == datetime(2026, 5, 31)
+    assert archived['login_logs'] == sum(1 for i in range(60) if NOW - timedelta(days=i, hours=1) < mark)
+    # Deleted only past window + grace, and everything deleted is in the archive
+    assert db.login_logs.count_documents({'timestamp': {'$lt': mark - timedelta(days=5)}}) == 0
+    assert db.login_logs.count_documents({}) == sum(
+        1 for i in range(60) if NOW - timedelta(days=i, hours=1) >= mark - timedelta(days=5))
+    archived_ids = {doc['_id'] for doc in retention.iter_archive('login_logs', datetime(2000, 1, 1), mark)}
+    assert archived_ids == {f'l{i}' for i in range(60) if NOW - timedelta(days=i, hours=1) < mark}
+
+
+def test_nothing_expires_without_an_archive_run(db, retention):
+    _logs(db, 60)
+    retention.ensure_indexes()
+    assert not any('expireAfterSeconds' in index for index in db.login_logs.list_indexes())
+    assert db.login_logs.count_documents({}) == 60
+
+
+def test_backdated_insert_below_the_mark_is_archived(db, retention):
+    _logs(db, 40)
+    retention.archive(now=NOW)
+    mark = retention.archived_until('login_logs')
+    late = {'_id': 'late', 'user_id': 'u2', 'success': False, 'timestamp': mark - timedelta(days=2)}
+    db.login_logs.insert_one(dict(late))
+    assert retention.archive(now=NOW)['login_logs'] == 1
+    assert retention.archive(now=NOW)['login_logs'] == 0
+    found = list(retention.iter_archive('login_logs', mark - timedelta(days=3), mark, {'user_id': 'u2'}))
+    assert [doc['_id'] for doc in found] == ['late']
+
+
+def test_reverse_iteration_is_newest_first(db, retention):
+    _logs(db, 50)
+    retention.archive(now=NOW)
+    mark = retention.archived_until('login_logs')
+    stamps = [doc['timestamp'] for doc in retention.iter_archive('login_logs', datetime(2000, 1, 1), mark,
+                                                                 reverse=True)]
+    assert stamps == sorted(stamps, reverse=True) and stamps
+
+
+def test_lease_keeps_a_second_archiver_out(db, retention, tmp_path):
+    _logs(db, 40)
+    other = LogRetention(db, {'login_logs': 30}, mode=retention.mode, archive_dir=str(tmp_path))
+    assert other._acquire(datetime.now())
+    assert retention.archive(now=NOW) == {}
+    assert retention.archived_until('login_logs') is None
+    db.retention_state.update_one({'_id': 'lease'}, {'$unset': {'lease_until': 1}})
+    assert retention.archive(now=NOW)['login_logs'] > 0
@@ -0,0 +1,66 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from login_limiter import LoginLimiter, LoginLogWriter
+
+
+def test_parallel_attempts_cannot_exceed_the_bucket(tmp_path):
+    limiters = [LoginLimiter(str(tmp_path / 'limiter.db'), window=300, email_failures=5) for _ in range(4)]
+    allowed = []
+    barrier = threading.Barrier(20)
+
+    def attempt(limiter):
+        barrier.wait()
+        if limiter.check('Player@Example.com') == 0:
+            allowed.append(1)
+
+    threads = [threading.Thread(target=attempt, args=(limiters[i % 4],)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(allowed) == 5
+    assert limiters[0].check('player@example.com') > 0
+
+
+def test_success_refills_only_that_email(tmp_path):
+    limiter = LoginLimiter(str(tmp_path / 'limiter.db'), window=300, email_failures=2)
+    for email in ('a@example.com', 'b@example.com'):
+        assert limiter.check(email) == 0
+        assert limiter.check(email) == 0
+        assert limiter.check(email) > 0
+    limiter.succeeded('a@example.com')
+    assert limiter.check('a@example.com') == 0
+    assert limiter.check('b@example.com') > 0
+
+
+def test_tokens_refill_over_the_window(tmp_path, monkeypatch):
+    limiter = LoginLimiter(str(tmp_path / 'limiter.db'), window=10, email_failures=1)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    assert limiter.check('a@example.com') == 0
+    assert limiter.check('a@example.com') == 10
+    monkeypatch.setattr(time, 'time', lambda: now + 10)
+    assert limiter.check('a@example.com') == 0
+
+
+def test_writer_keeps_attempt_time_and_flushes_on_a_timer(db):
+    writer = LoginLogWriter(db.login_logs, batch_size=100, flush_interval=0.05)
+    attempted = datetime.now() - timedelta(seconds=30)
+    writer.add({'user_id': 1, 'success': False, 'timestamp': attempted})
+    deadline = time.monotonic() + 5
+    while not db.login_logs.count_documents({}) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.stop()
+    log = db.login_logs.find_one()
+    assert log['timestamp'] == attempted.replace(microsecond=attempted.microsecond // 1000 * 1000)
+    assert 'attempted_at' not in log
+
+
+def test_writer_flushes_a_full_batch_at_once(db):
+    writer = LoginLogWriter(db.login_logs, batch_size=3, flush_interval=60)
+    for i in range(3):
+        writer.add({'user_id': i, 'success': False, 'timestamp': datetime.now()})
+    assert db.login_logs.count_documents({}) == 3
+    writer.stop()
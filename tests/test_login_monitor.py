@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from login_monitor import LoginMonitor
+
+NOW = datetime(2026, 3, 1, 12)
+
+
+def _monitor(db, **kwargs):
+    db.monitor_state.insert_one({'_id': 'login_monitor', 'high_water': NOW - timedelta(minutes=10)})
+    return LoginMonitor(db, window=300, user_threshold=5, ip_threshold=1000, batch_size=10, lag=5, **kwargs)
+
+
+def test_more_logs_on_one_timestamp_than_a_page(db):
+    monitor = _monitor(db)
+    stamp = NOW - timedelta(minutes=1)
+    db.login_logs.insert_many([{'_id': ObjectId(), 'user_id': f'u{i}', 'success': True, 'timestamp': stamp}
+                               for i in range(35)])
+    monitor.poll(now=NOW)
+    assert monitor.processed == 35
+    db.login_logs.insert_many([{'_id': ObjectId(), 'user_id': 'u', 'success': True, 'timestamp': stamp}
+                               for _ in range(3)])
+    monitor.poll(now=NOW)
+    assert monitor.processed == 38
+
+
+def test_mark_survives_a_restart(db):
+    monitor = _monitor(db)
+    db.login_logs.insert_many([{'_id': ObjectId(), 'user_id': 'u', 'success': True,
+                                'timestamp': NOW - timedelta(seconds=60 - i)} for i in range(12)])
+    monitor.poll(now=NOW)
+    restarted = LoginMonitor(db, batch_size=10, lag=5)
+    restarted.poll(now=NOW)
+    assert (monitor.processed, restarted.processed) == (12, 0)
+
+
+def test_lag_leaves_recent_logs_for_the_next_poll(db):
+    monitor = _monitor(db)
+    db.login_logs.insert_one({'_id': ObjectId(), 'user_id': 'u', 'success': True,
+                              'timestamp': NOW - timedelta(seconds=2)})
+    monitor.poll(now=NOW)
+    assert monitor.processed == 0
+    monitor.poll(now=NOW + timedelta(seconds=10))
+    assert monitor.processed == 1
+
+
+def test_failures_raise_one_alert_per_window(db):
+    monitor = _monitor(db)
+    db.login_logs.insert_many([{'_id': ObjectId(), 'user_id': 'victim', 'success': False, 'ip': '1.2.3.4',
+                                'timestamp': NOW - timedelta(seconds=120 - i)} for i in range(8)])
+    alerts = monitor.poll(now=NOW)
+    assert [(a['type'], a['user_id'], a['count']) for a in alerts] == [('user_failures', 'victim', 5)]
+    assert db.security_alerts.count_documents({}) == 1
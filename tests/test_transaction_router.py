@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from transaction_router import TransactionRouter
+
+
+def test_merge_sorts_mixed_types_in_bson_order(db):
+    router = TransactionRouter(db, partitioned=True)
+    oid = ObjectId()
+    router.insert_many([
+        {'user_id': oid, 'date': datetime(2026, 1, 5), 'amount': 1},
+        {'user_id': 'legacy-7', 'date': datetime(2026, 2, 5), 'amount': 2},
+        {'user_id': 42, 'date': datetime(2026, 1, 6), 'amount': 3},
+        {'date': datetime(2026, 2, 6), 'amount': 4},
+    ])
+    docs = list(router.find({}, sort=[('user_id', ASCENDING)]))
+    assert [doc.get('user_id') for doc in docs] == [None, 42, 'legacy-7', oid]
+    docs = list(router.find({}, sort=[('user_id', DESCENDING)], limit=2))
+    assert [doc.get('user_id') for doc in docs] == [oid, 'legacy-7']
+
+
+def test_registered_indexes_reach_existing_and_migrated_partitions(db):
+    db.transactions_2026_01.insert_one({'user_id': 1, 'date': datetime(2026, 1, 5)})
+    db.transactions.insert_one({'user_id': 2, 'date': datetime(2026, 3, 5)})
+    router = TransactionRouter(db, partitioned=True)
+    router.create_index([('user_id', ASCENDING)])
+    router.migrate()
+    for name in ('transactions_2026_01', 'transactions_2026_03'):
+        assert 'user_id_1' in db[name].index_information()
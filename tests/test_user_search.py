@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from user_search import EmailSearch, RANK_EXACT, RANK_PREFIX
+
+T0 = datetime(2026, 1, 1)
+
+
+def _user(db, _id, email, updated_at, role='user'):
+    db.users.replace_one({'_id': _id}, {'_id': _id, 'email': email, 'role': role, 'updated_at': updated_at},
+                         upsert=True)
+
+
+def test_string_and_date_updated_at_mix(db):
+    _user(db, 'imported', 'imported@x.com', '2025-03-01 10:00:00')
+    _user(db, 1, 'console@x.com', T0)
+    search = EmailSearch(db.users)
+    assert {m[2] for m in search.search('imported')} == {'imported'}
+    assert search.high_water == T0
+    _user(db, 2, 'later@x.com', T0 + timedelta(hours=1))
+    _user(db, 'imported2', 'imported2@x.com', '2026-02-01 10:00:00')
+    assert [m[2] for m in search.search('later@x.com')] == [2]
+
+
+def test_case_variants_keep_both_users(db):
+    _user(db, 1, 'Alice@x.com', T0)
+    _user(db, 2, 'alice@x.com', T0)
+    search = EmailSearch(db.users)
+    matches = search.search('alice@x.com')
+    assert sorted(m[2] for m in matches) == [1, 2]
+    assert {m[0] for m in matches} == {RANK_EXACT}
+
+
+def test_incremental_refresh_picks_up_new_and_changed_emails(db):
+    _user(db, 1, 'bob@x.com', T0)
+    search = EmailSearch(db.users)
+    assert [m[2] for m in search.search('bob')] == [1]
+    _user(db, 1, 'robert@x.com', T0 + timedelta(minutes=1))
+    _user(db, 2, 'bobby@x.com', T0 + timedelta(minutes=1))
+    assert [(m[0], m[2]) for m in search.search('bob')] == [(RANK_PREFIX, 2)]
+    assert [m[2] for m in search.search('robert')] == [1]
@@ -0,0 +1,241 @@
+# transaction_router.py - route transaction reads and writes to monthly collections
+import re
+import time
+from datetime import datetime
+
+from bson import Decimal128, ObjectId
+from pymongo.errors import BulkWriteError
+
+PARTITION_PATTERN = re.compile(r'^transactions_(\d{4})_(\d{2})$')
+
+# MongoDB's cross-type sort order, for the kinds of values transactions hold
+_BSON_ORDER = ((type(None), 1), (bool, 9), ((int, float), 2), (str, 3), (dict, 4), (list, 5),
+               (bytes, 6), (ObjectId, 7), (datetime, 10))
+
+
+def _month(value):
+    return (value.year, value.month)
+
+
+def _sort_value(value):
+    """(type rank, value) so values of mixed types compare in BSON order instead of raising"""
+    if isinstance(value, Decimal128):
+        return 2, float(value.to_decimal())
+    for types, rank in _BSON_ORDER:
+        if isinstance(value, types):
+            if rank == 1:
+                return rank, 0
+            return rank, str(value) if rank in (4, 5) else value
+    return 11, str(value)
+
+
+class TransactionRouter:
+    """Single entry point for the transactions ledger, plain or partitioned by month
+
+    Unpartitioned, every call goes straight to the `transactions` collection.
+    Partitioned, documents live in transactions_YYYY_MM collections chosen by
+    their `date`. Queries and leading $match stages with date bounds only touch
+    the months they overlap, and results are merged:
+    - date-sorted reads walk months in order and stop once the limit is met
+    - aggregations fan out with $unionWith so the server does the merging
+    Old months are ordinary collections, so they can be compacted, archived or
+    dropped on their own.
+
+    With a TransactionCodec, documents are written in the compact schema.
+    Callers still see the legacy shape: find() decodes documents, filters
+    on dictionary fields match both encodings, and aggregations get a
+    decode stage after their leading $match.
+    """
+    NAME_CACHE_SECONDS = 60
+
+    def __init__(self, db, partitioned=False, codec=None):
+        self.db = db
+        self.partitioned = partitioned
+        self.codec = codec
+        self.base = db.transactions
+        self.index_specs = []
+        self._names = None
+        self._names_loaded = 0
+
+    def partition_name(self, date):
+        date = date if isinstance(date, datetime) else datetime.now()
+        return f"transactions_{date.year:04d}_{date.month:02d}"
+
+    def names(self, since=None, until=None):
+        """Partition names overlapping [since, until], newest first"""
+        if not self.partitioned:
+            return [self.base.name]
+        if self._names is None or time.monotonic() - self._names_loaded > self.NAME_CACHE_SECONDS:
+            self._names = {name for name in self.db.list_collection_names() if PARTITION_PATTERN.match(name)}
+            self._names_loaded = time.monotonic()
+        selected = []
+        for name in self._names:
+            year, month = map(int, PARTITION_PATTERN.match(name).groups())
+            if since and (year, month) < _month(since):
+                continue
+            if until and (year, month) > _month(until):
+                continue
+            selected.append(name)
+        return sorted(selected, reverse=True)
+
+    def collections(self, since=None, until=None, newest_first=True):
+        names = self.names(since, until)
+        return [self.db[name] for name in (names if newest_first else reversed(names))]
+
+    def create_index(self, keys, **kwargs):
+        """Create an index on every partition, and on partitions created later"""
+        self.index_specs.append((keys, kwargs))
+        for collection in self.collections():
+            collection.create_index(keys, **kwargs)
+
+    def _partition(self, date):
+        name = self.partition_name(date)
+        if self.partitioned and name not in self.names():
+            for keys, kwargs in self.index_specs:
+                self.db[name].create_index(keys, **kwargs)
+            self._names.add(name)
+        return self.db[name] if self.partitioned else self.base
+
+    @staticmethod
+    def _date_range(query):
+        bounds = (query or {}).get('date')
+        if not isinstance(bounds, dict):
+            return (bounds, bounds) if isinstance(bounds, datetime) else (None, None)
+        return bounds.get('$gte', bounds.get('$gt')), bounds.get('$lt', bounds.get('$lte'))
+
+    def insert_one(self, doc):
+        if self.codec:
+            doc = self.codec.encode(doc)
+        return self._partition(doc.get('date')).insert_one(doc)
+
+    def insert_many(self, docs, ordered=True):
+        """Insert grouped by partition; returns the number inserted"""
+        groups = {}
+        for doc in docs:
+            if self.codec:
+                doc = self.codec.encode(doc)
+            groups.setdefault(self.partition_name(doc.get('date')), []).append(doc)
+        inserted = 0
+        for batch in groups.values():
+            self._partition(batch[0].get('date')).insert_many(batch, ordered=ordered)
+            inserted += len(batch)
+        return inserted
+
+    def count_documents(self, query):
+        collections = self.collections(*self._date_range(query))
+        if self.codec:
+            query = self.codec.translate(query)
+        return sum(c.count_documents(query) for c in collections)
+
+    def find(self, query=None, projection=None, sort=None, skip=0, limit=0, wrap=None, batch_size=None):
+        """Matching documents across the partitions the query's date range touches"""
+        query = query or {}
+        if not self.codec:
+            return self._find(query, projection, sort, skip, limit, wrap, batch_size)
+        # Decoding needs plain dicts rather than raw BSON, and the type field that marks compact documents
+        if projection and any(projection.values()):
+            projection = {**projection, 'type': 1}
+        docs = self._find(self.codec.translate(query), projection, sort, skip, limit, None, batch_size)
+        return (self.codec.decode(doc) for doc in docs)
+
+    def _find(self, query, projection, sort, skip, limit, wrap, batch_size):
+        wrap = wrap or (lambda collection: collection)
+        if not self.partitioned:
+            return self._cursor(wrap(self.base), query, projection, sort, skip, limit, batch_size)
+
+        newest_first = not (sort and sort[0] == ('date', 1))
+        collections = self.collections(*self._date_range(query), newest_first=newest_first)
+        if not sort or sort[0][0] == 'date':
+            return self._find_in_order(collections, query, projection, sort, skip, limit, wrap, batch_size)
+
+        # Any other order: take each partition's top skip+limit and merge with a stable multi-key sort
+        window = skip + limit if limit else 0
+        docs = []
+        for collection in collections:
+            docs.extend(self._cursor(wrap(collection), query, projection, sort, 0, window, batch_size))
+        for key, direction in reversed(sort):
+            docs.sort(key=lambda doc: _sort_value(doc.get(key)), reverse=direction < 0)
+        return docs[skip:skip + limit] if limit else docs[skip:]
+
+    def _find_in_order(self, collections, query, projection, sort, skip, limit, wrap, batch_size):
+        """Months are disjoint date ranges, so a date order is their concatenation"""
+        remaining = limit
+        for collection in collections:
+            if skip:
+                count = collection.count_documents(query)
+                if skip >= count:
+                    skip -= count
+                    continue
+            for doc in self._cursor(wrap(collection), query, projection, sort, skip, remaining, batch_size):
+                yield doc
+                if limit:
+                    remaining -= 1
+            skip = 0
+            if limit and remaining <= 0:
+                return
+
+    @staticmethod
+    def _cursor(collection, query, projection, sort, skip, limit, batch_size):
+        cursor = collection.find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    def decode_stages(self):
+        """Stages to put after a $sample or $match that read partitions directly"""
+        return [self.codec.decode_stage()] if self.codec else []
+
+    def translate(self, query):
+        """A query on decoded field names rewritten for the stored schema"""
+        return self.codec.translate(query) if self.codec else query
+
+    def aggregate(self, pipeline, **kwargs):
+        """Run a pipeline over the partitions its leading $match date range touches"""
+        match = pipeline[0]['$match'] if pipeline and '$match' in pipeline[0] else None
+        head = [{'$match': self.translate(match)}] if match is not None else []
+        rest = self.decode_stages() + (pipeline[1:] if match is not None else pipeline)
+        if not self.partitioned:
+            return self.base.aggregate(head + rest, **kwargs)
+        collections = self.collections(*self._date_range(match))
+        if not collections:
+            return iter([])
+        unions = [{'$unionWith': {'coll': c.name, 'pipeline': head}} for c in collections[1:]]
+        return collections[0].aggregate(head + unions + rest, **kwargs)
+
+    def migrate(self, batch_size=5000, drop_source=False, progress=None):
+        """Copy the unpartitioned collection into monthly partitions; safe to re-run"""
+        copied = 0
+        batch = []
+        for doc in self.base.find().batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                copied += self._copy(batch)
+                batch = []
+                if progress:
+                    progress(copied)
+        if batch:
+            copied += self._copy(batch)
+            if progress:
+                progress(copied)
+        if drop_source:
+            self.base.drop()
+        return copied
+
+    def _copy(self, docs):
+        groups = {}
+        for doc in docs:
+            groups.setdefault(self.partition_name(doc.get('date')), []).append(doc)
+        for batch in groups.values():
+            try:
+                self._partition(batch[0].get('date')).insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Documents copied by an earlier, interrupted run
+                if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                    raise
+        return len(docs)
@@ -0,0 +1,137 @@
+# transaction_schema.py - compact storage encoding for transactions
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+AMOUNT_FIELDS = ('amount', 'balance_after')
+DICTIONARY_FIELDS = ('type', 'game_type', 'device')
+
+
+def default_description(tx_type):
+    return f"{tx_type.capitalize()} transaction"
+
+
+class TransactionCodec:
+    """Encode transactions compactly on write and decode them on read
+
+    Compact documents store:
+    - amounts as integer cents, exact and smaller than doubles with
+      fractions
+    - type, game_type and device as small integer codes from a shared
+      dictionary (schema_codes, one document per field with the values in
+      code order)
+    - no description when it is the default "<Type> transaction", and no
+      game_type when it is null
+    A document is compact when its `type` is a number, so compact and legacy
+    documents can sit side by side while a migration runs.
+    """
+
+    def __init__(self, db):
+        self.codes = db.schema_codes
+        self.values = {}
+        self.reload()
+
+    def reload(self):
+        self.values = {doc['_id']: doc['values'] for doc in self.codes.find({'_id': {'$in': list(DICTIONARY_FIELDS)}})}
+
+    def names(self, field):
+        """Values by code; code 0 is never assigned"""
+        return [None] + self.values.get(field, [])
+
+    def code(self, field, value):
+        values = self.values.get(field, [])
+        if value in values:
+            return values.index(value) + 1
+        # $ne makes the push happen once however many processes add the same value
+        try:
+            doc = self.codes.find_one_and_update(
+                {'_id': field, 'values': {'$ne': value}}, {'$push': {'values': value}},
+                upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            doc = None
+        if doc is None or value not in doc['values']:
+            doc = self.codes.find_one({'_id': field})
+        self.values[field] = doc['values']
+        return doc['values'].index(value) + 1
+
+    @staticmethod
+    def is_compact(doc):
+        return isinstance(doc.get('type'), int)
+
+    def encode(self, doc):
+        if self.is_compact(doc):
+            return doc
+        encoded = dict(doc)
+        for field in AMOUNT_FIELDS:
+            if isinstance(encoded.get(field), (int, float)):
+                encoded[field] = round(encoded[field] * 100)
+        for field in DICTIONARY_FIELDS:
+            value = encoded.get(field)
+            if value is None:
+                encoded.pop(field, None)
+            elif isinstance(value, str):
+                encoded[field] = self.code(field, value)
+        if isinstance(doc.get('type'), str) and encoded.get('description') == default_description(doc['type']):
+            del encoded['description']
+        return encoded
+
+    def decode(self, doc):
+        if not self.is_compact(doc):
+            return doc
+        for field in AMOUNT_FIELDS:
+            if isinstance(doc.get(field), int):
+                doc[field] = doc[field] / 100
+        for field in DICTIONARY_FIELDS:
+            if isinstance(doc.get(field), int):
+                names = self.names(field)
+                if doc[field] >= len(names):
+                    self.reload()
+                    names = self.names(field)
+                doc[field] = names[doc[field]] if doc[field] < len(names) else None
+        if 'description' not in doc and doc.get('type'):
+            doc['description'] = default_description(doc['type'])
+        return doc
+
+    def decode_stage(self):
+        """$addFields stage giving pipelines the legacy field values of compact documents"""
+        self.reload()
+        stage = {}
+        for field in AMOUNT_FIELDS:
+            stage[field] = {'$cond': [{'$isNumber': '$type'}, {'$divide': [f'${field}', 100]}, f'${field}']}
+        for field in DICTIONARY_FIELDS:
+            stage[field] = {'$cond': [{'$isNumber': f'${field}'},
+                                      {'$arrayElemAt': [{'$literal': self.names(field)}, f'${field}']},
+                                      f'${field}']}
+        return {'$addFields': stage}
+
+    def translate(self, query):
+        """Rewrite equality, $eq, $ne, $in and $nin filters on dictionary fields to match both encodings"""
+        if not query:
+            return query
+        translated = dict(query)
+        for field in DICTIONARY_FIELDS:
+            if field not in query:
+                continue
+            condition = query[field]
+            if isinstance(condition, str):
+                translated[field] = {'$in': self._both(field, [condition])}
+                continue
+            if not isinstance(condition, dict):
+                continue
+            condition = dict(condition)
+            if isinstance(condition.get('$eq'), str):
+                condition['$in'] = self._both(field, [condition.pop('$eq')])
+            elif '$in' in condition:
+                condition['$in'] = self._both(field, condition['$in'])
+            if isinstance(condition.get('$ne'), str):
+                condition['$nin'] = [condition.pop('$ne')] + list(condition.get('$nin', []))
+            if '$nin' in condition:
+                condition['$nin'] = self._both(field, condition['$nin'])
+            translated[field] = condition
+        return translated
+
+    def _both(self, field, values):
+        values = list(values)
+        if any(isinstance(v, str) and v not in self.values.get(field, []) for v in values):
+            self.reload()
+        known = self.values.get(field, [])
+        return values + [known.index(v) + 1 for v in values if isinstance(v, str) and v in known]
@@ -0,0 +1,153 @@
+# user_search.py - ranked email search for user selection
+import bisect
+import difflib
+import re
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING
+
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_TOKEN_PREFIX = 2
+RANK_SUBSTRING = 3
+RANK_TEXT = 4
+RANK_FUZZY = 5
+
+TOKEN_SPLIT = re.compile(r'[._%+\-@]')
+
+
+class EmailSearch:
+    """Email lookup for picking users out of large collections
+
+    Prefix queries use a sorted in-memory email array (bisect) when enabled,
+    otherwise an anchored regex that the unique email index can bound.
+    Substring queries scan the in-memory array or fall back to the $text
+    index on email; fuzzy matching is the last resort. The in-memory array is
+    refreshed incrementally from users.updated_at; only date values advance
+    the mark, since imported users can carry updated_at as a string. Keys
+    are lowercased emails, and each key holds every user id filed under it,
+    so addresses that differ only by case are all found.
+    """
+
+    def __init__(self, users, use_memory_index=True):
+        self.users = users
+        self.use_memory_index = use_memory_index
+        self.emails = []
+        self.entries = {}
+        self.keys = {}
+        self.high_water = None
+        self.loaded = False
+        self.last_elapsed_ms = 0.0
+
+    @staticmethod
+    def ensure_indexes(users):
+        users.create_index([('updated_at', ASCENDING)])
+        users.create_index([('email', 'text')], name='email_text')
+
+    def refresh(self):
+        """Load the email array once, then pull only users updated since the last refresh"""
+        if not self.use_memory_index:
+            return
+        query = {}
+        if self.loaded and self.high_water is not None:
+            # Users updated at the mark itself are read again; re-filing them is harmless
+            query = {'updated_at': {'$type': 'date', '$gte': self.high_water}}
+        elif self.loaded:
+            return
+        new_emails = []
+        for doc in self.users.find(query, {'email': 1, 'role': 1, 'updated_at': 1}):
+            email = doc.get('email')
+            if not email:
+                continue
+            key = email.lower()
+            old = self.keys.get(doc['_id'])
+            if old is not None and old != key:
+                self._remove(old, doc['_id'])
+            if key not in self.entries:
+                self.entries[key] = {}
+                new_emails.append(key)
+            self.entries[key][doc['_id']] = (email, doc.get('role', ''))
+            self.keys[doc['_id']] = key
+            updated = doc.get('updated_at')
+            if isinstance(updated, datetime) and (self.high_water is None or updated > self.high_water):
+                self.high_water = updated
+        new_emails = [key for key in new_emails if key in self.entries]
+        if not self.loaded or len(new_emails) > 64:
+            self.emails = sorted(set(self.emails).union(new_emails))
+        else:
+            for key in new_emails:
+                bisect.insort(self.emails, key)
+        self.loaded = True
+
+    def _remove(self, key, user_id):
+        """Unfile a user whose email changed"""
+        users = self.entries.get(key, {})
+        users.pop(user_id, None)
+        if not users:
+            self.entries.pop(key, None)
+            index = bisect.bisect_left(self.emails, key)
+            if index < len(self.emails) and self.emails[index] == key:
+                del self.emails[index]
+
+    def search(self, text, limit=200):
+        """Ranked (rank, email, _id, role) matches for a prefix, substring or misspelt email"""
+        started = time.perf_counter()
+        text = text.strip()
+        if not text:
+            return []
+        if self.use_memory_index:
+            self.refresh()
+            matches = self._search_memory(text.lower(), limit)
+        else:
+            matches = self._search_mongo(text, limit)
+        matches.sort(key=lambda m: (m[0], len(m[1]), m[1]))
+        self.last_elapsed_ms = (time.perf_counter() - started) * 1000
+        return matches[:limit]
+
+    def _search_memory(self, query, limit):
+        matches = {}
+        lo = bisect.bisect_left(self.emails, query)
+        hi = bisect.bisect_left(self.emails, query + '\uffff')
+        for key in self.emails[lo:hi]:
+            matches[key] = RANK_EXACT if key == query else RANK_PREFIX
+
+        if len(matches) < limit:
+            for key in self.emails:
+                if key in matches or query not in key:
+                    continue
+                tokens = TOKEN_SPLIT.split(key)
+                matches[key] = RANK_TOKEN_PREFIX if any(t.startswith(query) for t in tokens) else RANK_SUBSTRING
+
+        if not matches:
+            candidates = [key for key in self.emails if key[:1] == query[:1]]
+            for key in difflib.get_close_matches(query, candidates, n=min(limit, 20), cutoff=0.7):
+                matches[key] = RANK_FUZZY
+
+        results = []
+        for key, rank in matches.items():
+            for user_id, (email, role) in self.entries[key].items():
+                results.append((rank, email, user_id, role))
+        return results
+
+    def _search_mongo(self, text, limit):
+        projection = {'email': 1, 'role': 1}
+        found = {}
+        for doc in self.users.find({'email': {'$regex': '^' + re.escape(text)}}, projection).limit(limit):
+            found[doc['_id']] = (RANK_EXACT if doc['email'] == text else RANK_PREFIX, doc)
+
+        if len(found) < limit:
+            try:
+                cursor = self.users.find({'$text': {'$search': text}}, projection).limit(limit)
+                for doc in cursor:
+                    found.setdefault(doc['_id'], (RANK_TEXT, doc))
+            except Exception:
+                pass
+
+        if len(found) < limit:
+            cursor = self.users.find(
+                {'email': {'$regex': re.escape(text), '$options': 'i'}}, projection).limit(limit)
+            for doc in cursor:
+                found.setdefault(doc['_id'], (RANK_SUBSTRING, doc))
+
+        return [(rank, doc['email'], user_id, doc.get('role', '')) for user_id, (rank, doc) in found.items()]